@@ -0,0 +1,293 @@
+"""
+Autosave Module
+Handles background autosave and crash recovery for the XLS Editor
+
+Every interval the Tk thread takes a snapshot of the unsaved state: Copy-on-Write
+views of the changed sheets (no data is copied) plus the formula definitions,
+filters, sort/group settings and header rows. A daemon thread then writes it
+into a per-session recovery directory. Sheets are stored as column_store
+payloads and only rewritten when their edit counter (SheetOperations.versions)
+moved since the last snapshot; the manifest that ties them together is written
+last. Every file goes to a temporary name and is renamed into place, so a crash
+mid-write leaves the previous snapshot intact.
+
+The session directory is removed when nothing is left unsaved and when the
+application exits normally. While its instance runs, the directory's lock file
+is held locked; the operating system releases the lock when the process ends,
+however it ends. Directories found at launch whose lock can be taken belong to
+a session that crashed, and the newest one is offered for recovery; sessions of
+instances still running are left alone.
+"""
+
+import copy
+import os
+import shutil
+import threading
+import time
+from tkinter import messagebox
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+from column_store import view, pack_frame, unpack_frame
+from lazy_sheets import LazySheets
+from parse_cache import encode_payload, decode_payload
+
+
+AUTOSAVE_FORMAT = 1
+DEFAULT_INTERVAL_SECONDS = 60
+MANIFEST_NAME = 'manifest.bin'
+LOCK_NAME = 'session.lock'
+
+
+def default_recovery_dir():
+    """Per-user directory holding the autosave sessions"""
+    base = os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'schedule_editor', 'recovery')
+
+
+def write_atomic(path, chunks):
+    """Write byte chunks to a temporary file, flush it to disk and rename it over path"""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def read_payload(path):
+    """Object stored with write_atomic(path, encode_payload(obj))"""
+    with open(path, 'rb') as f:
+        data = bytearray(os.fstat(f.fileno()).st_size)
+        f.readinto(data)
+    return decode_payload(data)
+
+
+def lock_file(f):
+    """Lock an open file for this process without waiting; False when another process holds it"""
+    try:
+        if os.name == 'nt':
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def unlock_file(f):
+    if os.name == 'nt':
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def session_running(path):
+    """Whether the instance owning a session directory still runs (holds its lock file)"""
+    try:
+        with open(os.path.join(path, LOCK_NAME), 'a+b') as f:
+            if not lock_file(f):
+                return True
+            unlock_file(f)
+    except OSError:
+        pass  # No lock file: the session never got past creating its directory
+    return False
+
+
+def find_sessions(directory, exclude=None):
+    """(session directory, manifest) of every readable autosave session left by an instance that is gone, newest first"""
+    sessions = []
+    try:
+        with os.scandir(directory) as scan:
+            for item in scan:
+                if not item.is_dir() or item.path == exclude or session_running(item.path):
+                    continue
+                try:
+                    manifest = read_payload(os.path.join(item.path, MANIFEST_NAME))
+                except Exception:
+                    continue
+                if isinstance(manifest, dict) and manifest.get('format') == AUTOSAVE_FORMAT:
+                    sessions.append((item.path, manifest))
+    except OSError:
+        pass
+    sessions.sort(key=lambda session: session[1]['saved_at'], reverse=True)
+    return sessions
+
+
+class Autosave:
+    def __init__(self, editor_instance, directory=None):
+        self.editor = editor_instance
+        self.directory = directory or default_recovery_dir()
+        self.session_dir = os.path.join(self.directory, f"session-{os.getpid()}-{int(time.time())}")
+        self._thread = None   # Writer thread of the snapshot being written
+        self._written = {}    # {sheet_name: (version, file name)} on disk (only touched by the writer)
+        self._numbers = {}    # {sheet_name: number used in its file names}
+        self._lock = None     # Open lock file of session_dir while it exists
+        self.last_error = None
+
+    # Scheduling (Tk thread)
+    def settings(self):
+        return getattr(self.editor, 'autosave_settings', {})
+
+    def interval_ms(self):
+        seconds = self.settings().get('interval_seconds') or DEFAULT_INTERVAL_SECONDS
+        return max(1, int(seconds * 1000))
+
+    def start(self):
+        """Begin the autosave timer"""
+        self.editor.root.after(self.interval_ms(), self._tick)
+
+    def _tick(self):
+        try:
+            if self.settings().get('enabled', True) and not self.busy():
+                self.save_snapshot()
+        finally:
+            self.editor.root.after(self.interval_ms(), self._tick)
+
+    def busy(self):
+        """Whether the previous snapshot is still being written"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def save_snapshot(self):
+        """Snapshot the unsaved state and write it on a background thread"""
+        snapshot = self.snapshot()
+        if snapshot is None and not self._written and not os.path.isdir(self.session_dir):
+            return None
+        self._thread = threading.Thread(target=self._write, args=(snapshot,), daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def snapshot(self):
+        """Cheap copy of everything not saved yet (None when there is nothing to recover)
+
+        Sheets whose edit counter has not moved since the last snapshot are
+        listed without a frame and keep their file.
+        """
+        editor = self.editor
+        sheet_ops = editor.sheet_ops
+        if editor.df is None:
+            return None
+        store = sheet_ops.available_sheets
+        if store:
+            names = list(store)
+            changed = sheet_ops.changed_sheets()
+        else:
+            names = None
+            changed = [None] if editor.modified else []
+        if not changed:
+            return None
+
+        sheets = []
+        for sheet_name in changed:
+            if isinstance(store, LazySheets) and not store.is_loaded(sheet_name) and sheet_name != sheet_ops.current_sheet:
+                continue  # Only its header row changed - recovery parses it again
+            version = sheet_ops.versions.get(sheet_name, 0)
+            written = self._written.get(sheet_name)
+            if written and written[0] == version and os.path.exists(os.path.join(self.session_dir, written[1])):
+                sheets.append((sheet_name, version, None))
+            else:
+                sheets.append((sheet_name, version, view(sheet_ops.frame_for_save(sheet_name))))
+
+        state = {
+            'format': AUTOSAVE_FORMAT,
+            'current_file': editor.current_file,
+            'sheet_names': names,
+            'current_sheet': sheet_ops.current_sheet,
+            'changed_sheets': changed,
+            'header_row': editor.header_row,
+            'header_rows': dict(sheet_ops.header_rows),
+            'formula_fields': copy.deepcopy(editor.formula_fields),
+            'active_filters': copy.deepcopy(editor.active_filters),
+            'sort_settings': copy.deepcopy(editor.sort_settings),
+            'group_settings': copy.deepcopy(editor.group_settings),
+            'projected': copy.deepcopy(sheet_ops.projected),
+        }
+        return {'state': state, 'sheets': sheets}
+
+    # Writing (worker thread)
+    def _write(self, snapshot):
+        """Write the changed sheets, then the manifest, then remove files it no longer uses"""
+        try:
+            if snapshot is None:
+                # Everything is saved - nothing to recover any more
+                self._remove_session()
+                self._written = {}
+                return
+            os.makedirs(self.session_dir, exist_ok=True)
+            if self._lock is None:
+                # Taken before the manifest exists, so other instances never mistake this session for a crashed one
+                self._lock = open(os.path.join(self.session_dir, LOCK_NAME), 'a+b')
+                lock_file(self._lock)
+            files = {}
+            for sheet_name, version, frame in snapshot['sheets']:
+                if frame is None:
+                    files[sheet_name] = self._written[sheet_name][1]
+                    continue
+                number = self._numbers.setdefault(sheet_name, len(self._numbers))
+                file_name = f"sheet{number}-{version}.bin"
+                write_atomic(os.path.join(self.session_dir, file_name), encode_payload(pack_frame(frame)))
+                files[sheet_name] = file_name
+            manifest = dict(snapshot['state'], sheets=files, saved_at=time.time())
+            write_atomic(os.path.join(self.session_dir, MANIFEST_NAME), encode_payload(manifest))
+
+            self._written = {sheet_name: (version, files[sheet_name]) for sheet_name, version, _ in snapshot['sheets']}
+            keep = set(files.values()) | {MANIFEST_NAME, LOCK_NAME}
+            for file_name in os.listdir(self.session_dir):
+                if file_name not in keep:
+                    os.remove(os.path.join(self.session_dir, file_name))
+            self.last_error = None
+        except Exception as e:
+            # Autosave must never disturb editing; the next snapshot tries again
+            self.last_error = e
+
+    def _remove_session(self):
+        """Delete the session directory (the lock file is closed first: Windows cannot delete an open file)"""
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+        shutil.rmtree(self.session_dir, ignore_errors=True)
+
+    def shutdown(self):
+        """Normal exit: wait for a running write, then drop this session's recovery files"""
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        self._remove_session()
+
+    # Recovery (Tk thread)
+    def offer_recovery(self):
+        """At launch: offer to restore the newest session a crashed run left behind (running instances' are skipped)"""
+        sessions = find_sessions(self.directory, exclude=self.session_dir)
+        if not sessions:
+            return False
+        editor = self.editor
+        path, manifest = sessions[0]
+        when = time.strftime('%Y-%m-%d %H:%M', time.localtime(manifest['saved_at']))
+        source = os.path.basename(manifest['current_file'] or '') or editor.tr("Untitled")
+        recovered = False
+        if messagebox.askyesno(editor.tr("Recover Unsaved Changes"),
+                               f"{editor.tr('Unsaved changes from a previous session were found')}:\n"
+                               f"{source} ({when})\n\n{editor.tr('Recover them?')}"):
+            try:
+                self.restore(path, manifest)
+                recovered = True
+            except Exception as e:
+                messagebox.showerror(editor.tr("Error"), f"{editor.tr('Failed to recover autosave')}:\n{str(e)}")
+        # Older sessions are superseded by the newest one
+        for path, _ in sessions:
+            shutil.rmtree(path, ignore_errors=True)
+        return recovered
+
+    def restore(self, path, manifest):
+        """Load a recovery session into the editor (unchanged sheets are read from the original file again)"""
+        editor = self.editor
+        frames = {sheet_name: unpack_frame(read_payload(os.path.join(path, file_name)))
+                  for sheet_name, file_name in manifest['sheets'].items()}
+        editor.sheet_ops.restore_state(manifest, frames)
+        when = time.strftime('%H:%M', time.localtime(manifest['saved_at']))
+        editor.status_var.set(f"{editor.tr('Recovered unsaved changes')} ({when})")
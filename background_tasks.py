@@ -0,0 +1,127 @@
+"""
+Background Tasks Module
+Handles running long operations (file imports) off the Tk thread for the XLS Editor
+
+The work function runs on a daemon thread and never touches Tk. Progress,
+results and errors are put on a queue that the Tk thread drains with
+root.after(), so every callback (on_done, on_error, on_progress, on_preview)
+runs on the Tk thread and may update widgets and editor state freely.
+
+A task can do a quick first pass before the real work: preview(cancel) runs
+first on the same worker thread and its result is handed to on_preview while
+the work goes on (imports show the first rows of a large file this way).
+"""
+
+import queue
+import threading
+
+from streaming_reader import ImportCancelled
+
+
+# How often the Tk thread checks the task queue (milliseconds)
+POLL_INTERVAL_MS = 50
+
+
+class BackgroundTask:
+    def __init__(self, root, work, on_done, on_error=None, on_progress=None, on_finish=None, preview=None,
+                 on_preview=None):
+        """work(progress, cancel) runs on a worker thread and returns the result for on_done(result)
+
+        progress(done, total) may be called from the worker; cancel is a
+        threading.Event the work should check. on_error(exception) gets worker
+        exceptions (including ImportCancelled) and on_finish() always runs last.
+        preview(cancel), if given, runs before work; a result other than None
+        goes to on_preview(result). Its errors are ignored (work reports them).
+        """
+        self.root = root
+        self.work = work
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.on_finish = on_finish
+        self.preview = preview
+        self.on_preview = on_preview
+        self.cancel_event = threading.Event()
+        self.messages = queue.Queue()
+        self.thread = None
+        self.running = False
+        self._cleanups = []
+
+    def start(self):
+        """Start the worker thread and begin polling for its messages"""
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self.root.after(POLL_INTERVAL_MS, self._poll)
+        return self
+
+    def cancel(self):
+        """Ask the work to stop at its next cancel check"""
+        self.cancel_event.set()
+
+    def add_cleanup(self, callback):
+        """Run callback on the Tk thread once the task has finished (e.g. close a workbook)"""
+        self._cleanups.append(callback)
+
+    def progress(self, done, total=None):
+        """Thread-safe progress report (called from the worker)"""
+        self.messages.put(('progress', (done, total)))
+
+    def _run(self):
+        try:
+            if self.preview is not None:
+                self._run_preview()
+            result = self.work(self.progress, self.cancel_event)
+            if self.cancel_event.is_set():
+                raise ImportCancelled()
+            self.messages.put(('done', result))
+        except BaseException as error:
+            self.messages.put(('error', error))
+
+    def _run_preview(self):
+        try:
+            snapshot = self.preview(self.cancel_event)
+        except ImportCancelled:
+            raise
+        except Exception:
+            return
+        if snapshot is not None and self.on_preview is not None:
+            self.messages.put(('preview', snapshot))
+
+    def _poll(self):
+        """Drain the queue on the Tk thread; reschedule until the task has finished"""
+        finished = False
+        try:
+            while True:
+                kind, payload = self.messages.get_nowait()
+                if kind == 'progress':
+                    if self.on_progress is not None:
+                        self.on_progress(*payload)
+                    continue
+                if kind == 'preview':
+                    self.on_preview(payload)
+                    continue
+                finished = True
+                try:
+                    if kind == 'done':
+                        self.on_done(payload)
+                    elif self.on_error is not None:
+                        self.on_error(payload)
+                finally:
+                    self._finish()
+                break
+        except queue.Empty:
+            pass
+        if not finished:
+            self.root.after(POLL_INTERVAL_MS, self._poll)
+
+    def _finish(self):
+        self.running = False
+        for callback in self._cleanups:
+            try:
+                callback()
+            except Exception:
+                pass
+        self._cleanups = []
+        if self.on_finish is not None:
+            self.on_finish()
@@ -0,0 +1,120 @@
+"""
+Column Store Module
+Handles the in-memory representation of sheet data for the XLS Editor
+
+Each sheet has a single authoritative DataFrame (SheetOperations.available_sheets).
+The editor's original, working, filtered and visible-column frames are lightweight
+projections of it that share column buffers through pandas Copy-on-Write - data is
+only copied when one of the projections is actually mutated.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+PANDAS_MAJOR = int(pd.__version__.split('.')[0])
+
+
+def enable_copy_on_write():
+    """Turn on pandas Copy-on-Write mode (always on with pandas >= 3.0)"""
+    if PANDAS_MAJOR >= 3:
+        return True
+    try:
+        pd.set_option('mode.copy_on_write', True)
+    except (KeyError, ValueError, pd.errors.OptionError):
+        return False
+    return True
+
+
+def copy_on_write_enabled():
+    """Check whether projections can safely share buffers"""
+    if PANDAS_MAJOR >= 3:
+        return True
+    try:
+        return pd.get_option('mode.copy_on_write') is True
+    except (KeyError, pd.errors.OptionError):
+        return False
+
+
+def view(df, columns=None):
+    """Return a lazy projection of df (optionally restricted to columns)
+
+    With Copy-on-Write the result shares memory with df until either side is
+    modified. Without it we fall back to a real copy so edits never leak.
+    """
+    if df is None:
+        return None
+    if columns is not None:
+        projected = df[list(columns)]
+        return projected if copy_on_write_enabled() else projected.copy()
+    return df.copy(deep=not copy_on_write_enabled())
+
+
+# Compact columnar payloads (used to ship parsed sheets between processes)
+def _smallest_code_dtype(count):
+    """Smallest signed integer dtype for factorize codes (-1 marks missing)"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if count < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _is_text(values):
+    return all(isinstance(v, str) for v in values if not (v is None or v != v))
+
+
+def encode_text(series):
+    """(codes, distinct strings) of a text column, or None if the column is not text"""
+    dtype = series.dtype
+    if not pd.api.types.is_string_dtype(dtype) or (pd.api.types.is_object_dtype(dtype) and not _is_text(series.array)):
+        return None
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    return codes.astype(_smallest_code_dtype(len(uniques))), np.asarray(uniques, dtype=object)
+
+
+def decode_text(codes, uniques, dtype):
+    """Inverse of encode_text(): the column values with their original dtype"""
+    restored = uniques.take(codes.astype(np.intp), mode='clip') if len(uniques) else np.full(len(codes), np.nan, dtype=object)
+    restored[codes < 0] = np.nan
+    return restored if dtype == 'object' else pd.array(restored, dtype=dtype)
+
+
+def pack_frame(df):
+    """Convert a DataFrame into a compact columnar payload
+
+    Numeric, boolean and datetime columns are shipped as their numpy arrays.
+    Text columns are factorized into small integer codes plus the distinct
+    strings, so repeated values (Type, Family, Omniclass...) are pickled once.
+    Anything else falls back to an object array.
+    """
+    columns, schema, data = list(df.columns), [], []
+    for position in range(len(columns)):
+        series = df.iloc[:, position]
+        dtype = series.dtype
+        if isinstance(dtype, np.dtype) and dtype.kind in 'biufcmM':
+            schema.append(('array', str(dtype)))
+            data.append(series.to_numpy())
+            continue
+        text = encode_text(series)
+        if text is not None:
+            schema.append(('codes', str(dtype)))
+            data.append(text)
+        else:
+            schema.append(('object', str(dtype)))
+            data.append(series.to_numpy(dtype=object))
+    return {'columns': columns, 'length': len(df), 'schema': schema, 'data': data}
+
+
+def unpack_frame(payload):
+    """Rebuild the DataFrame from a pack_frame() payload"""
+    arrays = {}
+    for position, ((kind, dtype), values) in enumerate(zip(payload['schema'], payload['data'])):
+        if kind == 'codes':
+            arrays[position] = decode_text(*values, dtype)
+        elif kind == 'array':
+            arrays[position] = values
+        else:
+            arrays[position] = values if dtype == 'object' else pd.array(values, dtype=dtype)
+    df = pd.DataFrame(arrays, index=pd.RangeIndex(payload['length']))
+    df.columns = pd.Index(payload['columns'])
+    return df
@@ -0,0 +1,310 @@
+"""
+CSV IO Module
+Handles CSV/TSV import and export for the XLS Editor
+
+Delimited text is read with pandas' C parser, which is many times faster than
+any xlsx parse. The file is sniffed once (encoding, delimiter, number of
+fields), then a dtype schema is inferred from the first SCHEMA_SAMPLE_ROWS data
+rows and columns can be pinned explicitly through import_settings['csv_dtypes']
+or an import schema. When every column is pinned no sample is inferred at all.
+Whole numbers are read as float64 so blanks further down still fit, and become
+int64 afterwards when the column has none, as pd.read_excel does. (Nullable
+dtypes would make the C parser several times slower.)
+The data is read in chunks of CHUNK_ROWS rows with that schema, so large files
+report progress, can be cancelled, and every chunk comes out with the same
+dtypes. If a later chunk does not fit the schema (text in a numeric column) the
+file is read again with per-chunk inference. Trailing lines without any value
+(',,,,' lines Excel writes for formatted ranges) and trailing columns with
+neither a header nor a value are dropped, as the xlsx readers do, and reported
+in df.attrs['trimmed'].
+
+Exports write the DataFrame in slices of CHUNK_ROWS rows (Copy-on-Write views
+of the column store, nothing is copied up front) to a temporary file that
+replaces the target once it is complete.
+"""
+
+import codecs
+import csv
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from header_band import HEADER_BAND_ROWS, band_columns
+from streaming_reader import ImportCancelled
+
+
+CSV_EXTENSIONS = ('.csv', '.tsv', '.tab', '.txt')
+TAB_EXTENSIONS = ('.tsv', '.tab', '.txt')   # Revit exports schedules as tab separated .txt
+SNIFF_BYTES = 64 * 1024
+SCHEMA_SAMPLE_ROWS = 10000
+CHUNK_ROWS = 100000
+EXPORT_ENCODING = 'utf-8'
+
+
+def is_csv(file_path):
+    """Whether a path is a delimited text file (by extension)"""
+    return os.fspath(file_path).lower().endswith(CSV_EXTENSIONS)
+
+
+def default_separator(file_path):
+    return '\t' if os.fspath(file_path).lower().endswith(TAB_EXTENSIONS) else ','
+
+
+def sheet_name(file_path):
+    """Name the single 'sheet' of a text file is listed under"""
+    return os.path.splitext(os.path.basename(file_path))[0] or 'Sheet1'
+
+
+def _encoding(sample):
+    """Encoding of a file from its first bytes: BOMs first, then UTF-8 with a Windows code page fallback"""
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    try:
+        sample.decode('utf-8')
+    except UnicodeDecodeError as error:
+        if error.start < len(sample) - 3:
+            return 'cp1252'
+    return 'utf-8'
+
+
+def sniff(file_path):
+    """(encoding, separator, number of fields) of a delimited text file, from its first SNIFF_BYTES"""
+    with open(file_path, 'rb') as f:
+        sample = f.read(SNIFF_BYTES)
+    complete = len(sample) < SNIFF_BYTES
+    encoding = _encoding(sample)
+    text = sample.decode(encoding, errors='ignore')
+    if not complete:
+        text = text[:text.rfind('\n') + 1] or text  # Drop the partial last line
+    separator = default_separator(file_path)
+    if not file_path.lower().endswith(TAB_EXTENSIONS):
+        try:
+            separator = csv.Sniffer().sniff(text[:SNIFF_BYTES // 4], delimiters=',;\t|').delimiter
+        except csv.Error:
+            pass
+    width = max((len(row) for row in csv.reader(text.splitlines(), delimiter=separator)), default=0)
+    return encoding, separator, width
+
+
+def _scan_width(file_path, encoding, separator):
+    """Number of fields of the widest line in the whole file"""
+    with open(file_path, newline='', encoding=encoding, errors='replace') as f:
+        return max((len(row) for row in csv.reader(f, delimiter=separator)), default=0)
+
+
+def _read(file_path, dialect, **kwargs):
+    """pd.read_csv with the C parser, reading every line as `width` positional fields"""
+    encoding, separator, width = dialect
+    return pd.read_csv(file_path, sep=separator, encoding=encoding, encoding_errors='replace',
+                       header=None, names=range(width), engine='c', **kwargs)
+
+
+def read_header_band(file_path, rows=HEADER_BAND_ROWS):
+    """First rows as raw cells (no header), the text-file counterpart of workbook_reader.read_header_band"""
+    return _read(file_path, sniff(file_path), nrows=rows, skip_blank_lines=False)
+
+
+def infer_schema(sample, dtypes=None):
+    """{position: dtype} for the chunked read
+
+    Whole-number columns are read as float64 so blanks in later chunks do not
+    break them. Boolean columns, object columns (booleans with blanks, mixed
+    values - pinned as object they would come back as 'True'/'False' strings)
+    and columns empty in the sample are left to per-chunk inference. dtypes
+    ({position: dtype}) wins over inference.
+    """
+    schema = {}
+    for position in sample.columns:
+        series = sample[position]
+        if not series.notna().any() or pd.api.types.is_bool_dtype(series.dtype) \
+                or pd.api.types.is_object_dtype(series.dtype):
+            continue
+        if pd.api.types.is_integer_dtype(series.dtype):
+            schema[position] = 'float64'
+        else:
+            schema[position] = series.dtype
+    schema.update(dtypes or {})
+    return schema
+
+
+def _restore_integers(df, schema, pinned):
+    """Turn float64 columns without blanks or fractions back into int64"""
+    for position, dtype in schema.items():
+        if dtype != 'float64' or position in pinned or position not in df.columns:
+            continue
+        values = df[position].to_numpy()
+        if len(values) and not np.isnan(values).any() and np.all(np.mod(values, 1) == 0) \
+                and np.abs(values).max() < 2 ** 63:
+            df[position] = values.astype(np.int64)
+    return df
+
+
+def read_csv(file_path, header=0, dtypes=None, chunk_rows=CHUNK_ROWS, progress=None, cancel=None, usecols=None,
+             nrows=None):
+    """Read a delimited text file into a DataFrame, labelled like pd.read_excel would label the sheet
+
+    header is the 0-based line holding the column names (None: positional
+    labels). dtypes pins {column name: dtype}. progress(rows_read, None) is
+    called after every chunk and cancel (threading.Event) is checked between
+    chunks. usecols (0-based positions) leaves the other fields unparsed and
+    nrows stops after that many data rows.
+    """
+    dialect = sniff(file_path)
+    try:
+        return _read_chunked(file_path, dialect, header, dtypes, chunk_rows, progress, cancel, usecols, nrows)
+    except pd.errors.ParserError:
+        # A line further down has more fields than the sniffed sample
+        encoding, separator, _ = dialect
+        dialect = (encoding, separator, _scan_width(file_path, encoding, separator))
+        return _read_chunked(file_path, dialect, header, dtypes, chunk_rows, progress, cancel, usecols, nrows)
+
+
+def _read_chunked(file_path, dialect, header, dtypes, chunk_rows, progress, cancel, usecols=None, nrows=None):
+    skip = 0 if header is None else header + 1
+    if header is None:
+        names = list(range(dialect[2]))
+        labelled = set()
+    else:
+        top = _read(file_path, dialect, nrows=header + 1, skip_blank_lines=False)
+        if len(top) <= header:
+            raise ValueError(f"Passed header={header}, but only {len(top)} lines in the file")
+        names = band_columns(top, header)
+        labelled = set(np.flatnonzero(top.iloc[header].notna().to_numpy()).tolist())
+    positions = list(range(len(names)))
+    if usecols is not None:
+        positions = sorted({position for position in usecols if position < len(names)})
+    pinned = {names.index(column): dtype for column, dtype in (dtypes or {}).items()
+              if column in names and names.index(column) in positions}
+    fields = None if usecols is None else positions
+
+    # Projected reads only see some fields: the end of the file tells which empty rows are whole blank lines
+    blank_lines = None if usecols is None else _blank_tail_lines(file_path, dialect)
+    if len(pinned) == len(positions):
+        schema = dict(pinned)
+    else:
+        sample = _read(file_path, dialect, skiprows=skip, nrows=min(SCHEMA_SAMPLE_ROWS, nrows or SCHEMA_SAMPLE_ROWS),
+                       usecols=fields)
+        schema = infer_schema(sample, pinned)
+    try:
+        df = _concat_chunks(file_path, dialect, skip, schema, chunk_rows, progress, cancel, fields, nrows)
+        df, kept = _trim(df, positions, labelled, blank_lines, trim_rows=nrows is None)
+        df = _restore_integers(df, schema, pinned)
+    except (ValueError, TypeError) as error:
+        if isinstance(error, pd.errors.ParserError):
+            raise
+        # A later chunk does not fit the sampled schema: infer per chunk instead
+        df = _concat_chunks(file_path, dialect, skip, pinned or None, chunk_rows, progress, cancel, fields, nrows)
+        df, kept = _trim(df, positions, labelled, blank_lines, trim_rows=nrows is None)
+    df.columns = pd.Index(names)[kept] if kept else pd.RangeIndex(0)
+    return df
+
+
+def _blank_tail_lines(file_path, dialect):
+    """Number of lines at the end of a file holding nothing but separators
+
+    Read backwards block by block, so only the tail of the file is looked at.
+    Empty lines are not counted: the parser skips them anyway. The count stops
+    at the first line with a quote, so no line of a quoted multi-line cell is
+    ever counted.
+    """
+    encoding, separator, _ = dialect
+    if encoding == 'utf-16':
+        return 0
+    separator = separator.encode(encoding)
+    count = 0
+    with open(file_path, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        partial = b''
+        while end > 0:
+            start = max(0, end - SNIFF_BYTES)
+            f.seek(start)
+            lines = (f.read(end - start) + partial).split(b'\n')
+            end = start
+            # The first piece may be the end of a line that starts in the previous block
+            partial = lines.pop(0) if start else b''
+            for line in reversed(lines):
+                line = line.rstrip(b'\r')
+                if not line:
+                    continue
+                if line.replace(separator, b''):
+                    return count
+                count += 1
+    return count
+
+
+def _empty_tail_rows(df):
+    """Number of trailing rows of a parsed frame without any value"""
+    if not len(df) or df.iloc[-1].notna().any():
+        return 0
+    filled = np.flatnonzero(df.notna().any(axis=1).to_numpy())
+    return int(len(df) - (filled[-1] + 1 if len(filled) else 0))
+
+
+def _trim(df, positions, labelled, blank_lines=None, trim_rows=True):
+    """Drop the trailing value-less rows and trailing columns without header or values
+
+    df still has positional labels. blank_lines (projected reads, see
+    _blank_tail_lines) caps the rows dropped, as only some fields were parsed;
+    columns are only trimmed on full reads. Returns (df, remaining positions);
+    what was dropped goes to df.attrs['trimmed'].
+    """
+    rows = _empty_tail_rows(df) if trim_rows else 0
+    if blank_lines is not None:
+        rows = min(rows, blank_lines)
+    keep = len(positions)
+    while blank_lines is None and keep and positions[keep - 1] not in labelled \
+            and df[positions[keep - 1]].iloc[:len(df) - rows].isna().all():
+        keep -= 1
+    columns = len(positions) - keep
+    if not rows and not columns:
+        return df, positions
+    positions = positions[:keep]
+    df = df.iloc[:len(df) - rows, :keep]
+    df.attrs['trimmed'] = {'rows': rows, 'columns': columns}
+    return df, positions
+
+
+def _concat_chunks(file_path, dialect, skip, schema, chunk_rows, progress, cancel, usecols=None, nrows=None):
+    chunks, rows_read = [], 0
+    with _read(file_path, dialect, skiprows=skip, dtype=schema, chunksize=chunk_rows, usecols=usecols,
+               nrows=nrows) as reader:
+        for chunk in reader:
+            if cancel is not None and cancel.is_set():
+                raise ImportCancelled()
+            chunks.append(chunk)
+            rows_read += len(chunk)
+            if progress is not None:
+                progress(rows_read, None)
+    if not chunks:
+        return _read(file_path, dialect, skiprows=skip, nrows=0, usecols=usecols)
+    if len(chunks) == 1:
+        return chunks[0]
+    return pd.concat(chunks, ignore_index=True)
+
+
+def write_csv(file_path, df, separator=None, encoding=EXPORT_ENCODING, chunk_rows=CHUNK_ROWS):
+    """Write a DataFrame as delimited text (tab separated for .tsv/.tab/.txt), slice by slice
+
+    The file at file_path is replaced only once the new one is complete.
+    """
+    separator = separator or default_separator(file_path)
+    folder = os.path.dirname(os.path.abspath(file_path))
+    handle, temp_path = tempfile.mkstemp(prefix='.~', suffix=os.path.splitext(file_path)[1], dir=folder)
+    os.close(handle)
+    try:
+        with open(temp_path, 'w', encoding=encoding, newline='') as f:
+            df.iloc[:0].to_csv(f, sep=separator, index=False, lineterminator='\n')
+            for start in range(0, len(df), chunk_rows):
+                df.iloc[start:start + chunk_rows].to_csv(f, sep=separator, index=False, header=False,
+                                                         lineterminator='\n')
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
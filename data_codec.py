@@ -0,0 +1,157 @@
+"""
+Data Codec Module
+Handles the pickle-free encoding of saved records for the XLS Editor
+
+Edit journals and workspaces are read back from files that may have been
+copied from elsewhere, so they hold data only: a JSON document for the
+structure and raw buffers for numeric arrays. Decoding never runs code from
+the file. Values JSON has no type for - tuples, dicts with non-string keys,
+timestamps, missing-value markers, numpy and pandas arrays, indexes and frames -
+are written as one-key objects whose key starts with '$'.
+"""
+
+import datetime
+import decimal
+import json
+import math
+import struct
+
+import numpy as np
+import pandas as pd
+
+from column_store import pack_frame, unpack_frame
+
+
+CODEC_MAGIC = b'XLSEDC01'
+BUFFER_KINDS = 'biufcmM'  # Array dtypes written as raw buffers
+
+
+def _tagged(tag, value):
+    return {tag: value}
+
+
+def to_json(value, buffers):
+    """JSON-compatible form of value; numeric arrays are appended to buffers and referenced by position"""
+    if value is None or isinstance(value, (str, bool)):
+        return value
+    if value is pd.NA:
+        return _tagged('$na', None)
+    if value is pd.NaT:
+        return _tagged('$nat', None)
+    if isinstance(value, (int, np.integer)) and not isinstance(value, np.bool_):
+        return int(value)
+    if isinstance(value, np.bool_):
+        return bool(value)
+    if isinstance(value, (float, np.floating)):
+        value = float(value)
+        return value if math.isfinite(value) else _tagged('$float', repr(value))
+    if isinstance(value, (datetime.datetime, np.datetime64)):
+        return _tagged('$datetime', pd.Timestamp(value).isoformat())
+    if isinstance(value, datetime.date):
+        return _tagged('$date', value.isoformat())
+    if isinstance(value, datetime.time):
+        return _tagged('$time', value.isoformat())
+    if isinstance(value, (datetime.timedelta, np.timedelta64)):
+        return _tagged('$timedelta', int(pd.Timedelta(value).value))
+    if isinstance(value, decimal.Decimal):
+        return _tagged('$decimal', str(value))
+    if isinstance(value, list):
+        return [to_json(item, buffers) for item in value]
+    if isinstance(value, tuple):
+        return _tagged('$tuple', [to_json(item, buffers) for item in value])
+    if isinstance(value, dict):
+        if all(isinstance(key, str) and not key.startswith('$') for key in value):
+            return {key: to_json(item, buffers) for key, item in value.items()}
+        return _tagged('$dict', [[to_json(key, buffers), to_json(item, buffers)] for key, item in value.items()])
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind in BUFFER_KINDS:
+            buffers.append(np.ascontiguousarray(value).reshape(-1).view(np.uint8))
+            return _tagged('$array', [value.dtype.str, list(value.shape), len(buffers) - 1])
+        return _tagged('$objects', [to_json(item, buffers) for item in value.reshape(-1)])
+    if isinstance(value, pd.Index):
+        return _tagged('$index', [str(value.dtype), to_json(value.to_numpy(), buffers)])
+    if isinstance(value, pd.DataFrame):
+        return _tagged('$frame', to_json(pack_frame(value), buffers))
+    if isinstance(value, pd.api.extensions.ExtensionArray):
+        # Nullable, string and categorical column values travel as a one-column frame
+        return _tagged('$extension', to_json(pack_frame(pd.DataFrame({0: value})), buffers))
+    raise TypeError(f"Cannot save a value of type {type(value).__name__}")
+
+
+def _objects(items):
+    values = np.empty(len(items), dtype=object)
+    values[:] = items
+    return values
+
+
+def from_json(value, buffers):
+    """Inverse of to_json(); arrays are zero-copy views of the buffers"""
+    if isinstance(value, list):
+        return [from_json(item, buffers) for item in value]
+    if not isinstance(value, dict):
+        return value
+    if len(value) != 1 or not next(iter(value)).startswith('$'):
+        return {key: from_json(item, buffers) for key, item in value.items()}
+    tag, data = next(iter(value.items()))
+    if tag == '$na':
+        return pd.NA
+    if tag == '$nat':
+        return pd.NaT
+    if tag == '$float':
+        return float(data)
+    if tag == '$datetime':
+        return pd.Timestamp(data)
+    if tag == '$date':
+        return datetime.date.fromisoformat(data)
+    if tag == '$time':
+        return datetime.time.fromisoformat(data)
+    if tag == '$timedelta':
+        return pd.Timedelta(data)
+    if tag == '$decimal':
+        return decimal.Decimal(data)
+    if tag == '$tuple':
+        return tuple(from_json(item, buffers) for item in data)
+    if tag == '$dict':
+        return {from_json(key, buffers): from_json(item, buffers) for key, item in data}
+    if tag == '$array':
+        dtype, shape, position = data
+        return np.frombuffer(buffers[position], dtype=np.dtype(dtype)).reshape(shape)
+    if tag == '$objects':
+        return _objects([from_json(item, buffers) for item in data])
+    if tag == '$index':
+        dtype, values = data
+        return pd.Index(from_json(values, buffers), dtype=dtype)
+    if tag == '$frame':
+        return unpack_frame(from_json(data, buffers))
+    if tag == '$extension':
+        return unpack_frame(from_json(data, buffers)).iloc[:, 0].array
+    raise ValueError(f"Unknown value tag: {tag}")
+
+
+def encode(obj):
+    """Header + JSON document + raw buffers (a list of byte chunks to write in order)"""
+    buffers = []
+    document = json.dumps(to_json(obj, buffers), ensure_ascii=False, allow_nan=False,
+                          separators=(',', ':')).encode('utf-8')
+    raws = [memoryview(buffer) for buffer in buffers]
+    header = CODEC_MAGIC + struct.pack(f'<QI{len(raws)}Q', len(document), len(raws), *(raw.nbytes for raw in raws))
+    return [header, document] + raws
+
+
+def decode(data):
+    """Inverse of encode(); data is any buffer (bytes, bytearray, memoryview, memmap slice)"""
+    view = memoryview(data).cast('B')
+    if bytes(view[:len(CODEC_MAGIC)]) != CODEC_MAGIC:
+        raise ValueError("Not an encoded record")
+    offset = len(CODEC_MAGIC)
+    document_size, count = struct.unpack_from('<QI', view, offset)
+    offset += 12
+    sizes = struct.unpack_from(f'<{count}Q', view, offset)
+    offset += 8 * count
+    document = json.loads(bytes(view[offset:offset + document_size]).decode('utf-8'))
+    offset += document_size
+    buffers = []
+    for size in sizes:
+        buffers.append(view[offset:offset + size])
+        offset += size
+    return from_json(document, buffers)
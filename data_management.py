@@ -7,10 +7,18 @@ import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
 import pandas as pd
 
+from dtype_optimizer import coerce_input, set_cell, insert_row
+
+
+GRID_PAGE_ROWS = 500  # Rows turned into treeview items at a time
+
 
 class DataManagement:
     def __init__(self, editor_instance):
         self.editor = editor_instance
+        self.display_df = None  # Frame shown in the treeview (rows_shown of it are inserted)
+        self.rows_shown = 0
+        self.previewing = False  # The grid shows the first rows of a file still being imported (read-only)
     
     def populate_treeview(self):
         """Populate the treeview with DataFrame data"""
@@ -25,11 +33,36 @@ class DataManagement:
             visible_cols = [col for col in self.editor.visible_columns if col in display_df.columns]
             if visible_cols:
                 display_df = display_df[visible_cols]
-            
+        
+        self.previewing = False
+        self.show_frame(display_df)
+    
+    def show_preview(self, frame):
+        """Show the first rows of a file that is still being imported; editing waits for the full data"""
+        self.show_frame(frame)
+        self.previewing = True
+    
+    def end_preview(self):
+        """Put the loaded data back on the grid after an import with a preview failed or was cancelled"""
+        if not self.previewing:
+            return
+        self.previewing = False
+        if self.editor.df is not None:
+            self.populate_treeview()
+        else:
+            self.show_frame(self.editor.df)
+    
+    def show_frame(self, display_df):
+        """Fill the treeview with a frame's columns and its first page of rows (None clears it)"""
         # Clear existing data
         for item in self.editor.tree.get_children():
             self.editor.tree.delete(item)
             
+        if display_df is None:
+            self.display_df = None
+            self.rows_shown = 0
+            return
+        
         # Configure columns
         columns = list(display_df.columns)
         self.editor.tree['columns'] = columns
@@ -43,16 +76,31 @@ class DataManagement:
             self.editor.tree.column(col, width=100, minwidth=80)
             self.editor.tree.heading(col, text=str(col))
             
-        # Insert data
-        for index, row in display_df.iterrows():
+        # Insert the first page; further rows are materialized as the view scrolls down
+        self.display_df = display_df
+        self.rows_shown = 0
+        self.show_more_rows()
+    
+    def show_more_rows(self):
+        """Append the next GRID_PAGE_ROWS rows of the displayed frame to the treeview"""
+        display_df = self.display_df
+        if display_df is None or self.rows_shown >= len(display_df):
+            return
+        page = display_df.iloc[self.rows_shown:self.rows_shown + GRID_PAGE_ROWS]
+        for index, row in zip(page.index, page.itertuples(index=False, name=None)):
             values = [str(val) if pd.notna(val) else '' for val in row]
             # Use original DataFrame index for editing purposes
-            original_index = index if self.editor.filtered_df is None else display_df.index[display_df.index == index][0]
-            self.editor.tree.insert('', 'end', text=str(original_index), values=values)
+            self.editor.tree.insert('', 'end', text=str(index), values=values)
+        self.rows_shown += len(page)
+    
+    def on_tree_scrolled(self, first, last):
+        """yscrollcommand of the treeview: load the next page once its end comes into view"""
+        if float(last) >= 1.0:
+            self.show_more_rows()
     
     def on_cell_double_click(self, event):
         """Handle double-click on a cell for editing"""
-        if self.editor.df is None:
+        if self.editor.df is None or self.previewing:
             return
             
         item = self.editor.tree.selection()[0]
@@ -106,23 +154,14 @@ class DataManagement:
         button_frame.pack(pady=10)
         
         def save_edit():
-            new_value = entry_var.get()
-            if new_value == '':
-                self.editor.df.iloc[row_index, col_index] = None
-            else:
-                # Try to convert to appropriate type
-                try:
-                    # Try numeric conversion
-                    if '.' in new_value:
-                        new_value = float(new_value)
-                    else:
-                        new_value = int(new_value)
-                except ValueError:
-                    # Keep as string
-                    pass
-                self.editor.df.iloc[row_index, col_index] = new_value
+            old_value = self.editor.df.iloc[row_index, col_index]
+            # Convert the typed text to the column's dtype (widening it only if the value does not fit)
+            new_value = coerce_input(self.editor.df.iloc[:, col_index], entry_var.get())
+            set_cell(self.editor.df, row_index, col_index, new_value)
 
+            self.editor.undo_manager.record_cell_edit(row_index, self.editor.df.columns[col_index], old_value, new_value)
             self.editor.modified = True
+            self.editor.sheet_ops.mark_dirty()
             self.editor.file_ops.update_file_info()
             self.populate_treeview()
             self.editor.status_var.set("Cell updated")
@@ -140,11 +179,12 @@ class DataManagement:
             messagebox.showwarning(self.editor.tr("Warning"), self.editor.tr("No file is currently loaded."))
             return
             
-        # Add empty row
-        new_row = pd.Series([None] * len(self.editor.df.columns), index=self.editor.df.columns)
-        self.editor.df = pd.concat([self.editor.df, new_row.to_frame().T], ignore_index=True)
+        # Add empty row (keeping column dtypes instead of falling back to object)
+        self.editor.df = insert_row(self.editor.df, len(self.editor.df))
+        self.editor.undo_manager.record_row_insert(len(self.editor.df) - 1)
         
         self.editor.modified = True
+        self.editor.sheet_ops.mark_dirty()
         self.editor.file_ops.update_file_info()
         self.populate_treeview()
         self.editor.status_var.set("Row added")
@@ -163,8 +203,11 @@ class DataManagement:
         row_index = int(self.editor.tree.item(selection[0], 'text'))
         
         if messagebox.askyesno("Confirm", f"Delete row {row_index}?"):
+            position = self.editor.df.index.get_loc(row_index)
+            self.editor.undo_manager.record_row_delete(position, self.editor.df.iloc[position].tolist())
             self.editor.df = self.editor.df.drop(index=row_index).reset_index(drop=True)
             self.editor.modified = True
+            self.editor.sheet_ops.mark_dirty()
             self.editor.file_ops.update_file_info()
             self.populate_treeview()
             self.editor.status_var.set("Row deleted")
@@ -179,7 +222,9 @@ class DataManagement:
         column_name = simpledialog.askstring("Add Column", "Enter column name:")
         if column_name and column_name not in self.editor.df.columns:
             self.editor.df[column_name] = None
+            self.editor.undo_manager.record_column_insert(column_name, len(self.editor.df.columns) - 1)
             self.editor.modified = True
+            self.editor.sheet_ops.mark_dirty()
             self.editor.file_ops.update_file_info()
             self.populate_treeview()
             self.editor.status_var.set(f"Column '{column_name}' added")
@@ -216,8 +261,12 @@ class DataManagement:
         def delete_selected():
             if column_var.get():
                 if messagebox.askyesno("Confirm", f"Delete column '{column_var.get()}'?"):
-                    self.editor.df = self.editor.df.drop(columns=[column_var.get()])
+                    column = column_var.get()
+                    self.editor.undo_manager.record_column_delete(
+                        column, self.editor.df.columns.get_loc(column), self.editor.df[column].array)
+                    self.editor.df = self.editor.df.drop(columns=[column])
                     self.editor.modified = True
+                    self.editor.sheet_ops.mark_dirty()
                     self.editor.file_ops.update_file_info()
                     self.populate_treeview()
                     self.editor.status_var.set(f"Column '{column_var.get()}' deleted")
@@ -0,0 +1,298 @@
+"""
+Dtype Optimizer Module
+Shrinks imported sheets and keeps edits from upcasting columns for the XLS Editor
+
+On import numeric columns are downcast to the smallest lossless dtype,
+low-cardinality text columns become categoricals and sparse numeric columns use
+pandas nullable dtypes. Edits then go through coerce_input()/set_cell(), which
+convert the typed value to the column's dtype and only widen it when the value
+genuinely does not fit.
+"""
+
+import numpy as np
+import pandas as pd
+from pandas.api import types as ptypes
+
+
+# Text columns with at most this share of distinct values become categoricals
+CATEGORY_RATIO = 0.5
+# Numeric columns with at least this share of missing values use nullable dtypes
+SPARSE_RATIO = 0.5
+
+SIGNED_INTS = ['int8', 'int16', 'int32', 'int64']
+NULLABLE_INTS = {'int8': 'Int8', 'int16': 'Int16', 'int32': 'Int32', 'int64': 'Int64'}
+NULLABLE_FLOATS = {'float32': 'Float32', 'float64': 'Float64'}
+
+
+def frame_memory(df):
+    """Deep memory usage of a DataFrame in bytes"""
+    if df is None:
+        return 0
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+def format_bytes(size):
+    """Format a byte count for the status bar"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(size) < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024.0
+
+
+def format_memory_report(report):
+    """One-line before/after memory summary for the status bar"""
+    before, after = report['before'], report['after']
+    saved = (1 - after / before) * 100 if before else 0
+    return f"Memory: {format_bytes(before)} → {format_bytes(after)} (-{saved:.0f}%)"
+
+
+def format_trim_report(trimmed):
+    """Status bar note of the empty trailing rows/columns the reader left out"""
+    return f"Trimmed {trimmed['rows']:,} empty rows, {trimmed['columns']:,} empty columns"
+
+
+def merge_reports(reports):
+    """Combine per-sheet optimization reports into one"""
+    merged = {'before': 0, 'after': 0, 'changed': {}}
+    for report in reports:
+        merged['before'] += report.get('before', 0)
+        merged['after'] += report.get('after', 0)
+        merged['changed'].update(report.get('changed', {}))
+        if report.get('trimmed'):
+            trimmed = merged.setdefault('trimmed', {'rows': 0, 'columns': 0})
+            for kind in trimmed:
+                trimmed[kind] += report['trimmed'][kind]
+    return merged
+
+
+def smallest_int_dtype(min_value, max_value):
+    """Smallest signed numpy integer dtype that holds [min_value, max_value]"""
+    for name in SIGNED_INTS:
+        info = np.iinfo(name)
+        if info.min <= min_value and max_value <= info.max:
+            return name
+    return None
+
+
+def _optimized_numeric_dtype(series):
+    """Pick the target dtype for a numeric column (None = leave unchanged)"""
+    if ptypes.is_bool_dtype(series.dtype):
+        return None
+    values = series.dropna()
+    missing = len(series) - len(values)
+    sparse = len(series) > 0 and missing / len(series) >= SPARSE_RATIO
+
+    as_float = values.astype('float64')
+    if len(values) == 0 or np.all(np.isfinite(as_float)) and np.all(np.mod(as_float, 1) == 0):
+        # Integer valued (including all-empty columns)
+        low, high = (as_float.min(), as_float.max()) if len(values) else (0, 0)
+        name = smallest_int_dtype(low, high)
+        if name is None:
+            return None
+        return NULLABLE_INTS[name] if missing else name
+
+    # Non-integral floats: only go to float32 when it round-trips exactly
+    as_float32 = as_float.astype('float32').astype('float64')
+    name = 'float32' if np.array_equal(as_float32.to_numpy(), as_float.to_numpy()) else 'float64'
+    return NULLABLE_FLOATS[name] if sparse else name
+
+
+def _is_text_column(series):
+    """True when every non-missing value is a string"""
+    if ptypes.is_string_dtype(series.dtype) and not ptypes.is_object_dtype(series.dtype):
+        return True
+    if not ptypes.is_object_dtype(series.dtype):
+        return False
+    values = series.dropna()
+    return len(values) > 0 and all(isinstance(v, str) for v in values)
+
+
+def optimize_dtypes(df, keep=()):
+    """Downcast numerics, categorize low-cardinality text and use nullable dtypes for sparse columns
+
+    Returns (optimized_df, report) where report holds 'before'/'after' byte counts
+    and a {column: (old_dtype, new_dtype)} map of what changed. Columns in keep
+    (declared by an import schema) are left as they are.
+    """
+    report = {'before': frame_memory(df), 'after': 0, 'changed': {}}
+    if df is None or df.empty:
+        report['after'] = report['before']
+        return df, report
+
+    converted = {}
+    keep = set(keep)
+    for column in df.columns:
+        if column in keep:
+            continue
+        series = df[column]
+        if isinstance(series, pd.DataFrame):
+            continue  # Duplicate column labels - leave untouched
+        target = None
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            continue
+        if ptypes.is_numeric_dtype(series.dtype):
+            target = _optimized_numeric_dtype(series)
+        elif _is_text_column(series):
+            non_missing = series.count()
+            if non_missing and series.nunique(dropna=True) / non_missing <= CATEGORY_RATIO:
+                target = 'category'
+        elif series.isna().all() and len(series):
+            # Completely empty object columns (e.g. unused parameters)
+            target = 'Int8'
+        if target is not None and str(series.dtype) != str(target):
+            try:
+                converted[column] = series.astype(target)
+                report['changed'][column] = (str(series.dtype), str(target))
+            except (TypeError, ValueError, OverflowError):
+                continue
+
+    if converted:
+        df = df.copy(deep=False)
+        for column, values in converted.items():
+            df[column] = values
+    report['after'] = frame_memory(df)
+    return df, report
+
+
+# Edit coercion
+def coerce_input(series, text):
+    """Convert text typed by the user into a value matching the column's dtype"""
+    if text == '':
+        return None
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        categories = dtype.categories
+        if len(categories) == 0 or ptypes.is_string_dtype(categories.dtype) or ptypes.is_object_dtype(categories.dtype):
+            return text
+    elif ptypes.is_bool_dtype(dtype):
+        lowered = text.strip().lower()
+        if lowered in ('true', 'yes', '1'):
+            return True
+        if lowered in ('false', 'no', '0'):
+            return False
+        return text
+    elif ptypes.is_string_dtype(dtype) and not ptypes.is_object_dtype(dtype):
+        return text
+
+    # Numeric and mixed object columns: try numeric conversion
+    try:
+        if '.' in text or 'e' in text.lower():
+            return float(text)
+        return int(text)
+    except ValueError:
+        return text
+
+
+def _is_missing(value):
+    return value is None or (not isinstance(value, str) and np.ndim(value) == 0 and pd.isna(value))
+
+
+def widened_dtype(dtype, value):
+    """Dtype a column must be converted to before storing value (None = fits as is)"""
+    if isinstance(dtype, pd.CategoricalDtype) or ptypes.is_object_dtype(dtype):
+        return None
+    missing = _is_missing(value)
+    name = str(dtype)
+    nullable = isinstance(dtype, pd.api.extensions.ExtensionDtype)
+
+    if ptypes.is_bool_dtype(dtype):
+        if missing:
+            return None if nullable else 'boolean'
+        return None if isinstance(value, (bool, np.bool_)) else object
+
+    if ptypes.is_integer_dtype(dtype):
+        base = name.lower() if name.lower() in SIGNED_INTS else 'int64'
+        if missing:
+            return None if nullable else NULLABLE_INTS[base]
+        if isinstance(value, (bool, np.bool_)) or not isinstance(value, (int, float, np.integer, np.floating)):
+            return object
+        if isinstance(value, (float, np.floating)) and not float(value).is_integer():
+            return 'Float64' if nullable else 'float64'
+        info = np.iinfo(dtype.numpy_dtype if nullable else dtype)
+        if info.min <= value <= info.max:
+            return None
+        needed = smallest_int_dtype(value, value)
+        if needed is None:
+            return 'Float64' if nullable else 'float64'
+        wider = SIGNED_INTS[max(SIGNED_INTS.index(needed), SIGNED_INTS.index(base))]
+        return NULLABLE_INTS[wider] if nullable else wider
+
+    if ptypes.is_float_dtype(dtype):
+        if missing:
+            return None
+        if isinstance(value, (bool, np.bool_)) or not isinstance(value, (int, float, np.integer, np.floating)):
+            return object
+        if name.lower() == 'float32' and float(np.float32(value)) != float(value):
+            return 'Float64' if nullable else 'float64'
+        return None
+
+    if ptypes.is_string_dtype(dtype):
+        return None
+    return None if missing else object
+
+
+def _categories_with(categories, value):
+    """categories plus a new value, kept sorted (the SQLite filter store relies on sorted dictionaries)"""
+    values = list(categories) + [value]
+    try:
+        return pd.Index(sorted(values))
+    except TypeError:
+        return pd.Index(sorted(values, key=str))
+
+
+def set_cell(df, row_position, col_position, value):
+    """Assign df.iloc[row, col] = value without upcasting the column unless required"""
+    dtype = df.iloc[:, col_position].dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        if not _is_missing(value) and value not in dtype.categories:
+            df.isetitem(col_position, df.iloc[:, col_position].cat.set_categories(_categories_with(dtype.categories, value)))
+    elif ptypes.is_string_dtype(dtype) and not ptypes.is_object_dtype(dtype):
+        if not _is_missing(value) and not isinstance(value, str):
+            value = str(value)
+    else:
+        target = widened_dtype(dtype, value)
+        if target is not None:
+            df.isetitem(col_position, df.iloc[:, col_position].astype(target))
+    df.iloc[row_position, col_position] = value
+
+
+def _single_value_array(dtype, value):
+    """Length-1 array holding value in (a widened version of) dtype"""
+    if isinstance(dtype, pd.CategoricalDtype):
+        categories = dtype.categories
+        if not _is_missing(value) and value not in categories:
+            categories = _categories_with(categories, value)
+        return pd.Categorical([None if _is_missing(value) else value], categories=categories)
+    target = widened_dtype(dtype, value) or dtype
+    try:
+        return pd.array([value], dtype=target)
+    except (TypeError, ValueError):
+        return pd.array([value], dtype=object)
+
+
+def row_frame_like(df, values=None):
+    """One-row DataFrame matching df's dtypes (all missing when values is None)
+
+    Numpy integer/bool columns become their nullable equivalents when the row
+    is missing a value, so concatenating does not fall back to object dtype.
+    """
+    data = {}
+    for position in range(len(df.columns)):
+        value = None if values is None else values[position]
+        data[position] = _single_value_array(df.iloc[:, position].dtype, value)
+    row = pd.DataFrame(data)
+    row.columns = df.columns
+    return row
+
+
+def insert_row(df, position, values=None):
+    """Insert a row at position keeping column dtypes (values=None inserts an empty row)"""
+    if values is not None:
+        # New categories go into the column first, so the row's categories match and concat keeps the dtype
+        for col_position, value in enumerate(values):
+            dtype = df.iloc[:, col_position].dtype
+            if isinstance(dtype, pd.CategoricalDtype) and not _is_missing(value) and value not in dtype.categories:
+                df = df.copy(deep=False)
+                df.isetitem(col_position, df.iloc[:, col_position].cat.set_categories(_categories_with(dtype.categories, value)))
+    row = row_frame_like(df, values)
+    return pd.concat([df.iloc[:position], row, df.iloc[position:]], ignore_index=True)
@@ -0,0 +1,381 @@
+"""
+Edit Journal Module
+Handles the append-only write-ahead journal of edits for the XLS Editor
+
+Every mutation is appended to <workbook>.journal next to the workbook as a
+compact binary record: cell edits, row and column inserts/deletes in their
+forward form (undo/redo append the change they actually make). Changes that
+have no compact form - formula fields, sorting, hidden columns, header moves -
+mark the sheet stale, and the whole sheet is appended as a column_store frame
+once the change is complete. Each record is framed with its length and CRC32,
+so a record torn by a crash is detected and replay stops before it. Records
+are encoded with data_codec (JSON plus raw arrays), so reading a journal that
+came with a workbook never runs code from it.
+
+The journal starts with a base record identifying the workbook on disk (size,
+mtime, header rows). Replaying it onto that file rebuilds the edited sheets.
+Quick Save only flushes and fsyncs the journal; the xlsx file is rewritten by
+an explicit Save (or at exit), after which the journal starts over.
+"""
+
+import copy
+import os
+import struct
+import zlib
+from tkinter import messagebox
+
+from column_store import pack_frame, unpack_frame
+from dtype_optimizer import set_cell, insert_row
+from lazy_sheets import LazySheets
+from data_codec import encode, decode
+import workbook_reader
+
+
+JOURNAL_MAGIC = b'XLSEJR02'
+JOURNAL_SUFFIX = '.journal'
+RECORD_HEADER = struct.Struct('<QI')  # Payload length, CRC32 of the payload
+
+
+def journal_path(file_path):
+    """Journal file kept next to a workbook"""
+    return file_path + JOURNAL_SUFFIX
+
+
+def file_identity(file_path):
+    """(size, mtime) the journal base is checked against"""
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def encode_record(record):
+    """Length/CRC header followed by the encoded record (a list of byte chunks)"""
+    chunks = encode(record)
+    crc = 0
+    for chunk in chunks:
+        crc = zlib.crc32(chunk, crc)
+    return [RECORD_HEADER.pack(sum(memoryview(chunk).nbytes for chunk in chunks), crc)] + chunks
+
+
+def read_journal(path):
+    """(base, records, valid length) of a journal; records end at the first torn or corrupt one"""
+    with open(path, 'rb') as f:
+        data = bytearray(os.fstat(f.fileno()).st_size)
+        f.readinto(data)
+    if bytes(data[:len(JOURNAL_MAGIC)]) != JOURNAL_MAGIC:
+        raise ValueError("Not an edit journal")
+    view = memoryview(data)
+    records = []
+    offset = valid = len(JOURNAL_MAGIC)
+    while offset + RECORD_HEADER.size <= len(data):
+        length, crc = RECORD_HEADER.unpack_from(data, offset)
+        start = offset + RECORD_HEADER.size
+        payload = view[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        records.append(decode(payload))
+        offset = valid = start + length
+    if not records or records[0][0] != 'base':
+        raise ValueError("The edit journal has no base record")
+    return records[0][2], records[1:], valid
+
+
+def replay_records(base, records, load_sheet):
+    """Apply journal records to the base workbook
+
+    load_sheet(sheet_name, header_row) parses a sheet of the base file. Returns
+    (frames, header_rows, formula_fields, changed sheets in first-touched order).
+    """
+    headers = dict(base['header_rows'])
+    formula_fields = copy.deepcopy(base['formula_fields'])
+    frames, changed = {}, {}
+
+    def frame(sheet_name):
+        if sheet_name not in frames:
+            frames[sheet_name] = load_sheet(sheet_name, headers.get(sheet_name))
+        return frames[sheet_name]
+
+    for kind, sheet_name, data in records:
+        changed[sheet_name] = True
+        if kind == 'frame':
+            payload, formula_fields, headers[sheet_name] = data
+            frames[sheet_name] = unpack_frame(payload)
+        elif kind == 'header':
+            headers[sheet_name] = data[0]
+            frames.pop(sheet_name, None)
+        elif kind == 'cell':
+            row_index, column, value = data
+            df = frame(sheet_name)
+            set_cell(df, row_index, df.columns.get_loc(column), value)
+        elif kind == 'insert_row':
+            position, values = data
+            frames[sheet_name] = insert_row(frame(sheet_name), position, values)
+        elif kind == 'delete_row':
+            df = frame(sheet_name)
+            frames[sheet_name] = df.drop(index=df.index[data[0]]).reset_index(drop=True)
+        elif kind == 'insert_column':
+            column, position, values = data
+            df = frame(sheet_name)
+            df.insert(min(position, len(df.columns)), column, values)
+        elif kind == 'delete_column':
+            frames[sheet_name] = frame(sheet_name).drop(columns=[data[0]])
+    return frames, headers, formula_fields, list(changed)
+
+
+class EditJournal:
+    def __init__(self, editor_instance):
+        self.editor = editor_instance
+        self.path = None       # Journal file being appended to
+        self.base = None       # Base record written when the first change arrives
+        self._file = None
+        self._records = 0      # Records appended since the base
+        self._synced = 0       # Byte length made durable by the last sync()
+        self._stale = set()    # Sheets to append as a whole frame once the current change is complete
+        self._covered = set()  # Sheets whose latest change was already appended as a compact record
+        self._flush_scheduled = False
+
+    def settings(self):
+        return getattr(self.editor, 'journal_settings', {})
+
+    def active(self):
+        return self.base is not None
+
+    def pending(self):
+        """Whether the journal holds edits the workbook file does not"""
+        return self._records > 0
+
+    # Baseline
+    def start(self, file_path):
+        """Begin journaling a freshly loaded workbook (the previous one keeps its quick saved edits)"""
+        self.detach()
+        self._begin(file_path, ())
+
+    def saved(self, file_path, rewritten=()):
+        """The workbook file holds every edit now: drop the journal and begin a new one against it
+
+        rewritten lists the sheets the save generated, whose header is now row 0.
+        """
+        self.close(remove=True)
+        self._begin(file_path, rewritten)
+
+    def _begin(self, file_path, rewritten):
+        if not file_path or not self.settings().get('enabled', True):
+            return
+        editor = self.editor
+        sheet_ops = editor.sheet_ops
+        try:
+            size, mtime = file_identity(file_path)
+        except OSError:
+            return
+        header_rows = dict(sheet_ops.header_rows)
+        for sheet_name in rewritten:
+            header_rows[sheet_name] = 0
+        self.path = journal_path(file_path)
+        self.base = {
+            'file': file_path,
+            'size': size,
+            'mtime': mtime,
+            'sheet_names': list(sheet_ops.available_sheets) or None,
+            'current_sheet': sheet_ops.current_sheet,
+            'header_row': editor.header_row,
+            'header_rows': header_rows,
+            'formula_fields': copy.deepcopy(editor.formula_fields),
+            'projected': {sheet_name: entry['positions'] for sheet_name, entry in sheet_ops.projected.items()
+                          if sheet_name not in rewritten},
+        }
+
+    def resume(self, base, records, valid_length):
+        """Keep appending to a journal that was just replayed"""
+        self.path = journal_path(base['file'])
+        self.base = base
+        self._file = open(self.path, 'r+b')
+        self._file.truncate(valid_length)
+        self._file.seek(valid_length)
+        self._records = records  # Replayed edits are still missing from the workbook file
+        self._synced = valid_length
+
+    def detach(self):
+        """Stop journaling the current workbook, keeping only what was quick saved"""
+        self.discard_unsynced()
+        self.close()
+
+    def close(self, remove=False):
+        """Stop journaling (remove=True: the workbook file now holds every edit)"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if remove and self.path:
+            _remove(self.path)
+        self.path = self.base = None
+        self._records = self._synced = 0
+        self._stale = set()
+        self._covered = set()
+
+    # Appending (Tk thread)
+    def _append(self, kind, sheet_name, data):
+        if self._file is None:
+            self._file = open(self.path, 'wb')
+            self._file.write(JOURNAL_MAGIC)
+            self._write(('base', None, self.base))
+            self._synced = self._file.tell()
+        self._write((kind, sheet_name, data))
+        self._records += 1
+
+    def _write(self, record):
+        for chunk in encode_record(record):
+            self._file.write(chunk)
+
+    def _guarded(self, append, *args):
+        """Journal failures (disk full, read-only folder) switch journaling off instead of breaking the edit"""
+        try:
+            append(*args)
+        except Exception as e:
+            self.close()
+            self.editor.status_var.set(f"{self.editor.tr('Edit journal disabled')}: {str(e)}")
+
+    def record(self, kind, sheet_name, data):
+        """Append a compact change (see replay_records for the kinds)"""
+        if not self.active():
+            return
+        self._covered.add(sheet_name)
+        if sheet_name not in self._stale:
+            self._guarded(self._append, kind, sheet_name, data)
+
+    def sheet_changed(self, sheet_name):
+        """A sheet was modified; unless a compact record described the change, capture the whole sheet"""
+        if not self.active():
+            return
+        if sheet_name in self._covered:
+            self._covered.discard(sheet_name)
+            return
+        self._stale.add(sheet_name)
+        if not self._flush_scheduled:
+            # Header moves and formula updates finish later in the same event handler
+            self._flush_scheduled = True
+            self.editor.root.after_idle(self.flush)
+
+    def flush(self):
+        """Append the stale sheets as whole frames"""
+        self._flush_scheduled = False
+        if not self.active():
+            return
+        sheet_ops = self.editor.sheet_ops
+        store = sheet_ops.available_sheets
+        for sheet_name in [sheet_name for sheet_name in store or [None] if sheet_name in self._stale]:
+            if isinstance(store, LazySheets) and not store.is_loaded(sheet_name) and sheet_name != sheet_ops.current_sheet:
+                data = (sheet_ops.header_rows.get(sheet_name),)
+                self._guarded(self._append, 'header', sheet_name, data)
+            else:
+                frame = sheet_ops.frame_for_save(sheet_name)
+                header = sheet_ops.header_rows.get(sheet_name, self.editor.header_row)
+                data = (pack_frame(frame), copy.deepcopy(self.editor.formula_fields), header)
+                self._guarded(self._append, 'frame', sheet_name, data)
+        self._stale = set()
+        self._covered = set()
+
+    def sync(self):
+        """Quick save: make every appended record durable (the workbook file is left alone)"""
+        self.flush()
+        if self._file is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._synced = self._file.tell()
+
+    def discard_unsynced(self):
+        """Drop the records appended after the last sync (the user chose not to save them)"""
+        if self._file is None:
+            return
+        path, synced = self.path, self._synced
+        self._file.close()
+        self._file = None
+        with open(path, 'r+b') as f:
+            f.truncate(synced)
+        try:
+            if read_journal(path)[1]:
+                return
+        except (OSError, ValueError):
+            pass
+        _remove(path)  # Nothing was quick saved - the journal has no use
+
+    # Replay (Tk thread, parsing on the import worker)
+    def offer_replay(self, file_path):
+        """Before a workbook is opened: offer to apply the edits journaled since its last save
+
+        Returns True when the replay was started (the regular import must not run).
+        """
+        path = journal_path(file_path)
+        if path == self.path:
+            self.detach()  # Reopening the workbook being edited: only its quick saved edits count
+        if not os.path.exists(path):
+            return False
+        editor = self.editor
+        try:
+            base, records, valid_length = read_journal(path)
+            current = file_identity(file_path) == (base['size'], base['mtime'])
+        except (OSError, ValueError, KeyError):
+            base, records, current = None, [], False
+        if not current or not records:
+            # The workbook was replaced meanwhile (or nothing was journaled): the journal no longer applies
+            _remove(path)
+            return False
+        if not messagebox.askyesno(editor.tr("Journaled Edits"),
+                                   f"{os.path.basename(file_path)}: {len(records)} "
+                                   f"{editor.tr('edits were recorded after the last full save')}.\n\n"
+                                   f"{editor.tr('Apply them?')}"):
+            _remove(path)
+            return False
+        self.replay(file_path, base, records, valid_length)
+        return True
+
+    def replay(self, file_path, base, records, valid_length):
+        """Parse the base sheets the journal touches on a worker, apply the records and install the result"""
+        editor = self.editor
+        file_ops = editor.file_ops
+        base = dict(base, file=file_path)
+        projected = base.get('projected', {})
+
+        def parse(progress, cancel):
+            def load_sheet(sheet_name, header):
+                if header is None:
+                    bands = workbook_reader.read_header_bands(file_path, [sheet_name or 0], cache=editor.parse_cache,
+                                                              engine=file_ops.reader_engine())
+                    header = file_ops.header_rows_for(bands, base['header_row'])[sheet_name or 0]
+                # Sheets imported with a schedule view are rebuilt from the same columns
+                df = workbook_reader.read_sheet(file_path, sheet_name=sheet_name or 0, header=header,
+                                                cache=editor.parse_cache, usecols=projected.get(sheet_name),
+                                                **file_ops.reader_options(file_path, progress, cancel))
+                return file_ops.optimize_imported(df)[0]
+            return replay_records(base, records, load_sheet)
+
+        def apply(result):
+            frames, header_rows, formula_fields, changed = result
+            state = {
+                'current_file': file_path,
+                'sheet_names': base['sheet_names'],
+                'current_sheet': base['current_sheet'],
+                'changed_sheets': changed,
+                'header_row': base['header_row'],
+                'header_rows': header_rows,
+                'formula_fields': formula_fields,
+                'active_filters': {},
+                'sort_settings': [],
+                'group_settings': [],
+                'projected': {sheet_name: {'file': file_path, 'identity': (base['size'], base['mtime']),
+                                           'sheet': sheet_name or 0, 'positions': positions,
+                                           'rows_moved': any(kind in ('insert_row', 'delete_row') and name == sheet_name
+                                                             for kind, name, _ in records)}
+                              for sheet_name, positions in projected.items()},
+            }
+            self.detach()
+            editor.sheet_ops.restore_state(state, frames)
+            self.resume(base, len(records), valid_length)
+            editor.status_var.set(f"{editor.tr('Applied journaled edits')}: {len(records)}")
+
+        file_ops.run_import(file_path, parse, apply, editor.tr('Failed to apply journaled edits'))
@@ -3,14 +3,27 @@ File Operations Module
 Handles all file import, export, and management operations for the XLS Editor
 """
 
-import pandas as pd
 import os
 from tkinter import filedialog, messagebox
 
+from column_store import view
+from dtype_optimizer import optimize_dtypes, format_memory_report, format_trim_report
+from streaming_reader import ImportCancelled
+from background_tasks import BackgroundTask
+from header_band import detect_header_row
+from memmap_store import DEFAULT_MIN_ROWS
+from schedule_view import view_positions
+from workspace import WORKSPACE_EXTENSION, is_workspace
+import csv_io
+import workbook_reader
+import xlsx_writer
+
 
 class FileOperations:
     def __init__(self, editor_instance):
         self.editor = editor_instance
+        self.import_task = None  # BackgroundTask of the import currently running
+        self.import_view = None  # Schedule view narrowing the columns of the import being set up, see schedule_view
     
     def smart_import_file(self):
         """Smart import - automatically detects multi-sheet files and offers sheet selection"""
@@ -18,66 +31,257 @@ class FileOperations:
             title=self.editor.tr("Select XLS File"),
             filetypes=[
                 (self.editor.tr("Excel files"), "*.xlsx *.xls"),
+                (self.editor.tr("CSV files"), "*.csv *.tsv *.txt"),
+                (self.editor.tr("Schedule workspace"), f"*{WORKSPACE_EXTENSION}"),
                 (self.editor.tr("All files"), "*.*")
             ]
         )
         
-        if not file_path:
+        if file_path and is_workspace(file_path):
+            self.editor.workspace.open_workspace(file_path)
+            return
+        if not file_path or self.editor.journal.offer_replay(file_path):
             return
         
+        workbook = None
+        running = self.import_task
         try:
-            # Check how many sheets the file has
-            if file_path.endswith('.xlsx'):
-                excel_file = pd.ExcelFile(file_path, engine='openpyxl')
-            else:
-                excel_file = pd.ExcelFile(file_path, engine='xlrd')
-            
-            sheet_names = excel_file.sheet_names
+            # Share one workbook handle - it is opened at most once to list and parse sheets
+            workbook = workbook_reader.open_workbook(file_path)
+            sheet_names = workbook_reader.sheet_names(workbook, cache=self.editor.parse_cache)
             
             # If only 1 sheet, use simple import
             if len(sheet_names) == 1:
-                self._simple_import(file_path)
+                self._simple_import(file_path, workbook)
             else:
                 # Multiple sheets - use sheet selection dialog
                 if hasattr(self.editor, 'sheet_ops'):
-                    self.editor.sheet_ops.import_file_with_sheet_selection(file_path)
+                    self.editor.sheet_ops.import_file_with_sheet_selection(file_path, workbook)
                 else:
                     # Fallback to simple import if sheet_ops not available
-                    self._simple_import(file_path)
+                    self._simple_import(file_path, workbook)
                     
         except Exception as e:
             messagebox.showerror(self.editor.tr("Error"), f"{self.editor.tr('Failed to open file')}:\n{str(e)}")
             self.editor.status_var.set(self.editor.tr("Import failed"))
+        finally:
+            # A background import started above closes the shared handle when it is done
+            if workbook is not None and not self.hand_over(workbook.close, running):
+                workbook.close()
     
-    def _simple_import(self, file_path):
-        """Internal method for simple single-sheet import"""
-        try:
-            # Read the Excel file with the specified header row
-            if file_path.endswith('.xlsx'):
-                self.editor.original_df = pd.read_excel(file_path, engine='openpyxl', header=self.editor.header_row)
-            else:
-                self.editor.original_df = pd.read_excel(file_path, engine='xlrd', header=self.editor.header_row)
+    def _simple_import(self, file_path, workbook=None):
+        """Internal method for simple single-sheet import (workbook: already open handle, if any)"""
+        header_row = self.editor.header_row
+        schedule_view = self.import_view
+        
+        def parse(progress, cancel):
+            # Worker thread: read the Excel file with the specified header row
+            # Read the top rows first so the header row can be detected before the full parse
+            band = workbook_reader.read_header_bands(workbook or file_path, [0], cache=self.editor.parse_cache,
+                                                      engine=self.reader_engine())[0]
+            header = self.header_rows_for({0: band}, header_row)[0]
+            positions = view_positions(schedule_view, band, header)
+            df = workbook_reader.read_sheet(workbook or file_path, header=header, cache=self.editor.parse_cache,
+                                            usecols=positions, **self.reader_options(file_path, progress, cancel))
+            if positions is not None:
+                band = band.iloc[:, positions]
+            return self.optimize_imported(df) + (band, header, positions)
+        
+        def apply(result):
+            df, report, band, header, positions = result
+            self.editor.original_df = df
+            self.editor.header_row = header
+            self.editor.sheet_ops.reset_single_sheet(header, band)
+            self.editor.schedule_view.remember(file_path, None, 0, positions)
             
             # Set working dataframe and visible columns
-            self.editor.df = self.editor.original_df.copy()
+            self.editor.df = view(self.editor.original_df)
             self.editor.visible_columns = list(self.editor.df.columns)
             
             # Clear formula fields since data structure might have changed
             self.editor.formula_fields = {}
+            self.editor.undo_manager.clear()
             
             self.editor.current_file = file_path
             self.editor.modified = False
+            self.editor.journal.start(file_path)
             self.editor.filtered_df = None
             self.editor.active_filters = {}
+            self.editor.schedule_view.apply(schedule_view)
             self.update_file_info()
             self.editor.filter_ops.update_filter_display()
             self.editor.update_header_display()
             self.editor.data_ops.populate_treeview()
-            self.editor.status_var.set(f"{self.editor.tr('File imported successfully')}: {os.path.basename(file_path)}")
-            
-        except Exception as e:
-            messagebox.showerror(self.editor.tr("Error"), f"{self.editor.tr('Failed to import file')}:\n{str(e)}")
-            self.editor.status_var.set(self.editor.tr("Import failed"))
+            self.editor.status_var.set(self.with_memory_report(f"{self.editor.tr('File imported successfully')}: {os.path.basename(file_path)}", report))
+        
+        self.run_import(file_path, parse, apply, self.editor.tr('Failed to import file'),
+                        preview=self.preview_reader(file_path, workbook, 0, header_row, schedule_view))
+    
+    def optimize_imported(self, df):
+        """Apply import-time dtype optimization (if enabled) and return (df, memory report)
+        
+        Large sheets are then moved to memory-mapped column files when import_settings['memmap_store'] is on.
+        Empty trailing rows/columns the reader left out are added to the report as 'trimmed'.
+        """
+        settings = self.editor.import_settings
+        report = None
+        trimmed = df.attrs.pop('trimmed', None)
+        if settings.get('optimize_dtypes', True):
+            df, report = optimize_dtypes(df, keep=self.editor.import_schema.fixed_columns(df))
+        if trimmed:
+            report = dict(report or {}, trimmed=trimmed)
+        if settings.get('memmap_store') and len(df) >= settings.get('memmap_min_rows', DEFAULT_MIN_ROWS):
+            df = self.editor.memmap_store.spill(df)
+        return df, report
+    
+    def use_streaming(self, file_path):
+        """Whether a workbook is large enough to be read with the streaming reader"""
+        threshold = self.editor.import_settings.get('streaming_threshold_bytes')
+        if threshold is None or not file_path.lower().endswith('.xlsx'):
+            return False
+        try:
+            return os.path.getsize(file_path) >= threshold
+        except OSError:
+            return False
+    
+    def header_rows_for(self, bands, default_row):
+        """Header row per sheet: detected from its header band when enabled, else default_row"""
+        headers = {}
+        for sheet_name, band in bands.items():
+            detected = detect_header_row(band) if self.editor.import_settings.get('auto_detect_header', True) else None
+            headers[sheet_name] = default_row if detected is None else detected
+        return headers
+    
+    def reader_engine(self):
+        """xlsx parser selected in import_settings: 'native' (xlsx_reader) or 'openpyxl'"""
+        return self.editor.import_settings.get('reader_engine', 'native')
+    
+    def reader_options(self, file_path, progress=None, cancel=None):
+        """Engine/streaming/progress/cancel keyword arguments for workbook_reader calls"""
+        options = {'streaming': self.use_streaming(file_path), 'progress': progress, 'cancel': cancel,
+                   'engine': self.reader_engine()}
+        if csv_io.is_csv(file_path):
+            options['csv_dtypes'] = self.editor.import_settings.get('csv_dtypes')
+        dtypes = self.editor.import_schema.reader_dtypes()
+        if dtypes:
+            options['dtypes'] = dtypes
+        return options
+    
+    def import_in_progress(self):
+        return self.import_task is not None and self.import_task.running
+    
+    def run_import(self, file_path, parse, apply, failure_message, on_error=None, preview=None):
+        """Parse on a worker thread, then apply the result on the Tk thread
+        
+        parse(progress, cancel) must not touch Tk or editor state - the previously
+        loaded file stays browsable until apply(result) swaps in the new data.
+        preview(cancel) (see preview_reader) reads the first rows to show meanwhile.
+        """
+        if self.import_in_progress():
+            messagebox.showinfo(self.editor.tr("Info"), self.editor.tr("Another file is still being imported."))
+            return None
+        
+        def failed(error):
+            self.editor.data_ops.end_preview()
+            self.update_file_info()
+            if isinstance(error, ImportCancelled):
+                self.editor.status_var.set(self.editor.tr("Import cancelled"))
+            else:
+                messagebox.showerror(self.editor.tr("Error"), f"{failure_message}:\n{str(error)}")
+                self.editor.status_var.set(self.editor.tr("Import failed"))
+            if on_error is not None:
+                on_error(error)
+        
+        self.editor.status_var.set(f"{self.editor.tr('Importing')}: {os.path.basename(file_path)}")
+        self.editor.show_import_progress()
+        self.import_task = BackgroundTask(self.editor.root, parse, apply, on_error=failed,
+                                          on_progress=self.report_progress,
+                                          on_finish=self.editor.hide_import_progress,
+                                          preview=preview,
+                                          on_preview=lambda df: self.show_preview(file_path, df)).start()
+        return self.import_task
+    
+    def preview_reader(self, file_path, workbook, sheet_name, header_row, schedule_view=None):
+        """preview(cancel) reading the first rows of a large file for run_import, or None
+        
+        Files under import_settings['preview_threshold_bytes'] load fast enough without
+        one, and so do sheets already in the parse cache.
+        """
+        settings = self.editor.import_settings
+        rows = settings.get('preview_rows')
+        threshold = settings.get('preview_threshold_bytes')
+        if not rows or threshold is None:
+            return None
+        try:
+            if os.path.getsize(file_path) < threshold:
+                return None
+        except OSError:
+            return None
+        
+        def preview(cancel):
+            # Worker thread, before the full parse
+            cache = self.editor.parse_cache
+            band = workbook_reader.read_header_bands(workbook or file_path, [sheet_name], cache=cache,
+                                                      engine=self.reader_engine())[sheet_name]
+            header = self.header_rows_for({sheet_name: band}, header_row)[sheet_name]
+            options = self.reader_options(file_path, cancel=cancel)
+            if cache is not None and not options.get('csv_dtypes') and not options.get('dtypes') \
+                    and cache.has_sheet(file_path, sheet_name, header):
+                return None
+            positions = view_positions(schedule_view, band, header)
+            df = workbook_reader.read_sheet(workbook or file_path, sheet_name=sheet_name, header=header,
+                                            usecols=positions, nrows=rows, **options)
+            if schedule_view is not None:
+                visible = [column for column in schedule_view.get('visible_columns', []) if column in df.columns]
+                if visible:
+                    df = df[visible]
+            return df
+        
+        return preview
+    
+    def show_preview(self, file_path, df):
+        """Show the first rows of the file being imported until the full data is applied (Tk thread)"""
+        self.editor.data_ops.show_preview(df)
+        self.editor.file_label.config(text=f"{os.path.basename(file_path)} ({self.editor.tr('loading...')})",
+                                      foreground="gray")
+        self.editor.status_var.set(f"{self.editor.tr('Loading... showing the first rows')}: {len(df):,}")
+    
+    def hand_over(self, resource_close, previous_task):
+        """Let the import just started close a shared resource when it finishes
+
+        previous_task is import_task from before the caller tried to start one.
+        Returns False (the caller closes the resource) when no new import is
+        running, e.g. it was refused because another import still runs.
+        """
+        if self.import_task is previous_task or not self.import_in_progress():
+            return False
+        self.import_task.add_cleanup(resource_close)
+        return True
+    
+    def report_progress(self, rows_read, total_rows):
+        """Show streaming import progress (runs on the Tk thread)"""
+        tr = self.editor.tr
+        if total_rows:
+            self.editor.status_var.set(f"{tr('Reading rows')}: {rows_read:,} / {total_rows:,} ({tr('Esc to cancel')})")
+        else:
+            self.editor.status_var.set(f"{tr('Reading rows')}: {rows_read:,} ({tr('Esc to cancel')})")
+        self.editor.set_import_progress(rows_read, total_rows)
+    
+    def cancel_import(self, event=None):
+        """Cancel the import in progress (Cancel button / Escape)"""
+        if self.import_in_progress():
+            self.import_task.cancel()
+            self.editor.status_var.set(self.editor.tr("Cancelling import..."))
+    
+    def with_memory_report(self, message, report):
+        """Append the before/after memory report (and what the reader trimmed) to a status message"""
+        if not report:
+            return message
+        if report.get('before'):
+            message = f"{message} | {format_memory_report(report)}"
+        if report.get('trimmed'):
+            message = f"{message} | {format_trim_report(report['trimmed'])}"
+        return message
     
     def import_file(self):
         """Import an XLS file"""
@@ -85,38 +289,13 @@ class FileOperations:
             title=self.editor.tr("Select XLS File"),
             filetypes=[
                 (self.editor.tr("Excel files"), "*.xlsx *.xls"),
+                (self.editor.tr("CSV files"), "*.csv *.tsv *.txt"),
                 (self.editor.tr("All files"), "*.*")
             ]
         )
         
-        if file_path:
-            try:
-                # Read the Excel file with the specified header row
-                if file_path.endswith('.xlsx'):
-                    self.editor.original_df = pd.read_excel(file_path, engine='openpyxl', header=self.editor.header_row)
-                else:
-                    self.editor.original_df = pd.read_excel(file_path, engine='xlrd', header=self.editor.header_row)
-                
-                # Set working dataframe and visible columns
-                self.editor.df = self.editor.original_df.copy()
-                self.editor.visible_columns = list(self.editor.df.columns)  # Initially all columns are visible
-                
-                # Clear formula fields since data structure might have changed
-                self.editor.formula_fields = {}
-                
-                self.editor.current_file = file_path
-                self.editor.modified = False
-                self.editor.filtered_df = None
-                self.editor.active_filters = {}
-                self.update_file_info()
-                self.editor.filter_ops.update_filter_display()
-                self.editor.update_header_display()
-                self.editor.data_ops.populate_treeview()
-                self.editor.status_var.set(f"{self.editor.tr('File imported successfully')}: {os.path.basename(file_path)}")
-                
-            except Exception as e:
-                messagebox.showerror(self.editor.tr("Error"), f"{self.editor.tr('Failed to import file')}:\n{str(e)}")
-                self.editor.status_var.set(self.editor.tr("Import failed"))
+        if file_path and not self.editor.journal.offer_replay(file_path):
+            self._simple_import(file_path)
     
     def save_file(self):
         """Save the current file"""
@@ -127,15 +306,22 @@ class FileOperations:
         if self.editor.current_file is None:
             self.save_as_file()
             return
+        if not self.editor.schedule_view.complete_for_save():
+            return
             
         try:
             # Check if we have multiple sheets loaded
-            if hasattr(self.editor, 'sheet_ops') and self.editor.sheet_ops.available_sheets:
+            if csv_io.is_csv(self.editor.current_file):
+                # Text files hold the one sheet they were imported as
+                csv_io.write_csv(self.editor.current_file, self.editor.df)
+                self.editor.journal.saved(self.editor.current_file, list(self.editor.sheet_ops.available_sheets) or [None])
+            elif hasattr(self.editor, 'sheet_ops') and self.editor.sheet_ops.available_sheets:
                 # Save all sheets
                 self.editor.sheet_ops.save_all_sheets(self.editor.current_file)
             else:
                 # Save single sheet
-                self.editor.df.to_excel(self.editor.current_file, index=False, engine='openpyxl')
+                xlsx_writer.write_workbook(self.editor.current_file, [('Sheet1', self.editor.df)])
+                self.editor.journal.saved(self.editor.current_file, [None])
             
             self.editor.modified = False
             self.update_file_info()
@@ -143,6 +329,27 @@ class FileOperations:
         except Exception as e:
             messagebox.showerror(self.editor.tr("Error"), f"{self.editor.tr('Failed to save file')}:\n{str(e)}")
     
+    def quick_save(self, event=None):
+        """Quick save: make the edits durable in the edit journal, deferring the xlsx write to Save or exit"""
+        if self.editor.df is None:
+            messagebox.showwarning(self.editor.tr("Warning"), self.editor.tr("No file is currently loaded."))
+            return
+        
+        journal = self.editor.journal
+        if self.editor.current_file is None or not journal.active():
+            # Nothing on disk to journal against yet
+            self.save_file()
+            return
+        
+        try:
+            journal.sync()
+        except Exception as e:
+            messagebox.showerror(self.editor.tr("Error"), f"{self.editor.tr('Failed to save file')}:\n{str(e)}")
+            return
+        self.editor.modified = False
+        self.update_file_info()
+        self.editor.status_var.set(self.editor.tr("Edits saved to the journal (the workbook is written on Save or exit)"))
+    
     def save_as_file(self):
         """Save the file with a new name"""
         if self.editor.df is None:
@@ -154,19 +361,26 @@ class FileOperations:
             defaultextension=".xlsx",
             filetypes=[
                 (self.editor.tr("Excel files"), "*.xlsx"),
+                (self.editor.tr("CSV files"), "*.csv *.tsv *.txt"),
                 (self.editor.tr("All files"), "*.*")
             ]
         )
         
         if file_path:
+            if not self.can_save_as(file_path) or not self.editor.schedule_view.complete_for_save():
+                return
             try:
                 # Check if we have multiple sheets loaded
-                if hasattr(self.editor, 'sheet_ops') and self.editor.sheet_ops.available_sheets:
+                if csv_io.is_csv(file_path):
+                    csv_io.write_csv(file_path, self.editor.df)
+                    self.editor.journal.saved(file_path, list(self.editor.sheet_ops.available_sheets) or [None])
+                elif hasattr(self.editor, 'sheet_ops') and self.editor.sheet_ops.available_sheets:
                     # Save all sheets
                     self.editor.sheet_ops.save_all_sheets(file_path)
                 else:
                     # Save single sheet
-                    self.editor.df.to_excel(file_path, index=False, engine='openpyxl')
+                    xlsx_writer.write_workbook(file_path, [('Sheet1', self.editor.df)])
+                    self.editor.journal.saved(file_path, [None])
                 
                 self.editor.current_file = file_path
                 self.editor.modified = False
@@ -175,6 +389,38 @@ class FileOperations:
             except Exception as e:
                 messagebox.showerror(self.editor.tr("Error"), f"{self.editor.tr('Failed to save file')}:\n{str(e)}")
     
+    def can_save_as(self, file_path):
+        """CSV holds a single sheet: refuse saving a multi-sheet workbook as CSV (Export CSV writes one sheet)"""
+        if csv_io.is_csv(file_path) and len(self.editor.sheet_ops.available_sheets) > 1:
+            messagebox.showwarning(self.editor.tr("Warning"),
+                                   self.editor.tr("CSV files hold a single sheet. Use Export CSV to write the current sheet."))
+            return False
+        return True
+    
+    def export_csv(self):
+        """Write the current sheet as CSV/TSV (the loaded file and its saved state are left alone)"""
+        if self.editor.df is None:
+            messagebox.showwarning(self.editor.tr("Warning"), self.editor.tr("No file is currently loaded."))
+            return
+        
+        file_path = filedialog.asksaveasfilename(
+            title=self.editor.tr("Export CSV"),
+            defaultextension=".csv",
+            filetypes=[
+                (self.editor.tr("CSV files"), "*.csv"),
+                (self.editor.tr("Tab separated files"), "*.tsv *.txt"),
+                (self.editor.tr("All files"), "*.*")
+            ]
+        )
+        if not file_path:
+            return
+        
+        try:
+            csv_io.write_csv(file_path, self.editor.df)
+            self.editor.status_var.set(f"{self.editor.tr('Exported')}: {os.path.basename(file_path)}")
+        except Exception as e:
+            messagebox.showerror(self.editor.tr("Error"), f"{self.editor.tr('Failed to save file')}:\n{str(e)}")
+    
     def update_file_info(self):
         """Update the file information display"""
         if self.editor.current_file:
@@ -201,7 +447,14 @@ class FileOperations:
                 if not self.editor.modified:  # Only close if save was successful
                     self.editor.root.destroy()
             elif result is False:  # No, don't save
+                # Quick saved edits stay in the journal and are offered when the file is opened again
+                self.editor.journal.detach()
                 self.editor.root.destroy()
             # Cancel - do nothing
+        elif self.editor.journal.pending():
+            # Quick saved edits are only in the journal - write the workbook now
+            self.save_file()
+            if not self.editor.journal.pending():
+                self.editor.root.destroy()
         else:
             self.editor.root.destroy()
\ No newline at end of file
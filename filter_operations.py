@@ -3,10 +3,38 @@ Filtering Module
 Handles all filtering system functions for the XLS Editor
 """
 
+import operator
+import sqlite3
 import tkinter as tk
 from tkinter import ttk, messagebox
 import pandas as pd
 
+from column_store import view
+from sqlite_store import DEFAULT_MIN_ROWS
+
+
+COMPARISONS = {
+    "greater than": operator.gt,
+    "less than": operator.lt,
+    "greater or equal": operator.ge,
+    "less or equal": operator.le,
+}
+
+
+def column_mask(series, predicate):
+    """Row mask of predicate(values) for a column
+    
+    Categorical columns (dictionary-encoded, possibly memory-mapped) evaluate the
+    predicate once per distinct value and pick the result per row by code, so
+    the rows are never turned into strings.
+    """
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        return predicate(series)
+    categories = series.cat.categories
+    distinct = pd.Series(categories, dtype=categories.dtype).reindex(range(len(categories) + 1))  # Last entry: missing
+    matches = predicate(distinct).fillna(False).to_numpy(dtype=bool)
+    return pd.Series(matches[series.cat.codes.to_numpy()], index=series.index)
+
 
 class FilterOperations:
     def __init__(self, editor_instance):
@@ -137,7 +165,14 @@ class FilterOperations:
         for fname, finfo in self.editor.active_filters.items():
             print(f"    - {fname}: {finfo['column']} {finfo['type']} '{finfo['value']}'")
             
-        filtered_df = self.editor.df.copy()
+        positions = self.query_rows(filters=list(self.editor.active_filters.values()))
+        if positions is not None:
+            filtered_df = self.editor.df.take(positions)
+            self.editor.filtered_df = filtered_df if len(filtered_df) < len(self.editor.df) else None
+            self.editor.data_ops.populate_treeview()
+            return
+            
+        filtered_df = view(self.editor.df)
         
         for filter_info in self.editor.active_filters.values():
             column = filter_info['column']
@@ -155,61 +190,49 @@ class FilterOperations:
             # Apply filter based on type
             if filter_type == "equals":
                 if case_sensitive:
-                    mask = filtered_df[column].astype(str) == value
+                    predicate = lambda values: values.astype(str) == value
                 else:
-                    mask = filtered_df[column].astype(str).str.lower() == value.lower()
+                    predicate = lambda values: values.astype(str).str.lower() == value.lower()
             elif filter_type == "not equals":
                 if case_sensitive:
-                    mask = filtered_df[column].astype(str) != value
+                    predicate = lambda values: values.astype(str) != value
                 else:
-                    mask = filtered_df[column].astype(str).str.lower() != value.lower()
+                    predicate = lambda values: values.astype(str).str.lower() != value.lower()
             elif filter_type == "contains":
                 if case_sensitive:
-                    mask = filtered_df[column].astype(str).str.contains(value, na=False)
+                    predicate = lambda values: values.astype(str).str.contains(value, na=False)
                 else:
-                    mask = filtered_df[column].astype(str).str.lower().str.contains(value.lower(), na=False)
+                    predicate = lambda values: values.astype(str).str.lower().str.contains(value.lower(), na=False)
             elif filter_type == "not contains":
                 if case_sensitive:
-                    mask = ~filtered_df[column].astype(str).str.contains(value, na=False)
+                    predicate = lambda values: ~values.astype(str).str.contains(value, na=False)
                 else:
-                    mask = ~filtered_df[column].astype(str).str.lower().str.contains(value.lower(), na=False)
+                    predicate = lambda values: ~values.astype(str).str.lower().str.contains(value.lower(), na=False)
             elif filter_type == "starts with":
                 if case_sensitive:
-                    mask = filtered_df[column].astype(str).str.startswith(value)
+                    predicate = lambda values: values.astype(str).str.startswith(value)
                 else:
-                    mask = filtered_df[column].astype(str).str.lower().str.startswith(value.lower())
+                    predicate = lambda values: values.astype(str).str.lower().str.startswith(value.lower())
             elif filter_type == "ends with":
                 if case_sensitive:
-                    mask = filtered_df[column].astype(str).str.endswith(value)
+                    predicate = lambda values: values.astype(str).str.endswith(value)
                 else:
-                    mask = filtered_df[column].astype(str).str.lower().str.endswith(value.lower())
-            elif filter_type == "greater than":
+                    predicate = lambda values: values.astype(str).str.lower().str.endswith(value.lower())
+            elif filter_type in COMPARISONS:
+                compare = COMPARISONS[filter_type]
                 try:
-                    mask = pd.to_numeric(filtered_df[column], errors='coerce') > float(value)
+                    number = float(value)
+                    predicate = lambda values: compare(pd.to_numeric(values, errors='coerce'), number)
                 except ValueError:
-                    mask = filtered_df[column].astype(str) > value
-            elif filter_type == "less than":
-                try:
-                    mask = pd.to_numeric(filtered_df[column], errors='coerce') < float(value)
-                except ValueError:
-                    mask = filtered_df[column].astype(str) < value
-            elif filter_type == "greater or equal":
-                try:
-                    mask = pd.to_numeric(filtered_df[column], errors='coerce') >= float(value)
-                except ValueError:
-                    mask = filtered_df[column].astype(str) >= value
-            elif filter_type == "less or equal":
-                try:
-                    mask = pd.to_numeric(filtered_df[column], errors='coerce') <= float(value)
-                except ValueError:
-                    mask = filtered_df[column].astype(str) <= value
+                    predicate = lambda values: compare(values.astype(str), value)
             elif filter_type == "is empty":
-                mask = filtered_df[column].isna() | (filtered_df[column].astype(str) == '')
+                predicate = lambda values: values.isna() | (values.astype(str) == '')
             elif filter_type == "is not empty":
-                mask = ~(filtered_df[column].isna() | (filtered_df[column].astype(str) == ''))
+                predicate = lambda values: ~(values.isna() | (values.astype(str) == ''))
             else:
                 print(f"  ⚠️  Unknown filter type: {filter_type}")
                 continue
+            mask = column_mask(filtered_df[column], predicate)
             
             print(f"    Mask: {mask.sum()} rows match")
             filtered_df = filtered_df[mask]
@@ -220,6 +243,28 @@ class FilterOperations:
         print(f"  Setting filtered_df: {self.editor.filtered_df is not None}")
         self.editor.data_ops.populate_treeview()
     
+    def query_rows(self, filters=(), sort=()):
+        """Positions of the current sheet's rows matching filters in sort order, computed by the SQLite store
+        
+        Returns None when the sheet is not in SQLite mode (import_settings['sqlite_store'],
+        sqlite_min_rows) or the query cannot be pushed down; callers then use pandas.
+        """
+        editor = self.editor
+        settings = editor.import_settings
+        # The rows edits write to and whose positions callers take(); row-aligned with original_df
+        frame = editor.df
+        if not settings.get('sqlite_store') or frame is None or editor.original_df is None \
+                or len(editor.original_df) != len(frame) or len(frame) < settings.get('sqlite_min_rows', DEFAULT_MIN_ROWS):
+            return None
+        sheet_ops = editor.sheet_ops
+        version = sheet_ops.versions.get(sheet_ops.current_sheet, 0)
+        try:
+            return editor.sqlite_store.select(sheet_ops.current_sheet, frame, version, filters, sort)
+        except (sqlite3.Error, OSError) as e:
+            # Scratch database unavailable (disk full, unwritable temp directory): pandas does the work
+            editor.status_var.set(f"{editor.tr('SQLite query failed, filtering in memory')}: {str(e)}")
+            return None
+    
     def clear_all_filters(self):
         """Clear all active filters"""
         if not self.editor.active_filters:
@@ -10,6 +10,8 @@ import json
 import os
 import re
 
+from column_store import view
+
 
 class FormulaOperations:
     def __init__(self, editor_instance):
@@ -127,9 +129,11 @@ class FormulaOperations:
         # Calculate and add the new field
         try:
             self.calculate_formula_field(field_name)
+            self.editor.undo_manager.record_formula_change(None, None, field_name, self.editor.formula_fields[field_name])
             self.refresh_formula_tree()
             self.editor.data_ops.populate_treeview()  # Refresh the main view
             self.editor.modified = True
+            self.editor.sheet_ops.mark_dirty()
             
             # Sync to available_sheets if multi-sheet mode is active
             self.editor.sync_current_sheet_data()
@@ -169,6 +173,8 @@ class FormulaOperations:
             return
         
         try:
+            old_definition = self.editor.formula_fields.get(old_field_name)
+            
             # Remove old field if name changed
             if field_name != old_field_name:
                 if old_field_name in self.editor.df.columns:
@@ -185,9 +191,11 @@ class FormulaOperations:
             
             # Recalculate the field
             self.calculate_formula_field(field_name)
+            self.editor.undo_manager.record_formula_change(old_field_name, old_definition, field_name, self.editor.formula_fields[field_name])
             self.refresh_formula_tree()
             self.editor.data_ops.populate_treeview()
             self.editor.modified = True
+            self.editor.sheet_ops.mark_dirty()
             
             # Sync to available_sheets if multi-sheet mode is active
             self.editor.sync_current_sheet_data()
@@ -216,6 +224,7 @@ class FormulaOperations:
                     self.editor.original_df = self.editor.original_df.drop(columns=[field_name])
                 
                 # Remove from formula fields
+                self.editor.undo_manager.record_formula_change(field_name, self.editor.formula_fields[field_name], None, None)
                 del self.editor.formula_fields[field_name]
                 
                 # Remove from visible columns if present
@@ -228,6 +237,7 @@ class FormulaOperations:
                 self.refresh_formula_tree()
                 self.editor.data_ops.populate_treeview()
                 self.editor.modified = True
+                self.editor.sheet_ops.mark_dirty()
                 
                 messagebox.showinfo("Success", f"Formula field '{field_name}' deleted successfully!")
                 
@@ -269,6 +279,7 @@ class FormulaOperations:
             
             self.editor.data_ops.populate_treeview()
             self.editor.modified = True
+            self.editor.sheet_ops.mark_dirty()
             messagebox.showinfo("Success", "All formula fields refreshed successfully!")
             
         except Exception as e:
@@ -725,9 +736,9 @@ class FormulaOperations:
         if self.editor.visible_columns:
             # Ensure all visible columns exist in original_df
             available_visible = [col for col in self.editor.visible_columns if col in self.editor.original_df.columns]
-            self.editor.df = self.editor.original_df[available_visible].copy()
+            self.editor.df = view(self.editor.original_df, available_visible)
         else:
-            self.editor.df = self.editor.original_df.copy()
+            self.editor.df = view(self.editor.original_df)
         
         # Reapply filters if any
         if self.editor.active_filters:
@@ -0,0 +1,161 @@
+"""
+Header Band Module
+Handles moving a sheet's header row in memory for the XLS Editor
+
+On import the first HEADER_BAND_ROWS rows of every sheet are kept exactly as
+they appear in the file (no header, no dtype inference) next to the parsed
+DataFrame. Moving the header row then only re-slices: rows between the old and
+new header come from the band or the DataFrame itself, so the workbook never
+has to be parsed again and edits made since the import are kept.
+"""
+
+import numpy as np
+import pandas as pd
+
+from streaming_reader import column_names
+
+
+# Number of raw rows kept per sheet; headers further down need a reload
+HEADER_BAND_ROWS = 50
+# Rows below a candidate header that are compared with it
+DETECT_ROWS_BELOW = 20
+# Candidates scoring below this are not trusted (the configured header row is kept)
+MIN_HEADER_SCORE = 0.25
+
+
+def fit_band(band, width):
+    """Pad a raw band with empty columns so it is as wide as the parsed sheet"""
+    band = band.set_axis(range(band.shape[1]), axis=1)
+    if band.shape[1] < width:
+        band = band.reindex(columns=range(width))
+    return band
+
+
+def _header_value(value):
+    """Turn a raw cell into a column label the way pd.read_excel does"""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def band_columns(band, header_row):
+    """Column labels a sheet gets with header_row, read from its band (None if the band is too short)"""
+    if band is None or header_row >= len(band):
+        return None
+    values = [_header_value(value) for value in band.iloc[header_row].tolist()]
+    return column_names(values, band.shape[1])
+
+
+def can_reheader(df, band, old_row, new_row, keep=()):
+    """Whether reheader() can handle this move without reading the file again"""
+    if new_row == old_row:
+        return True
+    if band is None:
+        return False
+    width = len([column for column in df.columns if column not in keep])
+    if band.shape[1] != width:
+        return False  # Columns were added or deleted since the import
+    if new_row < old_row:
+        return old_row < len(band)
+    return new_row - old_row <= len(df)
+
+
+def reheader(df, band, old_row, new_row, keep=()):
+    """Re-slice df (parsed with header=old_row) as if it was parsed with header=new_row
+
+    keep lists extra columns (e.g. formula fields) that are not part of the
+    file; they move with their rows and keep their names.
+    """
+    if new_row == old_row:
+        return df
+    if not can_reheader(df, band, old_row, new_row, keep):
+        raise ValueError(f"Header row {new_row + 1} cannot be applied in memory")
+    grid_columns = [column for column in df.columns if column not in keep]
+    grid = df[grid_columns].set_axis(range(len(grid_columns)), axis=1)
+    extra = df[[column for column in df.columns if column in keep]]
+
+    if new_row > old_row:
+        # Header moves down: rows above the new header are dropped
+        skip = new_row - old_row
+        header_values = grid.iloc[skip - 1].tolist()
+        body = grid.iloc[skip:].reset_index(drop=True)
+        extra = extra.iloc[skip:].reset_index(drop=True)
+    else:
+        # Header moves up: the rows in between (old header included) become data
+        header_values = band.iloc[new_row].tolist()
+        upper = band.iloc[new_row + 1:old_row + 1]
+        body = pd.concat([upper, grid], ignore_index=True)
+        if len(extra.columns):
+            padding = pd.DataFrame(np.nan, index=range(len(upper)), columns=extra.columns)
+            extra = pd.concat([padding, extra], ignore_index=True)
+
+    # Columns freed from header/text rows become numeric again where possible
+    body = body.infer_objects()
+    body.columns = pd.Index(column_names([_header_value(value) for value in header_values], len(grid_columns)))
+    if len(extra.columns):
+        body = pd.concat([body, extra.set_axis(body.index)], axis=1)
+    return body
+
+
+def _is_blank(value):
+    return value is None or (isinstance(value, str) and not value.strip()) or (not isinstance(value, str) and pd.isna(value))
+
+
+def _is_text(value):
+    """Text that does not just hold a number"""
+    if not isinstance(value, str):
+        return False
+    try:
+        float(value.replace(',', ''))
+        return False
+    except ValueError:
+        return True
+
+
+def header_score(band, row, rows_below=DETECT_ROWS_BELOW):
+    """Score how much a band row looks like a header row (0..1)
+
+    The score multiplies coverage (filled share of the table width), text
+    density, uniqueness of the labels and the share of labels that do not
+    repeat in the column below (the type/value change from header to data).
+    """
+    width = int(band.notna().any(axis=0).sum())
+    filled = [(position, value) for position, value in enumerate(band.iloc[row].tolist()) if not _is_blank(value)]
+    if width == 0 or len(filled) < min(2, width):
+        return 0.0
+
+    coverage = len(filled) / width
+    text = sum(1 for _, value in filled if _is_text(value)) / len(filled)
+    labels = [str(value).strip().lower() for _, value in filled]
+    uniqueness = len(set(labels)) / len(labels)
+
+    below = band.iloc[row + 1:row + 1 + rows_below]
+    if below.empty:
+        return 0.0
+    changed = 0
+    for position, value in filled:
+        column = [cell for cell in below.iloc[:, position].tolist() if not _is_blank(cell)]
+        if not column:
+            continue
+        label = str(value).strip().lower()
+        # Data values repeat down a schedule column; a header label does not
+        if _is_text(value) and all(str(cell).strip().lower() != label for cell in column):
+            changed += 1
+    type_change = changed / len(filled)
+    return coverage * text * uniqueness * type_change
+
+
+def detect_header_row(band, rows_below=DETECT_ROWS_BELOW):
+    """Most likely header row of a sheet from its raw top rows, or None when unsure"""
+    if band is None or band.empty:
+        return None
+    best_row, best_score = None, MIN_HEADER_SCORE
+    for row in range(len(band) - 1):
+        score = header_score(band, row, rows_below)
+        if score > best_score + 1e-9:
+            best_row, best_score = row, score
+    return best_row
@@ -0,0 +1,83 @@
+"""
+Import Schema Module
+Handles declared column types for imports for the XLS Editor
+
+An import schema (a small JSON file) names the columns of an export template
+and declares their types: text, category, integer, number, boolean or date.
+While a schema is in use, the readers build the declared columns directly in
+those types: the native and streaming xlsx readers collect the cells of such a
+column without numeric/object inference, and the CSV reader pins the C
+parser's dtypes, skipping its inference sample when every column is declared.
+The dtype optimizer then leaves the declared text, category, boolean and date
+columns alone. Codes such as Omniclass numbers (23-13 11 21 13) declared as
+text therefore come out as text on every import, whatever the values of a given
+file look like. Columns the schema does not name are inferred as before.
+
+Generate Import Schema writes the dtypes of the loaded sheet as a schema to
+start from. Reads with a schema bypass the parse cache, whose entries hold
+inferred parses.
+
+This module holds the File menu actions; the file format and the type
+conversions the readers use live in schema_types, which does not need Tk.
+"""
+
+import os
+from tkinter import filedialog, messagebox
+
+from schema_types import IMPORT_SCHEMA_EXTENSION, FIXED_TYPES, declared, generate, read_schema, write_schema
+
+
+class ImportSchema:
+    def __init__(self, editor_instance):
+        self.editor = editor_instance
+        self.columns = None  # {column: type} of the schema in use, None = infer every column
+        self.name = None
+
+    def filetypes(self):
+        return [(self.editor.tr("Import schema"), f"*{IMPORT_SCHEMA_EXTENSION}"), (self.editor.tr("All files"), "*.*")]
+
+    def reader_dtypes(self):
+        """dtypes= for workbook_reader calls, or None"""
+        return self.columns or None
+
+    def fixed_columns(self, df):
+        """Declared columns of df the dtype optimizer must not convert"""
+        return [column for column in df.columns if declared(self.columns, column) in FIXED_TYPES]
+
+    def use_schema(self):
+        """Pick a schema that declares the column types of the following imports"""
+        editor = self.editor
+        file_path = filedialog.askopenfilename(title=editor.tr("Use Import Schema"), filetypes=self.filetypes())
+        if not file_path:
+            return
+        try:
+            self.columns = read_schema(file_path)
+        except Exception as e:
+            messagebox.showerror(editor.tr("Error"), f"{editor.tr('Failed to open import schema')}:\n{str(e)}")
+            return
+        self.name = os.path.basename(file_path)
+        editor.status_var.set(f"{editor.tr('Import schema in use')}: {self.name} ({len(self.columns)})")
+
+    def clear_schema(self):
+        """Go back to inferring the type of every column"""
+        self.columns = None
+        self.name = None
+        self.editor.status_var.set(self.editor.tr("Import schema cleared"))
+
+    def generate_schema(self):
+        """Write the column types of the current sheet as an import schema"""
+        editor = self.editor
+        if editor.original_df is None:
+            messagebox.showwarning(editor.tr("Warning"), editor.tr("No file is currently loaded."))
+            return
+        file_path = filedialog.asksaveasfilename(title=editor.tr("Generate Import Schema"),
+                                                 defaultextension=IMPORT_SCHEMA_EXTENSION, filetypes=self.filetypes())
+        if not file_path:
+            return
+        # Formula fields are calculated, not imported
+        columns = [column for column in editor.original_df.columns if column not in editor.formula_fields]
+        try:
+            write_schema(file_path, generate(editor.original_df[columns]))
+            editor.status_var.set(f"{editor.tr('Import schema saved')}: {os.path.basename(file_path)}")
+        except Exception as e:
+            messagebox.showerror(editor.tr("Error"), f"{editor.tr('Failed to save import schema')}:\n{str(e)}")
@@ -0,0 +1,119 @@
+"""
+Lazy Sheets Module
+Handles on-demand parsing of workbook sheets for the XLS Editor
+
+LazySheets is the SheetOperations.available_sheets mapping for multi-sheet
+imports. It knows every sheet name up front but only parses a sheet the first
+time its DataFrame is requested (switching to it, a formula referencing it,
+saving). Membership tests, len() and iteration over names never parse, and
+column names can be listed from the header band without a full parse. The
+remaining sheets can optionally be parsed on a background thread.
+"""
+
+import threading
+from collections.abc import MutableMapping
+
+
+class LazySheets(MutableMapping):
+    def __init__(self, names, loader, describer=None, loaded=None):
+        """loader(name) -> DataFrame parses a sheet; describer(name) -> column list (or None) lists it cheaply"""
+        self.names = list(names)
+        self._frames = dict(loaded or {})
+        self._loader = loader
+        self._describer = describer
+        self._columns = {}
+        self._lock = threading.RLock()  # Serializes parsing (the workbook handle is shared with prefetch)
+        self._stop = threading.Event()
+        self._cleanups = []
+
+    # Mapping protocol
+    def __getitem__(self, name):
+        if name not in self._frames:
+            if name not in self.names:
+                raise KeyError(name)
+            with self._lock:
+                if name not in self._frames:
+                    self._frames[name] = self._loader(name)
+        return self._frames[name]
+
+    def __setitem__(self, name, df):
+        with self._lock:
+            if name not in self.names:
+                self.names.append(name)
+            self._frames[name] = df
+
+    def __delitem__(self, name):
+        with self._lock:
+            self.names.remove(name)
+            self._frames.pop(name, None)
+            self._columns.pop(name, None)
+
+    def __iter__(self):
+        return iter(list(self.names))
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.names  # Never triggers a parse
+
+    @property
+    def lock(self):
+        """Lock held around every loader/describer call, for state the loader keeps across threads"""
+        return self._lock
+
+    # Lazy loading
+    def is_loaded(self, name):
+        return name in self._frames
+
+    def pending(self):
+        """Sheets that have not been parsed yet"""
+        return [name for name in self.names if name not in self._frames]
+
+    def columns(self, name):
+        """Column names of a sheet, without parsing it when the describer can tell"""
+        if name in self._frames:
+            return list(self._frames[name].columns)
+        if name not in self._columns:
+            described = None
+            if self._describer is not None:
+                with self._lock:
+                    described = self._describer(name)
+            self._columns[name] = described if described is not None else list(self[name].columns)
+        return list(self._columns[name])
+
+    def prefetch(self):
+        """Parse the remaining sheets one by one on a background thread"""
+        def run():
+            for name in self.pending():
+                if self._stop.is_set():
+                    return
+                try:
+                    self[name]
+                except Exception:
+                    continue  # The error is reported when the sheet is opened
+        threading.Thread(target=run, daemon=True).start()
+
+    def add_cleanup(self, callback):
+        """Run callback (e.g. close the workbook handle) when the store is closed"""
+        self._cleanups.append(callback)
+
+    def release(self):
+        """Run the cleanups (close the workbook handle) but keep the store usable, e.g. before the file is replaced"""
+        with self._lock:
+            for callback in self._cleanups:
+                try:
+                    callback()
+                except Exception:
+                    pass
+
+    def close(self):
+        """Stop prefetching and release the workbook once no sheet is being parsed"""
+        self._stop.set()
+        with self._lock:
+            for callback in self._cleanups:
+                try:
+                    callback()
+                except Exception:
+                    pass
+            self._cleanups = []
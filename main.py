@@ -20,12 +20,26 @@ from filter_operations import FilterOperations
 from formula_operations import FormulaOperations
 from schedule_properties import ScheduleProperties
 from sheet_operations import SheetOperations
+from undo_manager import UndoManager
+from column_store import enable_copy_on_write, view
+from dtype_optimizer import merge_reports
+from parse_cache import ParseCache
+from memmap_store import MemmapStore
+from sqlite_store import SqliteStore
+from autosave import Autosave
+from edit_journal import EditJournal
+from workspace import Workspace
+from schedule_view import ScheduleView
+from import_schema import ImportSchema
 
 
 class XLSEditor:
     def __init__(self, root):
         self.root = root
         
+        # Sheet projections (df, filtered_df, ...) share buffers until mutated
+        enable_copy_on_write()
+        
         # Initialize translation manager first
         self.translation_manager = TranslationManager()
         
@@ -51,10 +65,55 @@ class XLSEditor:
             'outline': True
         }
         
+        # Import pipeline settings
+        self.import_settings = {
+            'optimize_dtypes': True,  # Downcast numerics / categorize text on import
+            'parallel_workers': min(os.cpu_count() or 1, 4),  # Worker processes for multi-sheet imports (1 = serial)
+            'parse_cache': True,  # Reuse parsed sheets of unchanged workbooks
+            'parse_cache_bytes': 512 * 1024 * 1024,  # Size cap of the on-disk parse cache
+            'streaming_threshold_bytes': 20 * 1024 * 1024,  # Stream xlsx files at least this large (None = never)
+            'auto_detect_header': True,  # Guess each sheet's header row from its first rows (falls back to header_row)
+            'lazy_sheets': True,  # Parse other sheets of a workbook only when first viewed or referenced
+            'prefetch_sheets': False,  # Parse the remaining sheets in the background while idle
+            'reader_engine': 'native',  # 'native' = zipfile/iterparse xlsx reader (openpyxl fallback), 'openpyxl' = pandas/openpyxl only
+            'csv_dtypes': None,  # {column: dtype} pinned when reading CSV/TSV files (others are inferred from a sample)
+            'memmap_store': False,  # Keep large sheets in memory-mapped column files instead of RAM
+            'memmap_min_rows': 200000,  # Sheets at least this long go to the memmap store
+            'sqlite_store': False,  # Push filters and sorting of large sheets down to a scratch SQLite database
+            'sqlite_min_rows': 1000000,  # Sheets at least this long are queried through SQLite
+            'preview_rows': 1000,  # Rows shown while a large file is still being imported (0 = no preview)
+            'preview_threshold_bytes': 2 * 1024 * 1024  # Preview files at least this large (None = never)
+        }
+        
+        # On-disk cache of parsed sheets (keyed by file identity, header row and sheet)
+        self.parse_cache = ParseCache(max_bytes=self.import_settings['parse_cache_bytes'])
+        self.parse_cache.enabled = self.import_settings['parse_cache']
+        
+        # Scratch files backing memory-mapped sheets (import_settings['memmap_store'])
+        self.memmap_store = MemmapStore()
+        
+        # Scratch SQLite database for filter/sort pushdown (import_settings['sqlite_store'])
+        self.sqlite_store = SqliteStore()
+        
         # Formula-related attributes
         self.formula_fields = {}  # Dictionary to store formula fields and their expressions
         self.formula_templates = {}  # Dictionary to store saved formula templates
         
+        # Undo history memory budget in bytes (oldest history is evicted beyond this)
+        self.undo_memory_limit = 64 * 1024 * 1024
+        
+        # Background autosave of unsaved changes (offered for recovery after a crash)
+        self.autosave_settings = {
+            'enabled': True,
+            'interval_seconds': 60,  # Time between snapshots
+            'directory': None  # Recovery directory (None = per-user cache directory)
+        }
+        
+        # Write-ahead journal of edits next to the workbook (Quick Save only syncs it)
+        self.journal_settings = {
+            'enabled': True
+        }
+        
         # Initialize operation modules
         self.file_ops = FileOperations(self)
         self.data_ops = DataManagement(self)
@@ -62,10 +121,24 @@ class XLSEditor:
         self.formula_ops = FormulaOperations(self)
         self.schedule_props = ScheduleProperties(self)
         self.sheet_ops = SheetOperations(self)
+        self.undo_manager = UndoManager(self, max_bytes=self.undo_memory_limit)
+        self.autosave = Autosave(self, directory=self.autosave_settings['directory'])
+        self.journal = EditJournal(self)
+        self.workspace = Workspace(self)
+        self.schedule_view = ScheduleView(self)
+        self.import_schema = ImportSchema(self)
         
         # Create GUI
         self.create_menu()
         self.create_widgets()
+        
+        # Undo/redo shortcuts (bound on root so they survive interface refreshes)
+        self.root.bind_all('<Control-z>', self.editing(self.undo_manager.undo))
+        self.root.bind_all('<Control-y>', self.editing(self.undo_manager.redo))
+        self.root.bind_all('<Escape>', self.file_ops.cancel_import)
+        self.root.bind_all('<Control-s>', self.file_ops.quick_save)
+        
+        self.autosave.start()
     
     # Translation methods (delegated to translation manager)
     def tr(self, text):
@@ -110,41 +183,56 @@ class XLSEditor:
         file_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label=self.tr("File"), menu=file_menu)
         file_menu.add_command(label=self.tr("Import XLS File"), command=self.file_ops.smart_import_file)
+        file_menu.add_command(label=self.tr("Use Import Schema"), command=self.import_schema.use_schema)
+        file_menu.add_command(label=self.tr("Generate Import Schema"), command=self.import_schema.generate_schema)
+        file_menu.add_command(label=self.tr("Clear Import Schema"), command=self.import_schema.clear_schema)
         file_menu.add_separator()
+        file_menu.add_command(label=self.tr("Quick Save"), command=self.file_ops.quick_save, accelerator="Ctrl+S")
         file_menu.add_command(label=self.tr("Save"), command=self.file_ops.save_file)
         file_menu.add_command(label=self.tr("Save As"), command=self.file_ops.save_as_file)
+        file_menu.add_command(label=self.tr("Export CSV"), command=self.file_ops.export_csv)
+        file_menu.add_separator()
+        file_menu.add_command(label=self.tr("Open Workspace"), command=self.workspace.open_workspace)
+        file_menu.add_command(label=self.tr("Save Workspace"), command=self.workspace.save_workspace)
         file_menu.add_separator()
         file_menu.add_command(label=self.tr("Exit"), command=self.file_ops.on_closing)
         
         # Sheets menu
         sheets_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label=self.tr("Sheets"), menu=sheets_menu)
-        sheets_menu.add_command(label=self.tr("Create Cross-Sheet Formula"), command=self.create_cross_sheet_formula_dialog)
+        sheets_menu.add_command(label=self.tr("Create Cross-Sheet Formula"), command=self.editing(self.create_cross_sheet_formula_dialog))
         sheets_menu.add_command(label=self.tr("Save All Sheets"), command=self.save_all_sheets)
         
         # Edit menu
         edit_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label=self.tr("Edit"), menu=edit_menu)
-        edit_menu.add_command(label=self.tr("Add Row"), command=self.data_ops.add_row)
-        edit_menu.add_command(label=self.tr("Delete Row"), command=self.data_ops.delete_row)
-        edit_menu.add_command(label=self.tr("Add Column"), command=self.data_ops.add_column)
-        edit_menu.add_command(label=self.tr("Delete Column"), command=self.data_ops.delete_column)
+        edit_menu.add_command(label=self.tr("Undo"), command=self.editing(self.undo_manager.undo), accelerator="Ctrl+Z")
+        edit_menu.add_command(label=self.tr("Redo"), command=self.editing(self.undo_manager.redo), accelerator="Ctrl+Y")
+        edit_menu.add_separator()
+        edit_menu.add_command(label=self.tr("Add Row"), command=self.editing(self.data_ops.add_row))
+        edit_menu.add_command(label=self.tr("Delete Row"), command=self.editing(self.data_ops.delete_row))
+        edit_menu.add_command(label=self.tr("Add Column"), command=self.editing(self.data_ops.add_column))
+        edit_menu.add_command(label=self.tr("Delete Column"), command=self.editing(self.data_ops.delete_column))
         
         # Filter menu
         filter_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label=self.tr("Filter"), menu=filter_menu)
-        filter_menu.add_command(label=self.tr("Clear All Filters"), command=self.filter_ops.clear_all_filters)
-        filter_menu.add_command(label=self.tr("Manage Filters"), command=self.filter_ops.manage_filters)
+        filter_menu.add_command(label=self.tr("Clear All Filters"), command=self.editing(self.filter_ops.clear_all_filters))
+        filter_menu.add_command(label=self.tr("Manage Filters"), command=self.editing(self.filter_ops.manage_filters))
         filter_menu.add_separator()
-        filter_menu.add_command(label=self.tr("Set Header Row"), command=self.set_header_row)
+        filter_menu.add_command(label=self.tr("Set Header Row"), command=self.editing(self.set_header_row))
         
         # Schedule menu (Revit-like features)
         schedule_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label=self.tr("Schedule"), menu=schedule_menu)
-        schedule_menu.add_command(label=self.tr("Schedule Properties"), command=self.schedule_props.open_schedule_properties)
+        schedule_menu.add_command(label=self.tr("Schedule Properties"), command=self.editing(self.schedule_props.open_schedule_properties))
         schedule_menu.add_separator()
-        schedule_menu.add_command(label=self.tr("Add Parameter"), command=self.add_parameter)
-        schedule_menu.add_command(label=self.tr("Remove Parameter"), command=self.remove_parameter)
+        schedule_menu.add_command(label=self.tr("Add Parameter"), command=self.editing(self.add_parameter))
+        schedule_menu.add_command(label=self.tr("Remove Parameter"), command=self.editing(self.remove_parameter))
+        schedule_menu.add_separator()
+        schedule_menu.add_command(label=self.tr("Save Schedule View"), command=self.schedule_view.save_schedule_view)
+        schedule_menu.add_command(label=self.tr("Import with Schedule View"), command=self.schedule_view.import_with_view)
+        schedule_menu.add_command(label=self.tr("Load Remaining Columns"), command=self.editing(self.schedule_view.load_remaining_columns))
         
         # Language menu
         language_menu = tk.Menu(menubar, tearoff=0)
@@ -186,11 +274,11 @@ class XLSEditor:
         filter_frame.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
         filter_frame.columnconfigure(1, weight=1)
         
-        ttk.Button(filter_frame, text="Add Filter", command=self.filter_ops.add_filter).grid(row=0, column=0, padx=(0, 5))
-        ttk.Button(filter_frame, text="Manage", command=self.filter_ops.manage_filters).grid(row=0, column=1, padx=(0, 5))
-        ttk.Button(filter_frame, text="Clear All", command=self.filter_ops.clear_all_filters).grid(row=0, column=2, padx=(0, 5))
-        ttk.Button(filter_frame, text="Header Row", command=self.set_header_row).grid(row=0, column=3, padx=(0, 5))
-        ttk.Button(filter_frame, text="Schedule Properties", command=self.schedule_props.open_schedule_properties).grid(row=0, column=4, padx=(0, 5))
+        ttk.Button(filter_frame, text="Add Filter", command=self.editing(self.filter_ops.add_filter)).grid(row=0, column=0, padx=(0, 5))
+        ttk.Button(filter_frame, text="Manage", command=self.editing(self.filter_ops.manage_filters)).grid(row=0, column=1, padx=(0, 5))
+        ttk.Button(filter_frame, text="Clear All", command=self.editing(self.filter_ops.clear_all_filters)).grid(row=0, column=2, padx=(0, 5))
+        ttk.Button(filter_frame, text="Header Row", command=self.editing(self.set_header_row)).grid(row=0, column=3, padx=(0, 5))
+        ttk.Button(filter_frame, text="Schedule Properties", command=self.editing(self.schedule_props.open_schedule_properties)).grid(row=0, column=4, padx=(0, 5))
         
         # Active filters display
         self.filter_display = ttk.Label(filter_frame, text="No filters active", foreground="gray")
@@ -219,7 +307,11 @@ class XLSEditor:
         # Scrollbars
         v_scrollbar = ttk.Scrollbar(self.tree_frame, orient=tk.VERTICAL, command=self.tree.yview)
         v_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
-        self.tree.configure(yscrollcommand=v_scrollbar.set)
+        
+        def on_tree_scrolled(first, last):
+            v_scrollbar.set(first, last)
+            self.data_ops.on_tree_scrolled(first, last)
+        self.tree.configure(yscrollcommand=on_tree_scrolled)
         
         h_scrollbar = ttk.Scrollbar(self.tree_frame, orient=tk.HORIZONTAL, command=self.tree.xview)
         h_scrollbar.grid(row=1, column=0, sticky=(tk.W, tk.E))
@@ -229,10 +321,49 @@ class XLSEditor:
         self.tree.bind('<Double-1>', self.data_ops.on_cell_double_click)
         
         # Status bar
+        status_frame = ttk.Frame(main_frame)
+        status_frame.grid(row=4, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(10, 0))
+        status_frame.columnconfigure(0, weight=1)
+        
         self.status_var = tk.StringVar()
         self.status_var.set("Ready")
-        status_bar = ttk.Label(main_frame, textvariable=self.status_var, relief=tk.SUNKEN)
-        status_bar.grid(row=4, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(10, 0))
+        status_bar = ttk.Label(status_frame, textvariable=self.status_var, relief=tk.SUNKEN)
+        status_bar.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        
+        # Import progress (only shown while a file is loading in the background)
+        self.import_progress = ttk.Progressbar(status_frame, length=160, mode='indeterminate')
+        self.import_cancel_button = ttk.Button(status_frame, text=self.tr("Cancel"), command=self.file_ops.cancel_import)
+    
+    def editing(self, command):
+        """command (menu, button or shortcut) that changes the data, held back while the grid shows an import preview"""
+        def run(*args):
+            if self.data_ops.previewing:
+                self.status_var.set(self.tr("Editing is available once the import finishes"))
+                return None
+            return command(*args)
+        return run
+    
+    # Import progress
+    def show_import_progress(self):
+        """Show the progress bar and Cancel button next to the status bar"""
+        self.import_progress.config(mode='indeterminate', value=0)
+        self.import_progress.grid(row=0, column=1, padx=(5, 0))
+        self.import_cancel_button.grid(row=0, column=2, padx=(5, 0))
+        self.import_progress.start(15)
+    
+    def set_import_progress(self, done, total=None):
+        """Switch to a determinate bar once the total amount of work is known"""
+        if not total:
+            return
+        if str(self.import_progress.cget('mode')) != 'determinate':
+            self.import_progress.stop()
+            self.import_progress.config(mode='determinate', maximum=total)
+        self.import_progress.config(value=min(done, total))
+    
+    def hide_import_progress(self):
+        self.import_progress.stop()
+        self.import_progress.grid_remove()
+        self.import_cancel_button.grid_remove()
     
     # Header management
     def update_header_display(self):
@@ -248,15 +379,15 @@ class XLSEditor:
         # Create header row selection dialog
         dialog = tk.Toplevel(self.root)
         dialog.title("Set Header Row")
-        dialog.geometry("300x200")
+        dialog.geometry("300x230")
         dialog.transient(self.root)
         dialog.grab_set()
         
         # Center the dialog
         dialog.update_idletasks()
         x = (dialog.winfo_screenwidth() // 2) - (300 // 2)
-        y = (dialog.winfo_screenheight() // 2) - (200 // 2)
-        dialog.geometry(f"300x200+{x}+{y}")
+        y = (dialog.winfo_screenheight() // 2) - (230 // 2)
+        dialog.geometry(f"300x230+{x}+{y}")
         
         # Current header info
         ttk.Label(dialog, text=f"Current header row: {self.header_row + 1}", 
@@ -284,6 +415,11 @@ class XLSEditor:
         custom_entry = ttk.Entry(custom_frame, textvariable=custom_var, width=5)
         custom_entry.pack(side=tk.LEFT, padx=5)
         
+        # Each sheet keeps its own header row unless applied to all of them
+        all_sheets_var = tk.BooleanVar(value=False)
+        if len(self.sheet_ops.available_sheets) > 1:
+            ttk.Checkbutton(dialog, text="Apply to all loaded sheets", variable=all_sheets_var).pack(pady=2)
+        
         def apply_header_change():
             """Apply the header row change"""
             new_header_row = row_var.get() - 1  # Convert to 0-based index
@@ -298,7 +434,7 @@ class XLSEditor:
                     messagebox.showerror("Error", "Please enter a valid row number.")
                     return
             
-            if new_header_row == self.header_row:
+            if new_header_row == self.header_row and not all_sheets_var.get():
                 dialog.destroy()
                 return
                 
@@ -309,32 +445,15 @@ class XLSEditor:
                 if not result:
                     return
             
-            self.header_row = new_header_row
-            self.active_filters = {}
-            self.filtered_df = None
-            
-            # Reload the file with new header row
-            try:
-                if self.current_file.endswith('.xlsx'):
-                    self.original_df = pd.read_excel(self.current_file, engine='openpyxl', header=self.header_row)
-                else:
-                    self.original_df = pd.read_excel(self.current_file, engine='xlrd', header=self.header_row)
-                
-                # Reset visible columns and working dataframe
-                self.df = self.original_df.copy()
-                self.visible_columns = list(self.df.columns)
-                
-                self.data_ops.populate_treeview()
-                self.filter_ops.update_filter_display()
-                self.update_header_display()
-                self.status_var.set(f"Header row changed to row {self.header_row + 1}")
-                dialog.destroy()
-                
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to reload file with new header row:\n{str(e)}")
-                # Revert to previous header row
-                self.header_row = 0
-                self.update_header_display()
+            # Re-slice the loaded data in memory; only sheets that cannot be re-headed are read again
+            pending, reports = self.sheet_ops.change_header_row(new_header_row, all_sheets_var.get())
+            if pending:
+                if self.sheet_ops.reload_sheets_with_header(pending, new_header_row) is None:
+                    return
+            else:
+                self.status_var.set(self.file_ops.with_memory_report(f"Header row changed to row {self.header_row + 1}",
+                                                                     merge_reports(reports) if reports else None))
+            dialog.destroy()
         
         # Buttons
         button_frame = ttk.Frame(dialog)
@@ -359,7 +478,7 @@ class XLSEditor:
             if hasattr(self.sheet_ops, 'current_sheet') and self.sheet_ops.current_sheet:
                 current_sheet_name = self.sheet_ops.current_sheet
                 if current_sheet_name in self.sheet_ops.available_sheets:
-                    self.sheet_ops.available_sheets[current_sheet_name] = self.df.copy()
+                    self.sheet_ops.available_sheets[current_sheet_name] = view(self.df)
 
     # Sheet operations delegation methods
     def create_cross_sheet_formula_dialog(self):
@@ -411,9 +530,9 @@ class XLSEditor:
         
         # Populate fields info
         fields_info = "Available fields for formulas:\n\n"
-        for sheet_name, df in self.sheet_ops.available_sheets.items():
+        for sheet_name in self.sheet_ops.available_sheets:
             fields_info += f"Sheet '{sheet_name}':\n"
-            for col in df.columns:
+            for col in self.sheet_ops.get_sheet_columns(sheet_name):
                 fields_info += f"  {sheet_name}.{col}\n"
             fields_info += "\n"
         
@@ -475,7 +594,7 @@ class XLSEditor:
             ]
         )
         
-        if file_path:
+        if file_path and self.schedule_view.complete_for_save():
             self.sheet_ops.save_all_sheets(file_path)
 
 
@@ -487,8 +606,16 @@ def main():
     # Handle window closing
     root.protocol("WM_DELETE_WINDOW", app.file_ops.on_closing)
     
+    # Offer the autosave of a session that did not exit normally
+    root.after_idle(app.autosave.offer_recovery)
+    
     # Start the application
     root.mainloop()
+    
+    # Normal exit: the recovery files are no longer needed
+    app.autosave.shutdown()
+    app.memmap_store.close()
+    app.sqlite_store.close()
 
 
 if __name__ == "__main__":
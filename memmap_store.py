@@ -0,0 +1,149 @@
+"""
+Memmap Store Module
+Handles the memory-mapped column storage of large sheets for the XLS Editor
+
+When import_settings['memmap_store'] is on, every imported sheet with at least
+import_settings['memmap_min_rows'] rows is spilled into a per-session scratch
+directory right after the dtype optimizer ran, and the DataFrame put into
+SheetOperations.available_sheets is rebuilt on top of the files:
+
+- numeric, boolean and datetime columns are .npy files opened with
+  numpy.load(mmap_mode='c') - the column array is the mapping itself;
+- nullable (Int64, Float64, boolean) columns are a values and a mask file;
+- text and categorical columns are dictionary encoded: a codes .npy file plus
+  the distinct strings as an offsets .npy file and a UTF-8 bytes blob. Only
+  the dictionary is decoded into Python strings (the categories of a
+  pandas Categorical whose codes are the mapped file); the dictionary is
+  sorted, so sorting by codes is sorting by text;
+- anything else (mixed object columns) stays in memory.
+
+Pages are read in by the OS when a filter, sort or formula touches them and
+can be dropped again under memory pressure. Files are opened copy-on-write,
+so edits never reach them, and unlinked as soon as they are mapped where the
+OS allows it; the session directory (a tempfile.mkdtemp directory private to
+the user) is removed at exit.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+from column_store import encode_text
+
+
+DEFAULT_MIN_ROWS = 200000
+MASKED_ARRAYS = (pd.arrays.IntegerArray, pd.arrays.FloatingArray, pd.arrays.BooleanArray)
+
+
+def _sorted_dictionary(codes, uniques):
+    """Reorder a text dictionary alphabetically and renumber the codes to match"""
+    order = np.argsort(uniques, kind='stable')
+    rank = np.empty(len(order), dtype=codes.dtype)
+    rank[order] = np.arange(len(order), dtype=codes.dtype)
+    codes = np.where(codes >= 0, rank.take(codes, mode='clip'), -1).astype(codes.dtype)
+    return codes, uniques[order]
+
+
+class MemmapStore:
+    def __init__(self, directory=None):
+        self.directory = directory  # Parent of the session directory (None = the system temp directory)
+        self.session_dir = None     # Created on first spill
+        self._counter = 0
+        self._lock = threading.Lock()  # Sheets are spilled from import worker threads
+
+    def _session(self):
+        """This session's scratch directory; mkdtemp makes a fresh one only this user can enter"""
+        with self._lock:
+            if self.session_dir is None:
+                if self.directory:
+                    os.makedirs(self.directory, exist_ok=True)
+                self.session_dir = tempfile.mkdtemp(prefix='schedule_editor-', dir=self.directory)
+            return self.session_dir
+
+    def _path(self, suffix):
+        session_dir = self._session()
+        with self._lock:
+            self._counter += 1
+            number = self._counter
+        return os.path.join(session_dir, f"col{number}{suffix}")
+
+    def _unlink(self, path):
+        # The mapping keeps the data alive on POSIX; Windows refuses while mapped (cleared at exit instead)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    # Writing and mapping single arrays
+    def map_array(self, values):
+        """Write a numpy array to a scratch .npy file and return a copy-on-write mapped view of it"""
+        path = self._path('.npy')
+        np.save(path, np.ascontiguousarray(values), allow_pickle=False)
+        mapped = np.load(path, mmap_mode='c') if values.size else np.load(path)
+        self._unlink(path)
+        return mapped.view(np.ndarray)
+
+    def map_strings(self, strings):
+        """Store distinct strings as an offsets array plus a UTF-8 blob; returns them decoded
+
+        Only the dictionary goes through Python strings - one object per
+        distinct value, however many rows refer to it.
+        """
+        encoded = [value.encode('utf-8', 'surrogatepass') for value in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.array([len(value) for value in encoded], dtype=np.int64))
+        blob_path = self._path('.bin')
+        with open(blob_path, 'wb') as f:
+            f.writelines(encoded)
+        offsets = self.map_array(offsets)
+        if offsets[-1]:
+            blob = np.memmap(blob_path, dtype=np.uint8, mode='r')
+        else:
+            blob = np.zeros(0, dtype=np.uint8)
+        try:
+            return [bytes(blob[offsets[i]:offsets[i + 1]]).decode('utf-8', 'surrogatepass') for i in range(len(encoded))]
+        finally:
+            del blob
+            self._unlink(blob_path)
+
+    # Sheets
+    def spill(self, df):
+        """Rebuild a DataFrame on memory-mapped column files (columns that cannot be mapped stay as they are)"""
+        arrays = {}
+        for position in range(df.shape[1]):
+            series = df.iloc[:, position]
+            arrays[position] = self.spill_column(series)
+        spilled = pd.DataFrame(arrays, index=df.index, copy=False)
+        spilled.columns = df.columns
+        return spilled
+
+    def spill_column(self, series):
+        """Memory-mapped equivalent of one column (the column itself if it has no mapped form)"""
+        dtype = series.dtype
+        values = series.array
+        if isinstance(dtype, np.dtype) and dtype.kind in 'biufcmM':
+            return self.map_array(series.to_numpy())
+        if isinstance(values, MASKED_ARRAYS):
+            return type(values)(self.map_array(values._data), self.map_array(values._mask))
+        if isinstance(dtype, pd.CategoricalDtype):
+            if not all(isinstance(value, str) for value in dtype.categories):
+                return values
+            return pd.Categorical.from_codes(self.map_array(values.codes),
+                                             dtype=pd.CategoricalDtype(self.map_strings(dtype.categories), dtype.ordered),
+                                             validate=False)
+        text = encode_text(series)
+        if text is None:
+            return values
+        codes, uniques = _sorted_dictionary(*text)
+        return pd.Categorical.from_codes(self.map_array(codes), categories=self.map_strings(uniques), validate=False)
+
+    def close(self):
+        """Remove this session's scratch files"""
+        with self._lock:
+            session_dir, self.session_dir = self.session_dir, None
+        if session_dir is not None:
+            shutil.rmtree(session_dir, ignore_errors=True)
@@ -0,0 +1,193 @@
+"""
+Parse Cache Module
+Handles the on-disk cache of parsed sheets for the XLS Editor
+
+Parsed sheets are stored as column_store.pack_frame() payloads pickled with
+protocol 5, with the numpy column buffers written out-of-band after the pickle
+stream, so a cache hit is one file read plus a zero-copy unpickle instead of a
+full openpyxl XML parse. Entries are keyed by the workbook's path, size, mtime
+and content hash together with the header row and sheet, and the directory is
+kept under a size cap by evicting the least recently used entries.
+"""
+
+import os
+import pickle
+import struct
+import hashlib
+
+from column_store import pack_frame, unpack_frame
+
+
+CACHE_MAGIC = b'XLSEPC01'
+HASH_CHUNK = 1024 * 1024
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+
+
+def default_cache_dir():
+    """Per-user cache directory for parsed workbooks"""
+    base = os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'schedule_editor', 'parse_cache')
+
+
+def encode_payload(obj):
+    """Header + pickle stream + out-of-band buffers (a list of byte chunks to write in order)"""
+    buffers = []
+    stream = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+    raws = [buffer.raw() for buffer in buffers]
+    header = CACHE_MAGIC + struct.pack(f'<QI{len(raws)}Q', len(stream), len(raws), *(raw.nbytes for raw in raws))
+    return [header, stream] + raws
+
+
+def decode_payload(data):
+    """Inverse of encode_payload(); buffers are zero-copy slices of data"""
+    if bytes(data[:len(CACHE_MAGIC)]) != CACHE_MAGIC:
+        raise ValueError("Not a parse cache entry")
+    offset = len(CACHE_MAGIC)
+    stream_size, count = struct.unpack_from('<QI', data, offset)
+    offset += 12
+    sizes = struct.unpack_from(f'<{count}Q', data, offset)
+    offset += 8 * count
+    view = memoryview(data)
+    stream = view[offset:offset + stream_size]
+    offset += stream_size
+    buffers = []
+    for size in sizes:
+        buffers.append(view[offset:offset + size])
+        offset += size
+    return pickle.loads(stream, buffers=buffers)
+
+
+class ParseCache:
+    def __init__(self, directory=None, max_bytes=DEFAULT_CACHE_BYTES):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.enabled = True
+        self._fingerprints = {}  # (path, size, mtime) -> content digest, so each file is hashed once
+
+    # Keys
+    def fingerprint(self, file_path):
+        """(path, size, mtime, content hash) identifying one version of a workbook"""
+        path = os.path.abspath(file_path)
+        stat = os.stat(path)
+        identity = (path, stat.st_size, stat.st_mtime_ns)
+        digest = self._fingerprints.get(identity)
+        if digest is None:
+            hasher = hashlib.blake2b(digest_size=16)
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+                    hasher.update(chunk)
+            digest = hasher.hexdigest()
+            self._fingerprints[identity] = digest
+        return identity + (digest,)
+
+    def key(self, file_path, sheet, header):
+        """Cache file name for one sheet parsed with a given header row"""
+        raw = repr((self.fingerprint(file_path), str(sheet), header)).encode('utf-8')
+        return hashlib.blake2b(raw, digest_size=20).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, key + '.bin')
+
+    # Reading / writing
+    def _read(self, file_path, sheet, header):
+        """Raw cached object for (file, sheet, header) or None on a miss"""
+        if not self.enabled:
+            return None
+        try:
+            entry = self._entry_path(self.key(file_path, sheet, header))
+            if not os.path.exists(entry):
+                return None
+            with open(entry, 'rb') as f:
+                data = bytearray(os.fstat(f.fileno()).st_size)
+                f.readinto(data)
+            os.utime(entry)  # Mark as recently used
+            return decode_payload(data)
+        except Exception:
+            self._discard(file_path, sheet, header)
+            return None
+
+    def _write(self, file_path, sheet, header, obj):
+        """Store obj for (file, sheet, header); failures only cost a future cache miss"""
+        if not self.enabled:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            entry = self._entry_path(self.key(file_path, sheet, header))
+            temp_path = entry + '.tmp'
+            with open(temp_path, 'wb') as f:
+                for part in encode_payload(obj):
+                    f.write(part)
+            os.replace(temp_path, entry)
+            self.evict()
+        except Exception:
+            pass
+
+    def _discard(self, file_path, sheet, header):
+        try:
+            os.remove(self._entry_path(self.key(file_path, sheet, header)))
+        except OSError:
+            pass
+
+    # Public API
+    def get_sheet(self, file_path, sheet, header):
+        """Cached DataFrame for a sheet, or None"""
+        payload = self._read(file_path, sheet, header)
+        return unpack_frame(payload) if payload is not None else None
+
+    def put_sheet(self, file_path, sheet, header, df):
+        self._write(file_path, sheet, header, pack_frame(df))
+
+    def has_sheet(self, file_path, sheet, header):
+        """Whether a sheet is cached (without reading it)"""
+        if not self.enabled:
+            return False
+        try:
+            return os.path.exists(self._entry_path(self.key(file_path, sheet, header)))
+        except OSError:
+            return False
+
+    def get_sheet_names(self, file_path):
+        """Cached sheet list of a workbook, or None"""
+        return self._read(file_path, None, None)
+
+    def put_sheet_names(self, file_path, names):
+        self._write(file_path, None, None, list(names))
+
+    def size(self):
+        """Total bytes currently used by the cache directory"""
+        return sum(size for _, size, _ in self._entries())
+
+    def _entries(self):
+        """(path, size, last_used) for every cache entry"""
+        entries = []
+        try:
+            with os.scandir(self.directory) as scan:
+                for item in scan:
+                    if item.is_file() and item.name.endswith('.bin'):
+                        stat = item.stat()
+                        entries.append((item.path, stat.st_size, stat.st_mtime))
+        except OSError:
+            pass
+        return entries
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        """Delete every cached entry"""
+        for path, _, _ in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._fingerprints = {}
@@ -7,6 +7,8 @@ import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
 import pandas as pd
 
+from column_store import view
+
 
 class ScheduleProperties:
     def __init__(self, editor_instance):
@@ -70,10 +72,11 @@ class ScheduleProperties:
                     self.editor.visible_columns = new_visible_columns
                     # Update working dataframe to show only visible columns in correct order
                     if self.editor.visible_columns:
-                        self.editor.df = self.editor.original_df[self.editor.visible_columns].copy()
+                        self.editor.df = view(self.editor.original_df, self.editor.visible_columns)
                     else:
-                        self.editor.df = self.editor.original_df.copy()
+                        self.editor.df = view(self.editor.original_df)
                     self.editor.modified = True
+                    self.editor.sheet_ops.mark_dirty()
                     
             # Apply appearance settings
             if hasattr(self.editor, 'appearance_vars'):
@@ -113,10 +116,10 @@ class ScheduleProperties:
         # Populate available fields (from all sheets if available)
         if hasattr(self.editor, 'sheet_ops') and self.editor.sheet_ops.available_sheets:
             # Multi-sheet mode: show fields from all sheets
-            for sheet_name, df in self.editor.sheet_ops.available_sheets.items():
+            for sheet_name in self.editor.sheet_ops.available_sheets:
                 # Add sheet header
                 self.editor.available_fields_listbox.insert(tk.END, f"--- {sheet_name} ---")
-                for col in df.columns:
+                for col in self.editor.sheet_ops.get_sheet_columns(sheet_name):
                     self.editor.available_fields_listbox.insert(tk.END, f"{sheet_name}.{col}")
         elif self.editor.original_df is not None:
             # Single sheet mode: show current sheet fields
@@ -382,9 +385,9 @@ class ScheduleProperties:
         # Reset dataframes to original order
         if self.editor.original_df is not None:
             if self.editor.visible_columns:
-                self.editor.df = self.editor.original_df[self.editor.visible_columns].copy()
+                self.editor.df = view(self.editor.original_df, self.editor.visible_columns)
             else:
-                self.editor.df = self.editor.original_df.copy()
+                self.editor.df = view(self.editor.original_df)
                 
         self.update_sort_status()
         messagebox.showinfo("Clear Sort", "All sorting cleared!")
@@ -547,10 +550,10 @@ class ScheduleProperties:
         # Populate available fields - include fields from all sheets if available
         if hasattr(self.editor, 'sheet_ops') and self.editor.sheet_ops.available_sheets:
             # Multi-sheet mode: show fields from all sheets
-            for sheet_name, df in self.editor.sheet_ops.available_sheets.items():
+            for sheet_name in self.editor.sheet_ops.available_sheets:
                 # Add sheet header
                 self.editor.available_fields_formula.insert(tk.END, f"=== {sheet_name} ===")
-                for col in df.columns:
+                for col in self.editor.sheet_ops.get_sheet_columns(sheet_name):
                     # Format: SheetName.FieldName for cross-sheet reference
                     if sheet_name == self.editor.sheet_ops.current_sheet:
                         # Current sheet - show both formats
@@ -735,30 +738,47 @@ Tip: Click π button to insert 3.141592"""
         # Apply sorting to the appropriate dataframe
         if sort_columns:
             try:
-                # Determine which dataframe to sort
-                if self.editor.filtered_df is not None:
-                    # Sort the filtered dataframe
-                    sorted_df = self.editor.filtered_df.sort_values(by=sort_columns, ascending=sort_ascending)
-                    self.editor.filtered_df = sorted_df
+                sort = list(zip(sort_columns, sort_ascending))
+                order = self.editor.filter_ops.query_rows(sort=sort)
+                if order is not None:
+                    # SQLite ordered the rows: reorder the frames by position
+                    if self.editor.filtered_df is not None:
+                        rows = self.editor.filter_ops.query_rows(filters=list(self.editor.active_filters.values()), sort=sort)
+                        if rows is not None:
+                            self.editor.filtered_df = self.editor.df.take(rows)
+                        else:
+                            self.editor.filtered_df = self.editor.filtered_df.sort_values(by=sort_columns, ascending=sort_ascending)
+                    self.editor.original_df = self.editor.original_df.take(order)
+                    if self.editor.visible_columns:
+                        self.editor.df = view(self.editor.original_df, self.editor.visible_columns)
+                    else:
+                        self.editor.df = view(self.editor.original_df)
                 else:
-                    # Sort the main working dataframe
-                    sorted_df = self.editor.df.sort_values(by=sort_columns, ascending=sort_ascending)
-                    self.editor.df = sorted_df
+                    # Determine which dataframe to sort
+                    if self.editor.filtered_df is not None:
+                        # Sort the filtered dataframe
+                        sorted_df = self.editor.filtered_df.sort_values(by=sort_columns, ascending=sort_ascending)
+                        self.editor.filtered_df = sorted_df
+                    else:
+                        # Sort the main working dataframe
+                        sorted_df = self.editor.df.sort_values(by=sort_columns, ascending=sort_ascending)
+                        self.editor.df = sorted_df
                     
-                # Also sort the original dataframe to maintain consistency
-                if sort_columns:
-                    available_sort_cols = [col for col in sort_columns if col in self.editor.original_df.columns]
-                    if available_sort_cols:
-                        available_ascending = [sort_ascending[i] for i, col in enumerate(sort_columns) if col in available_sort_cols]
-                        self.editor.original_df = self.editor.original_df.sort_values(by=available_sort_cols, ascending=available_ascending)
+                    # Also sort the original dataframe to maintain consistency
+                    if sort_columns:
+                        available_sort_cols = [col for col in sort_columns if col in self.editor.original_df.columns]
+                        if available_sort_cols:
+                            available_ascending = [sort_ascending[i] for i, col in enumerate(sort_columns) if col in available_sort_cols]
+                            self.editor.original_df = self.editor.original_df.sort_values(by=available_sort_cols, ascending=available_ascending)
                         
-                        # Update the working dataframe with new order
-                        if self.editor.visible_columns:
-                            self.editor.df = self.editor.original_df[self.editor.visible_columns].copy()
-                        else:
-                            self.editor.df = self.editor.original_df.copy()
+                            # Update the working dataframe with new order
+                            if self.editor.visible_columns:
+                                self.editor.df = view(self.editor.original_df, self.editor.visible_columns)
+                            else:
+                                self.editor.df = view(self.editor.original_df)
                             
                 self.editor.modified = True
+                self.editor.sheet_ops.mark_dirty()
                 
             except Exception as e:
                 messagebox.showerror("Sorting Error", f"Failed to apply sorting:\n{str(e)}")
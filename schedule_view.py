@@ -0,0 +1,274 @@
+"""
+Schedule View Module
+Handles schedule definitions and column projection on import for the XLS Editor
+
+A schedule view (a small JSON file) holds the visible columns and formula
+fields of a schedule. Importing with a view reads only the columns that
+schedule needs - its visible columns plus every [Field] its formulas
+reference - through the readers' usecols, so import time and memory follow
+the fields in use instead of the 80+ parameters of a full Revit export. The
+column positions are resolved by name from the header band, before the sheet
+itself is parsed; the view's formulas are then calculated and its columns
+shown.
+
+Projected sheets are recorded in SheetOperations.projected. Load Remaining
+Columns reads the other columns from the unchanged source file and appends
+them, matching rows by index label, as long as no row was inserted or deleted
+since the import. Saving loads the remaining columns first, so nothing is
+dropped from the workbook unless the user agrees to it.
+"""
+
+import json
+import os
+import re
+from tkinter import filedialog, messagebox
+
+import numpy as np
+import pandas as pd
+
+from column_store import view as frame_view
+from edit_journal import file_identity
+from header_band import band_columns
+import workbook_reader
+
+
+SCHEDULE_VIEW_EXTENSION = '.schedview'
+SCHEDULE_VIEW_FORMAT = 1
+
+# [Field], [Field(3)] and Sheet.[Field(3)] references inside formula expressions
+_FIELD_REFERENCE = re.compile(r'\[([^\]]+)\]')
+_ROW_SUFFIX = re.compile(r'\(\d+\)$')
+
+
+def formula_references(expression):
+    """Column names a formula expression refers to"""
+    return {_ROW_SUFFIX.sub('', name).strip() for name in _FIELD_REFERENCE.findall(expression)}
+
+
+def required_columns(schedule_view):
+    """File columns a view needs: its visible columns and formula references, minus the formula fields"""
+    formulas = schedule_view.get('formula_fields', {})
+    required = set(schedule_view.get('visible_columns', []))
+    for definition in formulas.values():
+        required |= formula_references(definition['expression'])
+    return required - set(formulas)
+
+
+def view_positions(schedule_view, band, header):
+    """0-based positions of the columns to read for a view (None: read every column)"""
+    if schedule_view is None or header is None:
+        return None
+    names = band_columns(band, header)
+    if not names:
+        return None
+    required = required_columns(schedule_view)
+    positions = [position for position, name in enumerate(names) if name in required or str(name) in required]
+    if not positions or len(positions) == len(names):
+        return None
+    return positions
+
+
+def read_view(file_path):
+    with open(file_path, encoding='utf-8') as f:
+        schedule_view = json.load(f)
+    if not isinstance(schedule_view, dict) or schedule_view.get('format') != SCHEDULE_VIEW_FORMAT:
+        raise ValueError("Not a schedule view file")
+    return schedule_view
+
+
+def write_view(file_path, visible_columns, formula_fields):
+    schedule_view = {
+        'format': SCHEDULE_VIEW_FORMAT,
+        'visible_columns': list(visible_columns),
+        'formula_fields': {name: {'expression': definition['expression'], 'type': definition['type']}
+                           for name, definition in formula_fields.items()},
+    }
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(schedule_view, f, ensure_ascii=False, indent=2, default=str)
+
+
+def aligned(extra, frame):
+    """extra (rows in file order) reordered to frame's index labels, or None when the rows no longer match"""
+    index = frame.index
+    if len(index) != len(extra) or not pd.api.types.is_integer_dtype(index.dtype):
+        return None
+    labels = index.to_numpy()
+    if not np.array_equal(np.sort(labels), np.arange(len(labels))):
+        return None
+    return extra.take(labels).set_axis(index)
+
+
+class ScheduleView:
+    def __init__(self, editor_instance):
+        self.editor = editor_instance
+
+    def filetypes(self):
+        return [(self.editor.tr("Schedule view"), f"*{SCHEDULE_VIEW_EXTENSION}"), (self.editor.tr("All files"), "*.*")]
+
+    # Schedule definitions
+    def save_schedule_view(self):
+        """Save the visible columns and formula fields of the current sheet as a schedule view"""
+        editor = self.editor
+        if editor.df is None:
+            messagebox.showwarning(editor.tr("Warning"), editor.tr("No file is currently loaded."))
+            return
+        file_path = filedialog.asksaveasfilename(title=editor.tr("Save Schedule View"),
+                                                 defaultextension=SCHEDULE_VIEW_EXTENSION, filetypes=self.filetypes())
+        if not file_path:
+            return
+        try:
+            write_view(file_path, editor.visible_columns or list(editor.df.columns), editor.formula_fields)
+            editor.status_var.set(f"{editor.tr('Schedule view saved')}: {os.path.basename(file_path)}")
+        except Exception as e:
+            messagebox.showerror(editor.tr("Error"), f"{editor.tr('Failed to save schedule view')}:\n{str(e)}")
+
+    def import_with_view(self):
+        """Pick a schedule view, then import a file reading only the columns it uses"""
+        editor = self.editor
+        file_path = filedialog.askopenfilename(title=editor.tr("Import with Schedule View"), filetypes=self.filetypes())
+        if not file_path:
+            return
+        try:
+            schedule_view = read_view(file_path)
+        except Exception as e:
+            messagebox.showerror(editor.tr("Error"), f"{editor.tr('Failed to open schedule view')}:\n{str(e)}")
+            return
+        # The import closures pick the view up while the file (and sheet) dialogs run
+        editor.file_ops.import_view = schedule_view
+        try:
+            editor.file_ops.smart_import_file()
+        finally:
+            editor.file_ops.import_view = None
+
+    def remember(self, file_path, sheet_name, reader_name, positions):
+        """Record that a freshly imported sheet only holds the columns at positions"""
+        if positions is None:
+            return
+        try:
+            identity = file_identity(file_path)
+        except OSError:
+            return
+        self.editor.sheet_ops.projected[sheet_name] = {
+            'file': file_path,
+            'identity': identity,
+            'sheet': reader_name,
+            'positions': list(positions),
+            'rows_moved': False,
+        }
+
+    def apply(self, schedule_view):
+        """Calculate a view's formula fields and show its columns on the sheet just imported"""
+        editor = self.editor
+        if schedule_view is None:
+            return
+        editor.formula_fields = {name: dict(definition) for name, definition in schedule_view.get('formula_fields', {}).items()}
+        for field_name in list(editor.formula_fields):
+            try:
+                editor.formula_ops.calculate_formula_field(field_name)
+            except Exception:
+                del editor.formula_fields[field_name]
+        visible = [column for column in schedule_view.get('visible_columns', []) if column in editor.original_df.columns]
+        if visible:
+            editor.visible_columns = visible
+            editor.df = frame_view(editor.original_df, visible)
+        editor.sync_current_sheet_data()
+        editor.formula_ops.refresh_formula_tree()
+
+    # Remaining columns
+    def read_remaining(self, sheet_name):
+        """The columns a projected sheet left out, in file row order (None if the source changed since)"""
+        editor = self.editor
+        entry = editor.sheet_ops.projected[sheet_name]
+        try:
+            if file_identity(entry['file']) != entry['identity']:
+                return None
+        except OSError:
+            return None
+        header = editor.sheet_ops.header_rows.get(sheet_name, editor.header_row)
+        # A full read: it lands in the parse cache, and the column count is only known after it
+        df = workbook_reader.read_sheet(entry['file'], sheet_name=entry['sheet'], header=header,
+                                        cache=editor.parse_cache, **editor.file_ops.reader_options(entry['file']))
+        loaded = set(entry['positions'])
+        df = df.iloc[:, [position for position in range(df.shape[1]) if position not in loaded]]
+        return editor.file_ops.optimize_imported(df)[0]
+
+    def attach(self, sheet_name, extra):
+        """Append remaining columns to a projected sheet; False when its rows cannot be matched any more"""
+        editor = self.editor
+        sheet_ops = editor.sheet_ops
+        entry = sheet_ops.projected.get(sheet_name)
+        if entry is None or extra is None or entry['rows_moved']:
+            return False
+        current = sheet_name == sheet_ops.current_sheet
+        frame = editor.original_df if current else sheet_ops.available_sheets[sheet_name]
+        extra = extra[[column for column in extra.columns if column not in frame.columns]]
+        extra_for_frame = aligned(extra, frame)
+        extra_for_df = aligned(extra, editor.df) if current else extra_for_frame
+        if extra_for_frame is None or extra_for_df is None:
+            return False
+
+        if current:
+            editor.original_df = pd.concat([editor.original_df, extra_for_frame], axis=1)
+            editor.df = pd.concat([editor.df, extra_for_df], axis=1)
+            if editor.visible_columns:
+                editor.visible_columns.extend(extra.columns)
+            editor.sync_current_sheet_data()
+        else:
+            sheet_ops.available_sheets[sheet_name] = pd.concat([frame, extra_for_frame], axis=1)
+        del sheet_ops.projected[sheet_name]
+        # Unsaved edits are kept as whole frames by autosave and the journal: capture the full one
+        if sheet_name in sheet_ops.dirty_sheets or (current and editor.modified):
+            sheet_ops.mark_dirty(sheet_name)
+        return True
+
+    def load_remaining_columns(self):
+        """Read the columns the current sheet was imported without (Tk thread, parsing on the import worker)"""
+        editor = self.editor
+        sheet_name = editor.sheet_ops.current_sheet
+        if editor.df is None or sheet_name not in editor.sheet_ops.projected:
+            messagebox.showinfo(editor.tr("Info"), editor.tr("Every column of this sheet is loaded."))
+            return
+        entry = editor.sheet_ops.projected[sheet_name]
+
+        def parse(progress, cancel):
+            return self.read_remaining(sheet_name)
+
+        def apply(extra):
+            count = 0 if extra is None else extra.shape[1]
+            if not self.attach(sheet_name, extra):
+                messagebox.showwarning(editor.tr("Warning"),
+                                       editor.tr("The remaining columns cannot be loaded: the file or the rows changed since the import."))
+                editor.status_var.set(editor.tr("Ready"))
+                return
+            if editor.active_filters:
+                editor.filter_ops.apply_filters()
+            else:
+                editor.data_ops.populate_treeview()
+            editor.status_var.set(f"{editor.tr('Loaded remaining columns')}: {count}")
+
+        editor.file_ops.run_import(entry['file'], parse, apply, editor.tr('Failed to load remaining columns'))
+
+    def complete_for_save(self):
+        """Before a save: load the remaining columns of every projected sheet
+
+        Returns False when some could not be loaded and the user chose not to save without them.
+        """
+        editor = self.editor
+        sheet_ops = editor.sheet_ops
+        missing = []
+        for sheet_name in list(sheet_ops.projected):
+            try:
+                loaded = self.attach(sheet_name, self.read_remaining(sheet_name))
+            except Exception:
+                loaded = False
+            if not loaded:
+                missing.append(sheet_name)
+        if missing and not messagebox.askyesno(
+                editor.tr("Columns Not Loaded"),
+                f"{editor.tr('Columns left out by the schedule view could not be loaded and will not be saved')}: "
+                f"{', '.join(str(name or os.path.basename(editor.current_file or '')) for name in missing)}\n\n"
+                f"{editor.tr('Save anyway?')}"):
+            return False
+        # The saved file will not have those columns either
+        sheet_ops.projected = {}
+        return True
@@ -0,0 +1,157 @@
+"""
+Schema Types Module
+Handles the declared column types of import schemas for the XLS Editor
+
+The data side of import schemas (see import_schema for the dialogs): reading
+and writing .schedschema files, matching declared columns by label, the C
+parser dtypes of the CSV reader and the conversion of raw cell values into a
+column of a declared type. The readers import this module, so it must not
+depend on tkinter: they also run in worker processes.
+"""
+
+import json
+import math
+
+import numpy as np
+import pandas as pd
+
+
+IMPORT_SCHEMA_EXTENSION = '.schedschema'
+IMPORT_SCHEMA_FORMAT = 1
+SCHEMA_TYPES = ('text', 'category', 'integer', 'number', 'boolean', 'date')
+
+# C parser dtypes per declared type (dates are read as text and converted after)
+CSV_DTYPES = {'text': str, 'category': 'category', 'integer': 'Int64', 'number': 'float64', 'boolean': 'boolean',
+              'date': object}
+# Types the dtype optimizer would change the kind of (text to category, ...)
+FIXED_TYPES = ('text', 'category', 'boolean', 'date')
+
+
+def schema_type(dtype):
+    """Declared type matching a pandas dtype"""
+    if isinstance(dtype, pd.CategoricalDtype):
+        return 'category'
+    if pd.api.types.is_bool_dtype(dtype):
+        return 'boolean'
+    if pd.api.types.is_integer_dtype(dtype):
+        return 'integer'
+    if pd.api.types.is_numeric_dtype(dtype):
+        return 'number'
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return 'date'
+    return 'text'
+
+
+def generate(df):
+    """{column: type} describing a DataFrame, in column order"""
+    return {str(column): schema_type(dtype) for column, dtype in df.dtypes.items()}
+
+
+def read_schema(file_path):
+    with open(file_path, encoding='utf-8') as f:
+        schema = json.load(f)
+    if not isinstance(schema, dict) or schema.get('format') != IMPORT_SCHEMA_FORMAT:
+        raise ValueError("Not an import schema file")
+    columns = schema.get('columns', {})
+    unknown = sorted({kind for kind in columns.values() if kind not in SCHEMA_TYPES})
+    if unknown:
+        raise ValueError(f"Unknown column types: {', '.join(map(str, unknown))}")
+    return columns
+
+
+def write_schema(file_path, columns):
+    schema = {'format': IMPORT_SCHEMA_FORMAT, 'columns': dict(columns)}
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(schema, f, ensure_ascii=False, indent=2)
+
+
+def declared(dtypes, name):
+    """Declared type of a column label (schema keys are strings), or None"""
+    if not dtypes:
+        return None
+    kind = dtypes.get(name)
+    return kind if kind is not None else dtypes.get(str(name))
+
+
+def schema_positions(dtypes, names):
+    """{position: type} of the declared columns among a row of labels"""
+    positions = {}
+    for position, name in enumerate(names):
+        kind = declared(dtypes, name)
+        if kind is not None:
+            positions[position] = kind
+    return positions
+
+
+def csv_dtypes(dtypes):
+    """{column: dtype} pinning the declared columns of a CSV/TSV read"""
+    return {name: CSV_DTYPES[kind] for name, kind in (dtypes or {}).items()}
+
+
+def _missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value)) or value is pd.NA or value is pd.NaT
+
+
+def _text(value):
+    """A cell as text; whole floats lose their '.0' as they do in Revit"""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _number(value, kind, name):
+    if isinstance(value, (bool, np.bool_)):
+        raise ValueError(f"Column '{name}' is declared {kind} but holds {value!r}")
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Column '{name}' is declared {kind} but holds {value!r}") from None
+
+
+def convert_values(values, kind, name):
+    """Column array of a declared type from raw cell values (blanks as None/NaN)
+
+    Raises ValueError naming the column when a value does not fit the type.
+    """
+    if kind in ('text', 'category'):
+        texts = [np.nan if _missing(value) else _text(value) for value in values]
+        if kind == 'category':
+            return pd.Categorical(texts)
+        if not any(isinstance(value, str) for value in texts):
+            return np.array(texts, dtype=object)
+        return pd.Series(texts).array
+    if kind in ('integer', 'number'):
+        numbers = np.array([np.nan if _missing(value) else _number(value, kind, name) for value in values],
+                           dtype=np.float64)
+        if kind == 'number':
+            return numbers
+        mask = np.isnan(numbers)
+        if not np.all(np.mod(numbers[~mask], 1) == 0):
+            raise ValueError(f"Column '{name}' is declared integer but holds fractions")
+        return pd.arrays.IntegerArray(np.where(mask, 0, numbers).astype(np.int64), mask)
+    if kind == 'boolean':
+        try:
+            return pd.array([None if _missing(value) else value for value in values], dtype='boolean')
+        except (TypeError, ValueError):
+            raise ValueError(f"Column '{name}' is declared boolean but holds other values") from None
+    if kind == 'date':
+        try:
+            return pd.to_datetime(pd.Series([None if _missing(value) else value for value in values], dtype=object)).array
+        except (TypeError, ValueError):
+            raise ValueError(f"Column '{name}' is declared date but holds other values") from None
+    raise ValueError(f"Unknown column type: {kind}")
+
+
+def apply_schema(df, dtypes):
+    """Convert the declared columns of an already parsed frame (readers without a typed path)"""
+    positions = schema_positions(dtypes, df.columns)
+    if not positions:
+        return df
+    df = df.copy(deep=False)
+    for position, kind in positions.items():
+        series = df.iloc[:, position]
+        values = series.astype(object).where(series.notna(), None).tolist()
+        df.isetitem(position, convert_values(values, kind, df.columns[position]))
+    return df
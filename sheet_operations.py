@@ -4,35 +4,45 @@ Handles multi-sheet Excel file operations including reading sheets,
 managing formula fields across sheets, and integrating with Schedule Properties
 """
 
-import pandas as pd
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
 import os
+import threading
+
+from column_store import view
+from dtype_optimizer import merge_reports
+from header_band import fit_band, can_reheader, reheader, band_columns
+from lazy_sheets import LazySheets
+from schedule_view import view_positions
+from streaming_reader import ImportCancelled
+import workbook_reader
+import xlsx_metadata
+import xlsx_writer
 
 class SheetOperations:
     def __init__(self, editor_instance):
         self.editor = editor_instance
-        self.available_sheets = {}  # Dict of {sheet_name: DataFrame}
+        self.available_sheets = {}  # Dict of {sheet_name: DataFrame} - the authoritative store for each sheet
         self.current_sheet = None
         self.sheet_names = []
+        self.header_rows = {}   # {sheet_name: header row the sheet was parsed with} (None = single-sheet import)
+        self.header_bands = {}  # {sheet_name: raw top rows of the sheet} used to move the header in memory
+        self.dirty_sheets = set()  # Sheets changed since the workbook was loaded or last saved
+        self.source_file = None    # (path, size, mtime) of the xlsx file the clean sheets still match
+        self.versions = {}         # {sheet_name: edit counter} (None = single-sheet import), used by autosave
+        self.projected = {}        # {sheet_name: projection} of sheets imported with a column subset, see schedule_view
         
-    def get_sheet_names(self, file_path):
-        """Get all sheet names from an Excel file"""
+    def get_sheet_names(self, file_path, workbook=None):
+        """Get all sheet names from an Excel file (reusing an open workbook if given)"""
         try:
-            if file_path.endswith('.xlsx'):
-                excel_file = pd.ExcelFile(file_path, engine='openpyxl')
-            else:
-                excel_file = pd.ExcelFile(file_path, engine='xlrd')
-            
-            self.sheet_names = excel_file.sheet_names
-            excel_file.close()
+            self.sheet_names = workbook_reader.sheet_names(workbook or file_path, cache=self.editor.parse_cache)
             return self.sheet_names
         except Exception as e:
             messagebox.showerror(self.editor.tr("Error"), f"Failed to read sheet names:\n{str(e)}")
             return []
     
-    def import_file_with_sheet_selection(self, file_path=None):
-        """Import Excel file with sheet selection dialog"""
+    def import_file_with_sheet_selection(self, file_path=None, workbook=None):
+        """Import Excel file with sheet selection dialog (workbook: already open handle, if any)"""
         from tkinter import filedialog
         
         # If file_path not provided, ask user to select file
@@ -45,52 +55,45 @@ class SheetOperations:
                 ]
             )
         
-        if not file_path:
-            return
-            
-        # Get available sheets
-        sheet_names = self.get_sheet_names(file_path)
-        if not sheet_names:
+        if not file_path or self.editor.journal.offer_replay(file_path):
             return
             
-        # If only one sheet, import it directly
-        if len(sheet_names) == 1:
-            self.load_sheet(file_path, sheet_names[0])
-            return
-            
-        # Show sheet selection dialog
-        self.show_sheet_selection_dialog(file_path, sheet_names)
+        # Share one workbook handle for listing and loading
+        owns_workbook = workbook is None
+        workbook = workbook or workbook_reader.open_workbook(file_path)
+        running = self.editor.file_ops.import_task
+        try:
+            # Get available sheets
+            sheet_names = self.get_sheet_names(file_path, workbook)
+            if not sheet_names:
+                return
+                
+            # If only one sheet, import it directly
+            if len(sheet_names) == 1:
+                self.load_sheet(file_path, sheet_names[0], workbook)
+                return
+                
+            # Show sheet selection dialog
+            self.show_sheet_selection_dialog(file_path, sheet_names, workbook)
+        finally:
+            # A background import started above closes the handle when it is done
+            if owns_workbook and not self.editor.file_ops.hand_over(workbook.close, running):
+                workbook.close()
     
-    def show_sheet_selection_dialog(self, file_path, sheet_names):
-        """Show dialog to select which sheets to load"""
-        print(f"DEBUG: Creating dialog for sheets: {sheet_names}")
-        
-        # Simple message box for now to test
-        import tkinter.messagebox as msgbox
-        
+    def show_sheet_selection_dialog(self, file_path, sheet_names, workbook=None):
+        """Show dialog to select which sheets to load, with their sizes and estimated load time"""
         if len(sheet_names) == 1:
             # Single sheet - load directly
-            self.load_sheet(file_path, sheet_names[0])
+            self.load_sheet(file_path, sheet_names[0], workbook)
             return
         
-        # Multiple sheets - show simple dialog
-        sheet_list = "\n".join([f"- {name}" for name in sheet_names])
-        result = msgbox.askyesno(
-            "Multiple Sheets Found", 
-            f"Found {len(sheet_names)} sheets:\n{sheet_list}\n\nLoad all sheets?\n\n(Yes = Load All, No = Load First Sheet Only)"
-        )
-        
-        if result:  # Yes - load all sheets
-            self.load_multiple_sheets(file_path, sheet_names, sheet_names[0])
-        else:  # No - load first sheet only  
-            self.load_sheet(file_path, sheet_names[0])
-        
-        return  # Skip the complex dialog for now
+        # Sizes come straight from the workbook XML, nothing is parsed yet
+        sizes = workbook_reader.sheet_sizes(workbook or file_path)
+        lazy = self.editor.import_settings.get('lazy_sheets', True)
         
-        # Original complex dialog code (commented out)
         dialog = tk.Toplevel(self.editor.root)
         dialog.title(self.editor.tr("Select Sheets"))
-        dialog.geometry("450x400")
+        dialog.geometry("520x420")
         dialog.resizable(True, True)
         dialog.transient(self.editor.root)
         dialog.grab_set()
@@ -105,26 +108,24 @@ class SheetOperations:
         label = ttk.Label(dialog, text=f"Found {len(sheet_names)} sheet(s). Select sheets to load:", font=("Arial", 11, "bold"))
         label.pack(pady=(10, 5))
         
-        # Sheet selection frame - simplified approach
-        sheet_frame = ttk.LabelFrame(dialog, text="Available Sheets", padding="10")
+        # Sheet selection frame
+        sheet_frame = ttk.LabelFrame(dialog, text=self.editor.tr("Available Sheets"), padding="10")
         sheet_frame.pack(fill="both", expand=True, padx=10, pady=5)
         
-        # Sheet checkboxes - direct approach without canvas
         sheet_vars = {}
-        print(f"DEBUG: Creating checkboxes for {len(sheet_names)} sheets")
         for i, sheet_name in enumerate(sheet_names):
-            print(f"DEBUG: Creating checkbox for sheet: '{sheet_name}'")
             var = tk.BooleanVar(value=(i == 0))  # Select first sheet by default
             sheet_vars[sheet_name] = var
             
-            cb = ttk.Checkbutton(
-                sheet_frame, 
-                text=f"Sheet: {sheet_name}", 
-                variable=var,
-                font=("Arial", 10)
-            )
+            info = sizes.get(sheet_name, {})
+            text = f"Sheet: {sheet_name}"
+            details = xlsx_metadata.describe_size(info)
+            if info.get('state', 'visible') != 'visible':
+                details = ", ".join(part for part in (self.editor.tr("hidden"), details) if part)
+            if details:
+                text += f"  ({details})"
+            cb = ttk.Checkbutton(sheet_frame, text=text, variable=var)
             cb.pack(anchor="w", pady=3, padx=5)
-            print(f"DEBUG: Checkbox created and packed for '{sheet_name}'")
         
         # Primary sheet selection
         primary_frame = ttk.LabelFrame(dialog, text=self.editor.tr("Primary Sheet (for main view)"))
@@ -134,6 +135,24 @@ class SheetOperations:
         primary_combo = ttk.Combobox(primary_frame, textvariable=primary_var, values=sheet_names, state="readonly")
         primary_combo.pack(fill="x", padx=5, pady=5)
         
+        # Estimated cost of what the import will parse up front (only the primary sheet when lazy)
+        estimate_var = tk.StringVar()
+        ttk.Label(dialog, textvariable=estimate_var).pack(anchor="w", padx=15)
+        
+        def update_estimate(*args):
+            selected = [name for name, var in sheet_vars.items() if var.get()]
+            parsed = [primary_var.get()] if lazy and primary_var.get() in selected else selected
+            seconds = [xlsx_metadata.estimate_load_seconds(sizes.get(name, {})) for name in parsed]
+            if not parsed or any(value is None for value in seconds):
+                estimate_var.set("")
+            else:
+                estimate_var.set(f"{self.editor.tr('Estimated load time')}: ~{max(sum(seconds), 0.1):.1f} s")
+        
+        for var in sheet_vars.values():
+            var.trace_add("write", update_estimate)
+        primary_var.trace_add("write", update_estimate)
+        update_estimate()
+        
         # Buttons
         button_frame = ttk.Frame(dialog)
         button_frame.pack(fill="x", padx=10, pady=10)
@@ -149,9 +168,9 @@ class SheetOperations:
                 messagebox.showwarning(self.editor.tr("Warning"), self.editor.tr("Primary sheet must be selected."))
                 return
                 
-            # Load all selected sheets
-            self.load_multiple_sheets(file_path, selected_sheets, primary_sheet)
             dialog.destroy()
+            # Load all selected sheets
+            self.load_multiple_sheets(file_path, selected_sheets, primary_sheet, workbook)
         
         def select_all():
             for var in sheet_vars.values():
@@ -165,38 +184,89 @@ class SheetOperations:
         ttk.Button(button_frame, text=self.editor.tr("Select None"), command=select_none).pack(side="left", padx=5)
         ttk.Button(button_frame, text=self.editor.tr("Cancel"), command=dialog.destroy).pack(side="right", padx=5)
         ttk.Button(button_frame, text=self.editor.tr("Load Sheets"), command=load_selected_sheets).pack(side="right", padx=5)
+        
+        # Stay here until the dialog closes so the caller's workbook handle is still open for the load
+        self.editor.root.wait_window(dialog)
     
-    def load_multiple_sheets(self, file_path, sheet_names, primary_sheet):
-        """Load multiple sheets from Excel file"""
-        try:
-            self.available_sheets = {}
-            
-            for sheet_name in sheet_names:
+    def load_multiple_sheets(self, file_path, sheet_names, primary_sheet, workbook=None):
+        """Load multiple sheets from Excel file, parsing all of them from one open workbook"""
+        header_row = self.editor.header_row
+        workers = workbook_reader.worker_count(self.editor.import_settings.get('parallel_workers', 1))
+        
+        # Lazy mode only parses the primary sheet now, the others on first access
+        lazy = self.editor.import_settings.get('lazy_sheets', True)
+        parse_names = [primary_sheet] if lazy else list(sheet_names)
+        schedule_view = self.editor.file_ops.import_view
+        
+        def parse(progress, cancel):
+            # Worker thread: parse and optimize the sheets, editor state is left alone
+            bands = workbook_reader.read_header_bands(workbook or file_path, parse_names, cache=self.editor.parse_cache,
+                                                      engine=self.editor.file_ops.reader_engine())
+            headers = self.editor.file_ops.header_rows_for(bands, header_row)
+            # A schedule view only narrows the primary sheet, which is then read on its own
+            positions = view_positions(schedule_view, bands[primary_sheet], headers[primary_sheet])
+            full_names = [name for name in parse_names if positions is None or name != primary_sheet]
+            sheets, errors = workbook_reader.read_sheets(workbook or file_path, full_names,
+                                                         header=headers, workers=workers,
+                                                         cache=self.editor.parse_cache,
+                                                         **self.editor.file_ops.reader_options(file_path, progress, cancel))
+            if positions is not None:
                 try:
-                    if file_path.endswith('.xlsx'):
-                        df = pd.read_excel(file_path, sheet_name=sheet_name, engine='openpyxl', header=self.editor.header_row)
-                    else:
-                        df = pd.read_excel(file_path, sheet_name=sheet_name, engine='xlrd', header=self.editor.header_row)
-                    
-                    self.available_sheets[sheet_name] = df
+                    sheets[primary_sheet] = workbook_reader.read_sheet(
+                        workbook or file_path, sheet_name=primary_sheet, header=headers[primary_sheet],
+                        cache=self.editor.parse_cache, usecols=positions,
+                        **self.editor.file_ops.reader_options(file_path, progress, cancel))
+                    bands[primary_sheet] = bands[primary_sheet].iloc[:, positions]
+                except ImportCancelled:
+                    raise
                 except Exception as sheet_error:
-                    messagebox.showerror(self.editor.tr("Error"), f"Failed to load sheet '{sheet_name}':\n{str(sheet_error)}")
-                    continue
+                    errors[primary_sheet] = sheet_error
+            loaded, reports = {}, []
+            for sheet_name in parse_names:
+                if sheet_name in sheets:
+                    df, report = self.editor.file_ops.optimize_imported(sheets[sheet_name])
+                    if report:
+                        reports.append(report)
+                    loaded[sheet_name] = df
+            bands = {sheet_name: bands[sheet_name] for sheet_name in loaded}
+            return loaded, errors, reports, bands, headers, positions
+        
+        def apply(result):
+            loaded, errors, reports, bands, headers, positions = result
+            for sheet_name in parse_names:
+                if sheet_name in errors:
+                    messagebox.showerror(self.editor.tr("Error"), f"Failed to load sheet '{sheet_name}':\n{str(errors[sheet_name])}")
+            if primary_sheet not in loaded:
+                self.editor.data_ops.end_preview()
+                self.editor.file_ops.update_file_info()
+                self.editor.status_var.set(self.editor.tr("Import failed"))
+                return
+            if lazy:
+                self.replace_sheets(self.lazy_sheet_store(file_path, sheet_names, header_row, loaded))
+            else:
+                self.replace_sheets(loaded)
+            self.remember_header_bands(headers, bands)
+            self.editor.schedule_view.remember(file_path, primary_sheet, primary_sheet, positions)
             
             # Set primary sheet as current working data
             self.current_sheet = primary_sheet
-            self.editor.original_df = self.available_sheets[primary_sheet].copy()
-            self.editor.df = self.editor.original_df.copy()
+            self.editor.header_row = headers[primary_sheet]
+            self.editor.original_df = view(self.available_sheets[primary_sheet])
+            self.editor.df = view(self.editor.original_df)
             self.editor.visible_columns = list(self.editor.df.columns)
             
             # Clear existing data
             self.editor.filtered_df = None
             self.editor.active_filters = {}
             self.editor.formula_fields = {}
+            self.editor.undo_manager.clear()
+            self.editor.schedule_view.apply(schedule_view)
             
             # Update file info
             self.editor.current_file = file_path
             self.editor.modified = False
+            self.remember_source(file_path)
+            self.editor.journal.start(file_path)
             self.editor.file_ops.update_file_info()
             self.editor.filter_ops.update_filter_display()
             self.editor.update_header_display()
@@ -204,47 +274,365 @@ class SheetOperations:
             
             # Update status with sheet info
             sheet_count = len(self.available_sheets)
-            self.editor.status_var.set(f"Loaded {sheet_count} sheets. Current: {primary_sheet}")
+            self.editor.status_var.set(self.editor.file_ops.with_memory_report(
+                f"Loaded {sheet_count} sheets. Current: {primary_sheet}", merge_reports(reports) if reports else None))
             
             # Add sheet switcher to the interface
             self.add_sheet_switcher()
             
-        except Exception as e:
-            messagebox.showerror(self.editor.tr("Error"), f"Failed to load sheets:\n{str(e)}")
+            # Parse the other sheets while the user looks at the first one
+            if lazy and self.editor.import_settings.get('prefetch_sheets', False):
+                self.editor.root.after_idle(self.available_sheets.prefetch)
+        
+        self.editor.file_ops.run_import(file_path, parse, apply, "Failed to load sheets",
+                                        preview=self.editor.file_ops.preview_reader(file_path, workbook, primary_sheet,
+                                                                                    header_row, schedule_view))
     
-    def load_sheet(self, file_path, sheet_name):
-        """Load a single sheet"""
-        try:
-            if file_path.endswith('.xlsx'):
-                df = pd.read_excel(file_path, sheet_name=sheet_name, engine='openpyxl', header=self.editor.header_row)
-            else:
-                df = pd.read_excel(file_path, sheet_name=sheet_name, engine='xlrd', header=self.editor.header_row)
-            
-            self.available_sheets = {sheet_name: df}
+    def load_sheet(self, file_path, sheet_name, workbook=None):
+        """Load a single sheet (workbook: already open handle, if any)"""
+        header_row = self.editor.header_row
+        schedule_view = self.editor.file_ops.import_view
+        
+        def parse(progress, cancel):
+            # Worker thread: parse and optimize the sheet
+            bands = workbook_reader.read_header_bands(workbook or file_path, [sheet_name], cache=self.editor.parse_cache,
+                                                      engine=self.editor.file_ops.reader_engine())
+            headers = self.editor.file_ops.header_rows_for(bands, header_row)
+            positions = view_positions(schedule_view, bands[sheet_name], headers[sheet_name])
+            df = workbook_reader.read_sheet(workbook or file_path, sheet_name=sheet_name, header=headers[sheet_name],
+                                            cache=self.editor.parse_cache, usecols=positions,
+                                            **self.editor.file_ops.reader_options(file_path, progress, cancel))
+            if positions is not None:
+                bands[sheet_name] = bands[sheet_name].iloc[:, positions]
+            return self.editor.file_ops.optimize_imported(df) + (bands, headers, positions)
+        
+        def apply(result):
+            df, report, bands, headers, positions = result
+            self.replace_sheets({sheet_name: df})
             self.current_sheet = sheet_name
+            self.editor.header_row = headers[sheet_name]
+            self.remember_header_bands(headers, bands)
+            self.editor.schedule_view.remember(file_path, sheet_name, sheet_name, positions)
             
             # Set as current working data
-            self.editor.original_df = df.copy()
-            self.editor.df = self.editor.original_df.copy()
+            self.editor.original_df = view(df)
+            self.editor.df = view(self.editor.original_df)
             self.editor.visible_columns = list(self.editor.df.columns)
             
             # Clear existing data
             self.editor.filtered_df = None
             self.editor.active_filters = {}
             self.editor.formula_fields = {}
+            self.editor.undo_manager.clear()
+            self.editor.schedule_view.apply(schedule_view)
             
             # Update file info
             self.editor.current_file = file_path
             self.editor.modified = False
+            self.remember_source(file_path)
+            self.editor.journal.start(file_path)
             self.editor.file_ops.update_file_info()
             self.editor.filter_ops.update_filter_display()
             self.editor.update_header_display()
             self.editor.data_ops.populate_treeview()
             
-            self.editor.status_var.set(f"Loaded sheet: {sheet_name}")
-            
-        except Exception as e:
-            messagebox.showerror(self.editor.tr("Error"), f"Failed to load sheet {sheet_name}:\n{str(e)}")
+            self.editor.status_var.set(self.editor.file_ops.with_memory_report(f"Loaded sheet: {sheet_name}", report))
+        
+        self.editor.file_ops.run_import(file_path, parse, apply, f"Failed to load sheet {sheet_name}",
+                                        preview=self.editor.file_ops.preview_reader(file_path, workbook, sheet_name,
+                                                                                    header_row, schedule_view))
+    
+    # Sheet store
+    def replace_sheets(self, sheets):
+        """Install a new sheet store, releasing the workbook held by a previous lazy one"""
+        if isinstance(self.available_sheets, LazySheets):
+            self.available_sheets.close()
+        self.available_sheets = sheets
+        self.projected = {}
+        self.editor.sqlite_store.clear()
+    
+    def lazy_sheet_store(self, file_path, sheet_names, default_row, loaded):
+        """LazySheets for a workbook: other sheets are parsed from their own shared handle on first access
+
+        The loader also runs on the prefetch thread, so it only reads header_rows
+        and keeps what it finds (detected header row, header band) in its own
+        dicts, which the store's lock guards as it holds it around the loader;
+        publish() copies them into header_rows / header_bands on the Tk thread.
+        """
+        workbook = workbook_reader.open_workbook(file_path)
+        file_ops = self.editor.file_ops
+        raw_bands, detected, bands = {}, {}, {}
+        
+        def header_for(sheet_name):
+            # Header rows set meanwhile (e.g. applied to all sheets) win over detection
+            if sheet_name not in raw_bands:
+                raw_bands[sheet_name] = workbook_reader.read_header_bands(workbook, [sheet_name], cache=self.editor.parse_cache,
+                                                                          engine=file_ops.reader_engine())[sheet_name]
+            header = self.header_rows.get(sheet_name)
+            if header is None:
+                if sheet_name not in detected:
+                    detected[sheet_name] = file_ops.header_rows_for({sheet_name: raw_bands[sheet_name]}, default_row)[sheet_name]
+                    publish_later(sheet_name)
+                header = detected[sheet_name]
+            return header, raw_bands[sheet_name]
+        
+        def load(sheet_name):
+            header, band = header_for(sheet_name)
+            df = workbook_reader.read_sheet(workbook, sheet_name=sheet_name, header=header,
+                                            cache=self.editor.parse_cache, **file_ops.reader_options(file_path))
+            df = file_ops.optimize_imported(df)[0]
+            if band is not None:
+                bands[sheet_name] = fit_band(band, df.shape[1])
+                publish_later(sheet_name)
+            return df
+        
+        def describe(sheet_name):
+            header, band = header_for(sheet_name)
+            return band_columns(band, header)
+        
+        def publish(sheet_name, installed=False):
+            # Tk thread; installed: skip if another store replaced this one meanwhile
+            if installed and self.available_sheets is not store:
+                return
+            with store.lock:
+                header, band = detected.get(sheet_name), bands.pop(sheet_name, None)
+            if header is not None:
+                self.header_rows.setdefault(sheet_name, header)
+            if band is not None:
+                self.header_bands[sheet_name] = band
+        
+        def publish_later(sheet_name):
+            if threading.current_thread() is threading.main_thread():
+                publish(sheet_name)
+            else:
+                self.editor.root.after(0, lambda: publish(sheet_name, installed=True))
+        
+        store = LazySheets(sheet_names, load, describe, loaded)
+        store.add_cleanup(workbook.close)
+        return store
+    
+    # Dirty tracking
+    def mark_dirty(self, sheet_name=None):
+        """Record that a sheet (default: the current one) must be regenerated on the next save"""
+        if sheet_name is None:
+            sheet_name = self.current_sheet
+        self.versions[sheet_name] = self.versions.get(sheet_name, 0) + 1
+        if sheet_name is not None:
+            self.dirty_sheets.add(sheet_name)
+        self.editor.journal.sheet_changed(sheet_name)
+    
+    def note_rows_moved(self, sheet_name):
+        """Rows were inserted or deleted: a projected sheet can no longer be matched with its file rows"""
+        if sheet_name in self.projected:
+            self.projected[sheet_name]['rows_moved'] = True
+    
+    def remember_source(self, file_path):
+        """Mark every sheet clean: each one matches file_path as it is on disk now"""
+        self.dirty_sheets = set()
+        try:
+            stat = os.stat(file_path)
+            self.source_file = (file_path, stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            self.source_file = None
+    
+    def unchanged_source(self):
+        """Path of the xlsx file clean sheets can be copied from (None if it was changed or removed meanwhile)"""
+        if self.source_file is None:
+            return None
+        file_path, size, mtime = self.source_file
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        if (stat.st_size, stat.st_mtime_ns) != (size, mtime) or not file_path.lower().endswith('.xlsx'):
+            return None
+        return file_path
+    
+    def changed_sheets(self):
+        """Sheets to regenerate on save, in workbook order
+        
+        The sheet on screen always counts as changed while there are unsaved edits.
+        """
+        changed = set(self.dirty_sheets)
+        if self.editor.modified and self.current_sheet is not None:
+            changed.add(self.current_sheet)
+        return [sheet_name for sheet_name in self.available_sheets if sheet_name in changed]
+    
+    def restore_state(self, state, frames):
+        """Install recovered unsaved sheets (autosave, edit journal) as modified data
+        
+        frames holds the changed sheets; the others are read from state['current_file'] again.
+        """
+        editor = self.editor
+        names = state['sheet_names']
+        source = state['current_file']
+        
+        if names is None:
+            if None not in frames:
+                raise ValueError("No sheet data to restore")
+            self.reset_single_sheet(state['header_row'], None)
+            editor.original_df = frames[None]
+        else:
+            if source and os.path.exists(source) and set(frames) != set(names):
+                self.replace_sheets(self.lazy_sheet_store(source, names, state['header_row'], frames))
+            else:
+                self.replace_sheets({sheet_name: frames[sheet_name] for sheet_name in names if sheet_name in frames})
+            if not self.available_sheets:
+                raise ValueError("No sheet data to restore")
+            self.header_rows = dict(state['header_rows'])
+            self.header_bands = {}
+            current = state['current_sheet']
+            if current not in self.available_sheets:
+                current = next(iter(self.available_sheets))
+            self.current_sheet = current
+            editor.original_df = view(self.available_sheets[current])
+        
+        # Restored frames keep the column subset they were imported with
+        self.projected = {sheet_name: dict(entry) for sheet_name, entry in state.get('projected', {}).items()
+                          if sheet_name in frames}
+        editor.header_row = self.header_rows.get(self.current_sheet, state['header_row'])
+        editor.df = view(editor.original_df)
+        editor.visible_columns = list(editor.df.columns)
+        editor.formula_fields = state['formula_fields']
+        editor.sort_settings = state['sort_settings']
+        editor.group_settings = state['group_settings']
+        editor.undo_manager.clear()
+        editor.current_file = source
+        
+        # Untouched sheets still match the original file; the restored ones are unsaved changes
+        if names is not None and source:
+            self.remember_source(source)
+        for sheet_name in state['changed_sheets']:
+            self.mark_dirty(sheet_name)
+        editor.modified = True
+        
+        editor.filtered_df = None
+        editor.active_filters = state['active_filters']
+        editor.file_ops.update_file_info()
+        editor.filter_ops.update_filter_display()
+        editor.update_header_display()
+        if names is not None:
+            self.add_sheet_switcher()
+        if editor.active_filters:
+            editor.filter_ops.apply_filters()
+        else:
+            editor.data_ops.populate_treeview()
+    
+    # Header rows
+    def remember_header_bands(self, header_rows, bands):
+        """Record the header row ({sheet: row}) and raw header band of freshly imported sheets"""
+        self.header_rows = dict(header_rows)
+        self.header_bands = {}
+        for sheet_name, band in bands.items():
+            frame = self.available_sheets.get(sheet_name) if sheet_name is not None else self.editor.original_df
+            if band is not None and frame is not None:
+                self.header_bands[sheet_name] = fit_band(band, frame.shape[1])
+    
+    def reset_single_sheet(self, header_row, band):
+        """Forget multi-sheet state after a plain single-sheet import"""
+        self.replace_sheets({})
+        self.current_sheet = None
+        self.dirty_sheets = set()
+        self.source_file = None
+        self.remember_header_bands({None: header_row}, {None: band})
+    
+    def change_header_row(self, new_row, all_sheets=False):
+        """Move the header row of the current (or every loaded) sheet without re-reading the file
+        
+        Edits and formula fields are kept. Returns (pending, reports) where pending
+        lists the sheets that cannot be re-headed in memory and must be reloaded.
+        """
+        editor = self.editor
+        current = self.current_sheet
+        targets = list(self.available_sheets) if all_sheets and self.available_sheets else [current]
+        pending, reports = [], []
+        
+        for sheet_name in targets:
+            if isinstance(self.available_sheets, LazySheets) and not self.available_sheets.is_loaded(sheet_name):
+                # Not parsed yet - it will be parsed with the new header row
+                self.header_rows[sheet_name] = new_row
+                self.mark_dirty(sheet_name)
+                continue
+            # The current sheet's full frame lives on the editor (available_sheets may hold a column subset)
+            frame = editor.original_df if sheet_name == current else self.available_sheets.get(sheet_name)
+            if frame is None:
+                continue
+            old_row = self.header_rows.get(sheet_name, editor.header_row)
+            band = self.header_bands.get(sheet_name)
+            keep = [column for column in frame.columns if column in editor.formula_fields]
+            if not can_reheader(frame, band, old_row, new_row, keep):
+                pending.append(sheet_name)
+                continue
+            frame, report = editor.file_ops.optimize_imported(reheader(frame, band, old_row, new_row, keep))
+            if report:
+                reports.append(report)
+            self.header_rows[sheet_name] = new_row
+            self.mark_dirty(sheet_name)
+            if sheet_name == current:
+                editor.original_df = frame
+            else:
+                self.available_sheets[sheet_name] = frame
+        
+        if current not in pending:
+            self.activate_header_change(new_row)
+        return pending, reports
+    
+    def activate_header_change(self, new_row):
+        """Refresh the editor after the current sheet got a new header row"""
+        editor = self.editor
+        editor.header_row = new_row
+        editor.active_filters = {}
+        editor.filtered_df = None
+        editor.df = view(editor.original_df)
+        editor.visible_columns = list(editor.df.columns)
+        # Row positions changed, so recorded deltas no longer apply
+        editor.undo_manager.clear()
+        
+        # Formula fields are recalculated against the new columns
+        for field_name in list(editor.formula_fields):
+            editor.formula_ops.calculate_formula_field(field_name)
+        editor.sync_current_sheet_data()
+        
+        editor.data_ops.populate_treeview()
+        editor.filter_ops.update_filter_display()
+        editor.update_header_display()
+    
+    def reload_sheets_with_header(self, sheet_names, new_row):
+        """Re-read sheets whose header cannot be moved in memory (header beyond the band, columns changed)"""
+        editor = self.editor
+        file_path = editor.current_file
+        
+        def parse(progress, cancel):
+            # Worker thread: parse only the sheets that need it (None = the single imported sheet)
+            reader_names = [0 if sheet_name is None else sheet_name for sheet_name in sheet_names]
+            sheets, errors = workbook_reader.read_sheets(file_path, reader_names, header=new_row,
+                                                         cache=editor.parse_cache,
+                                                         **editor.file_ops.reader_options(file_path, progress, cancel))
+            if errors:
+                raise next(iter(errors.values()))
+            bands = workbook_reader.read_header_bands(file_path, reader_names, cache=editor.parse_cache,
+                                                      engine=editor.file_ops.reader_engine())
+            loaded = {}
+            for sheet_name, reader_name in zip(sheet_names, reader_names):
+                loaded[sheet_name] = editor.file_ops.optimize_imported(sheets[reader_name])[0], bands[reader_name]
+            return loaded
+        
+        def apply(loaded):
+            for sheet_name, (frame, band) in loaded.items():
+                if sheet_name == self.current_sheet:
+                    editor.original_df = frame
+                else:
+                    self.available_sheets[sheet_name] = frame
+                self.header_rows[sheet_name] = new_row
+                self.mark_dirty(sheet_name)
+                self.projected.pop(sheet_name, None)  # Re-read with every column
+                self.header_bands.pop(sheet_name, None)
+                if band is not None:
+                    self.header_bands[sheet_name] = fit_band(band, frame.shape[1])
+            self.activate_header_change(new_row)
+            editor.status_var.set(f"Header row changed to row {new_row + 1}")
+        
+        return editor.file_ops.run_import(file_path, parse, apply, "Failed to reload file with new header row")
     
     def add_sheet_switcher(self):
         """Add sheet switcher to the main interface"""
@@ -299,14 +687,23 @@ class SheetOperations:
             return
             
         if new_sheet in self.available_sheets:
+            # Parse the sheet now if it has not been opened before
+            try:
+                new_frame = self.available_sheets[new_sheet]
+            except Exception as e:
+                messagebox.showerror(self.editor.tr("Error"), f"Failed to load sheet {new_sheet}:\n{str(e)}")
+                self.editor.current_sheet_var.set(self.current_sheet)
+                return
+            
             # Save current sheet's data back to available_sheets (including any formula fields)
             if self.current_sheet:
-                self.available_sheets[self.current_sheet] = self.editor.df.copy()
+                self.available_sheets[self.current_sheet] = view(self.editor.df)
             
-            # Switch to new sheet
+            # Switch to new sheet (each sheet keeps its own header row)
             self.current_sheet = new_sheet
-            self.editor.original_df = self.available_sheets[new_sheet].copy()
-            self.editor.df = self.editor.original_df.copy()
+            self.editor.header_row = self.header_rows.get(new_sheet, self.editor.header_row)
+            self.editor.original_df = view(new_frame)
+            self.editor.df = view(self.editor.original_df)
             self.editor.visible_columns = list(self.editor.df.columns)
             
             # Clear filters and refresh display
@@ -324,8 +721,10 @@ class SheetOperations:
         return list(self.available_sheets.keys())
     
     def get_sheet_columns(self, sheet_name):
-        """Get column names from a specific sheet"""
+        """Get column names from a specific sheet (without parsing a lazily loaded sheet)"""
         if sheet_name in self.available_sheets:
+            if isinstance(self.available_sheets, LazySheets):
+                return self.available_sheets.columns(sheet_name)
             return list(self.available_sheets[sheet_name].columns)
         return []
     
@@ -342,14 +741,14 @@ class SheetOperations:
         try:
             # Save current sheet state
             original_sheet = self.current_sheet
-            original_df = self.editor.original_df.copy() if self.editor.original_df is not None else None
+            original_df = view(self.editor.original_df)
             original_visible_columns = self.editor.visible_columns.copy()
             original_formula_fields = self.editor.formula_fields.copy()
             
             # Temporarily switch to target sheet
             self.current_sheet = target_sheet
-            self.editor.original_df = self.available_sheets[target_sheet].copy()
-            self.editor.df = self.editor.original_df.copy()
+            self.editor.original_df = view(self.available_sheets[target_sheet])
+            self.editor.df = view(self.editor.original_df)
             self.editor.visible_columns = list(self.editor.df.columns)
             
             # Use the main formula engine to validate and calculate
@@ -371,13 +770,13 @@ class SheetOperations:
             self.editor.formula_ops.calculate_formula_field(formula_field_name)
             
             # Save the result to available_sheets
-            self.available_sheets[target_sheet] = self.editor.original_df.copy()
+            self.available_sheets[target_sheet] = view(self.editor.original_df)
             
             # Restore original state
             if original_sheet != target_sheet:
                 self.current_sheet = original_sheet
                 self.editor.original_df = original_df
-                self.editor.df = original_df.copy() if original_df is not None else None
+                self.editor.df = view(original_df)
                 self.editor.visible_columns = original_visible_columns
                 self.editor.formula_fields = original_formula_fields
                 
@@ -385,13 +784,14 @@ class SheetOperations:
                 self.editor.data_ops.populate_treeview()
             else:
                 # Target is current sheet, keep the updated data
-                self.editor.df = self.editor.original_df.copy()
+                self.editor.df = view(self.editor.original_df)
                 if formula_field_name not in self.editor.visible_columns:
                     self.editor.visible_columns.append(formula_field_name)
                 self.editor.data_ops.populate_treeview()
             
             messagebox.showinfo(self.editor.tr("Success"), f"Formula field '{formula_field_name}' created successfully in sheet '{target_sheet}'")
             self.editor.modified = True
+            self.mark_dirty(target_sheet)
             return True
             
         except Exception as e:
@@ -408,23 +808,58 @@ class SheetOperations:
     def get_cross_sheet_fields_for_schedule_properties(self):
         """Get all fields from all sheets for Schedule Properties"""
         all_fields = {}
-        for sheet_name, df in self.available_sheets.items():
-            all_fields[sheet_name] = list(df.columns)
+        for sheet_name in self.available_sheets:
+            all_fields[sheet_name] = self.get_sheet_columns(sheet_name)
         return all_fields
     
+    def frame_for_save(self, sheet_name):
+        """DataFrame written for a sheet - the current one from the working frame (it may hold unsynced edits)"""
+        if sheet_name == self.current_sheet:
+            return self.editor.df
+        return self.available_sheets[sheet_name]
+    
+    def sheets_for_save(self):
+        """(sheet name, DataFrame) pairs to write, parsing lazily loaded sheets one at a time"""
+        for sheet_name in list(self.available_sheets):
+            yield sheet_name, self.frame_for_save(sheet_name)
+        # Every sheet is parsed now: release the source workbook so it can be replaced
+        if isinstance(self.available_sheets, LazySheets):
+            self.available_sheets.release()
+    
+    def save_changed_sheets(self, file_path):
+        """Regenerate only the changed sheets, copying the others from the loaded xlsx file
+        
+        Returns False (nothing written) when a full save is needed instead.
+        """
+        source = self.unchanged_source()
+        if source is None or not file_path.lower().endswith('.xlsx'):
+            return False
+        changed = {sheet_name: self.frame_for_save(sheet_name) for sheet_name in self.changed_sheets()}
+        if len(changed) == len(self.available_sheets):
+            return False
+        if isinstance(self.available_sheets, LazySheets):
+            self.available_sheets.release()
+        try:
+            xlsx_writer.update_workbook(file_path, source, list(self.available_sheets), changed)
+        except xlsx_writer.IncrementalSaveUnavailable:
+            return False
+        return True
+    
     def save_all_sheets(self, file_path):
-        """Save all sheets to Excel file"""
+        """Save all sheets to Excel file, rewriting only changed sheets when the source workbook allows it"""
         try:
-            with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
-                for sheet_name, df in self.available_sheets.items():
-                    # Update current sheet data if it was modified
-                    if sheet_name == self.current_sheet:
-                        df = self.editor.df.copy()
-                    
-                    df.to_excel(writer, sheet_name=sheet_name, index=False)
+            rewritten = self.changed_sheets()
+            if self.save_changed_sheets(file_path):
+                message = f"Saved {len(rewritten)} changed sheet(s) to: {os.path.basename(file_path)}"
+            else:
+                xlsx_writer.write_workbook(file_path, self.sheets_for_save())
+                rewritten = list(self.available_sheets)
+                message = f"All sheets saved to: {os.path.basename(file_path)}"
             
             self.editor.modified = False
-            self.editor.status_var.set(f"All sheets saved to: {os.path.basename(file_path)}")
+            self.remember_source(file_path)
+            self.editor.journal.saved(file_path, rewritten)
+            self.editor.status_var.set(message)
             return True
             
         except Exception as e:
@@ -0,0 +1,252 @@
+"""
+SQLite Store Module
+Handles the SQLite query mode of very large sheets for the XLS Editor
+
+When import_settings['sqlite_store'] is on, sheets of at least
+import_settings['sqlite_min_rows'] rows are copied into a scratch SQLite
+database the first time they are filtered or sorted, and FilterOperations /
+ScheduleProperties push the work down to it: active filters become a WHERE
+clause and sort rows an ORDER BY. The query only returns row positions
+(`_row`, the position in the sheet's full frame), which the callers use to
+take the rows from the DataFrame - the grid then shows them page by page.
+
+Tables are rebuilt when the sheet changed since they were loaded (its edit
+counter in SheetOperations.versions, row count or columns moved). Every
+column a filter or sort touches is counted, and once a column was used
+INDEX_AFTER_USES times an index is created on it (on as_text(column) or
+lower_text(column) for the text comparisons of filters), so repeated queries
+stop scanning the table.
+
+Translation mirrors the pandas filters exactly where it is supported: text and
+numeric columns, the filter types FilterOperations offers. Anything else
+(boolean/datetime columns, unknown filter types) makes select() return None
+and the caller falls back to pandas.
+"""
+
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+
+DEFAULT_MIN_ROWS = 1000000
+INDEX_AFTER_USES = 2
+INSERT_CHUNK_ROWS = 50000
+
+
+def _as_text(value):
+    """SQL function as_text(): str() of a value, as astype(str) formats it (CAST formats reals differently)"""
+    return None if value is None else str(value)
+
+
+def _lower_text(value):
+    """SQL function lower_text(): Python's str.lower (SQLite's lower() only folds ASCII)"""
+    return None if value is None else str(value).lower()
+
+
+def _regexp(pattern, value):
+    """SQL REGEXP operator: re.search, as str.contains matches"""
+    return value is not None and re.search(pattern, str(value)) is not None
+
+
+def _to_number(value):
+    """SQL function to_number(): pd.to_numeric(errors='coerce') for a single value"""
+    if isinstance(value, (int, float)):
+        return value
+    if value is None:
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if number != number else number
+
+
+def _column_kind(dtype):
+    """'number' or 'text' for columns queries can be pushed down on, None otherwise"""
+    if pd.api.types.is_bool_dtype(dtype):
+        return None
+    if pd.api.types.is_numeric_dtype(dtype):
+        return 'number'
+    if isinstance(dtype, pd.CategoricalDtype):
+        return _column_kind(dtype.categories.dtype)
+    if pd.api.types.is_string_dtype(dtype) or pd.api.types.is_object_dtype(dtype):
+        return 'text'
+    return None
+
+
+def _sql_values(series):
+    """Column values as Python objects SQLite can bind (missing values as None)"""
+    values = series.to_numpy(dtype=object, na_value=None)
+    return values.tolist()
+
+
+class SqliteStore:
+    def __init__(self, directory=None):
+        self.directory = directory  # Parent of the session directory (None = the system temp directory)
+        self.session_dir = None     # Created on first use
+        self.path = None
+        self.connection = None
+        self._tables = {}      # {sheet key: (table name, token, {column: (sql name, kind)})}
+        self._uses = Counter()  # {(table, sql name, folded): number of queries using it}
+        self._indexes = set()
+
+    def _connect(self):
+        if self.connection is None:
+            if self.session_dir is None:
+                # mkdtemp: a fresh directory only this user can enter, so nobody can plant the database file
+                if self.directory:
+                    os.makedirs(self.directory, exist_ok=True)
+                self.session_dir = tempfile.mkdtemp(prefix='schedule_editor-', dir=self.directory)
+                self.path = os.path.join(self.session_dir, 'scratch.sqlite')
+            self.connection = sqlite3.connect(self.path)
+            self.connection.create_function('as_text', 1, _as_text, deterministic=True)
+            self.connection.create_function('lower_text', 1, _lower_text, deterministic=True)
+            self.connection.create_function('regexp', 2, _regexp, deterministic=True)
+            self.connection.create_function('to_number', 1, _to_number, deterministic=True)
+            # Scratch data: no rollback journal, no fsync
+            self.connection.execute('PRAGMA journal_mode=OFF')
+            self.connection.execute('PRAGMA synchronous=OFF')
+        return self.connection
+
+    # Tables
+    def table(self, key, frame, version):
+        """Name and column map of the table mirroring frame, (re)loading it when it is stale"""
+        token = (version, len(frame), tuple(frame.columns))
+        entry = self._tables.get(key)
+        if entry is not None and entry[1] == token:
+            return entry[0], entry[2]
+        connection = self._connect()
+        table = entry[0] if entry is not None else f"sheet{len(self._tables)}"
+        connection.execute(f'DROP TABLE IF EXISTS "{table}"')
+        self._indexes = {index for index in self._indexes if index[0] != table}
+        names = [f"c{position}" for position in range(frame.shape[1])]
+        # No declared types: values keep the storage class they were inserted with
+        connection.execute(f'CREATE TABLE "{table}" (_row INTEGER PRIMARY KEY, {", ".join(names)})')
+        insert = f'INSERT INTO "{table}" VALUES ({", ".join("?" * (len(names) + 1))})'
+        with connection:
+            for start in range(0, len(frame), INSERT_CHUNK_ROWS):
+                chunk = frame.iloc[start:start + INSERT_CHUNK_ROWS]
+                columns = [range(start, start + len(chunk))] + [_sql_values(chunk.iloc[:, position])
+                                                               for position in range(chunk.shape[1])]
+                connection.executemany(insert, zip(*columns))
+        columns = {}
+        for position, column in enumerate(frame.columns):
+            kind = _column_kind(frame.dtypes.iloc[position])
+            if kind is not None and column not in columns:
+                columns[column] = (names[position], kind)
+        self._tables[key] = (table, token, columns)
+        return table, columns
+
+    def _use(self, table, name, function=None):
+        """Count a query on a column (or function(column)) and index it once it is used often"""
+        use = (table, name, function)
+        self._uses[use] += 1
+        if self._uses[use] >= INDEX_AFTER_USES and use not in self._indexes:
+            expression = f"{function}({name})" if function else name
+            suffix = f"_{function}" if function else ''
+            self.connection.execute(f'CREATE INDEX IF NOT EXISTS "{table}_{name}{suffix}" ON "{table}" ({expression})')
+            self._indexes.add(use)
+
+    # Translation
+    def _condition(self, table, column, kind, filter_info):
+        """(SQL condition, parameters) of one FilterOperations filter, or None if it has no translation"""
+        filter_type = filter_info['type']
+        value = str(filter_info['value'])
+        folded = not filter_info['case_sensitive']
+        # Values are compared as text, as the pandas filters do (astype(str)): mixed columns hold INTEGER/REAL cells too
+        function = 'as_text'
+        if folded and filter_type in ("equals", "not equals", "contains", "not contains", "starts with", "ends with"):
+            function = 'lower_text'
+            value = value.lower()
+        text = f"{function}({column})"
+        if kind == 'number' and filter_type in ("greater than", "less than", "greater or equal", "less or equal"):
+            self._use(table, column)
+        else:
+            self._use(table, column, function)
+
+        if filter_type == "equals":
+            return f"{text} = ?", [value]
+        if filter_type == "not equals":
+            return f"({column} IS NULL OR {text} != ?)", [value]
+        # str.contains takes the value as a regular expression
+        literal = re.escape(value) == value
+        if filter_type == "contains":
+            return (f"instr({text}, ?) > 0" if literal else f"{text} REGEXP ?"), [value]
+        if filter_type == "not contains":
+            return (f"({column} IS NULL OR instr({text}, ?) = 0)" if literal else f"({column} IS NULL OR NOT {text} REGEXP ?)"), [value]
+        if filter_type == "starts with":
+            return f"substr({text}, 1, ?) = ?", [len(value), value]
+        if filter_type == "ends with":
+            if not value:
+                return f"{column} IS NOT NULL", []
+            return f"substr({text}, -?) = ?", [len(value), value]
+        if filter_type in ("greater than", "less than", "greater or equal", "less or equal"):
+            operator = {"greater than": '>', "less than": '<', "greater or equal": '>=', "less or equal": '<='}[filter_type]
+            try:
+                number = float(value)
+            except ValueError:
+                return f"{text} {operator} ?", [value]
+            if kind == 'number':
+                return f"{column} {operator} ?", [number]
+            return f"to_number({column}) {operator} ?", [number]
+        if filter_type == "is empty":
+            return f"({column} IS NULL OR {text} = '')", []
+        if filter_type == "is not empty":
+            return f"({column} IS NOT NULL AND {text} != '')", []
+        return None
+
+    def select(self, key, frame, version, filters=(), sort=()):
+        """Positions of frame's rows matching filters, in sort order (None when something cannot be pushed down)
+
+        filters are FilterOperations filter dicts, sort is [(column, ascending)].
+        Ties (and the unsorted case) keep the frame's row order.
+        """
+        conditions, parameters, order = [], [], []
+        kinds = {column: _column_kind(dtype) for column, dtype in frame.dtypes.items()}
+        if any(kinds.get(filter_info['column']) is None for filter_info in filters) or \
+                any(kinds.get(column) is None for column, _ in sort):
+            return None
+        table, columns = self.table(key, frame, version)
+        for filter_info in filters:
+            column, kind = columns[filter_info['column']]
+            translated = self._condition(table, column, kind, filter_info)
+            if translated is None:
+                return None
+            conditions.append(translated[0])
+            parameters.extend(translated[1])
+        for column, ascending in sort:
+            name = columns[column][0]
+            self._use(table, name)
+            # pandas puts missing values last in both directions
+            order.append(f"{name} {'ASC' if ascending else 'DESC'} NULLS LAST")
+        order.append('_row')
+        query = f'SELECT _row FROM "{table}"'
+        if conditions:
+            query += f" WHERE {' AND '.join(conditions)}"
+        query += f" ORDER BY {', '.join(order)}"
+        rows = self.connection.execute(query, parameters)
+        return np.fromiter((row for row, in rows), dtype=np.intp)
+
+    def clear(self):
+        """Forget every table (a new file or set of sheets was loaded)"""
+        if self.connection is not None:
+            for table, _, _ in self._tables.values():
+                self.connection.execute(f'DROP TABLE IF EXISTS "{table}"')
+        self._tables = {}
+        self._uses.clear()
+        self._indexes = set()
+
+    def close(self):
+        """Drop the scratch database and its session directory"""
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+        if self.session_dir is not None:
+            shutil.rmtree(self.session_dir, ignore_errors=True)
+            self.session_dir = self.path = None
@@ -0,0 +1,253 @@
+"""
+Streaming Reader Module
+Handles memory-bounded import of very large xlsx sheets for the XLS Editor
+
+pd.read_excel builds openpyxl's full cell model before creating a DataFrame.
+Here the sheet is read with openpyxl read_only/values_only row iteration and
+every column is built incrementally: numeric columns go straight into a
+compact array('d'), and a column only falls back to a Python list once a
+non-numeric value shows up. Columns declared by an import schema collect their
+cells as they are and are converted to the declared type at the end instead.
+Progress is reported every PROGRESS_EVERY rows and the import can be cancelled
+between rows.
+
+Revit and hand-edited workbooks often carry formatted but empty ranges far
+beyond the data. Blank rows only get into the frame when data follows them and
+a column only exists once a cell in it holds a value (or a header), so trailing
+empty rows and columns never reach the DataFrame. The openpyxl reader ignores
+the declared dimension, which would pad every row to its width and append
+empty rows up to its height. What was left out, measured against the dimension
+and the rows streamed, is reported in df.attrs['trimmed'].
+"""
+
+import math
+from array import array
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+from schema_types import convert_values, schema_positions
+
+
+# How many rows are read between progress callbacks / cancel checks
+PROGRESS_EVERY = 5000
+
+
+class ImportCancelled(Exception):
+    """Raised when the user cancels a running import"""
+
+
+class ColumnBuilder:
+    """Accumulates one column's values, as float64 while they stay numeric"""
+    __slots__ = ('numbers', 'values', 'integral', 'missing')
+
+    def __init__(self, padding=0):
+        self.numbers = array('d', [math.nan]) * padding
+        self.values = None      # Object fallback once a non-numeric value appears
+        self.integral = True    # Every number seen so far is a whole number
+        self.missing = padding > 0
+
+    def append(self, value):
+        if self.values is not None:
+            self.values.append(value)
+        elif value is None:
+            self.numbers.append(math.nan)
+            self.missing = True
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            if self.integral and not float(value).is_integer():
+                self.integral = False
+            self.numbers.append(value)
+        else:
+            # First non-numeric value: switch this column to generic storage
+            self.values = [None if math.isnan(number) else number for number in self.numbers]
+            self.values.append(value)
+            self.numbers = None
+
+    def extend_missing(self, count):
+        for _ in range(count):
+            self.append(None)
+
+    def finish(self):
+        """Final column array using the same dtype rules as pd.read_excel"""
+        if self.values is None:
+            numbers = np.frombuffer(self.numbers, dtype=np.float64)
+            if not len(numbers):
+                return np.array([], dtype=object)  # Header without data rows
+            if self.integral and not self.missing and len(numbers):
+                return numbers.astype(np.int64)
+            return numbers
+        values = [np.nan if value is None else value for value in self.values]
+        present = [value for value in values if not (isinstance(value, float) and math.isnan(value))]
+        if not present:
+            return np.array(values, dtype=object)
+        if len(present) < len(values) and all(isinstance(value, bool) for value in present):
+            return np.array(values, dtype=np.float64)  # pandas reads booleans with blanks as 1.0/0.0
+        return pd.Series(values).array
+
+
+class TypedColumnBuilder:
+    """Collects one column declared by an import schema; no dtype is inferred"""
+    __slots__ = ('kind', 'name', 'values')
+
+    def __init__(self, kind, name, padding=0):
+        self.kind = kind
+        self.name = name
+        self.values = [None] * padding
+
+    def append(self, value):
+        self.values.append(value)
+
+    def extend_missing(self, count):
+        self.values.extend([None] * count)
+
+    def finish(self):
+        return convert_values(self.values, self.kind, self.name)
+
+
+def column_names(header_values, width):
+    """Column labels matching pandas: 'Unnamed: n' for blanks, '.1' suffixes for duplicates"""
+    names, seen = [], {}
+    for position in range(width):
+        value = header_values[position] if position < len(header_values) else None
+        name = f"Unnamed: {position}" if value is None or value == '' else value
+        if name in seen:
+            seen[name] += 1
+            candidate = f"{name}.{seen[name]}"
+            while candidate in seen:
+                seen[name] += 1
+                candidate = f"{name}.{seen[name]}"
+            seen[candidate] = 0
+            name = candidate
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _normalize(value):
+    """Match pandas' openpyxl cell conversion (whole floats become ints, blanks become None)"""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if value == '':
+        return None
+    return value
+
+
+def build_frame(rows, header=0, progress=None, cancel=None, total_rows=None, usecols=None, dtypes=None,
+                extent=None):
+    """Turn an iterator of raw row tuples into a DataFrame the way pd.read_excel would
+
+    Shared by stream_sheet() and the native xlsx_reader engine. progress and
+    cancel behave as described in stream_sheet(). usecols (0-based positions)
+    only builds those columns; the result equals the full frame restricted to them.
+    dtypes ({column: schema_types type}) builds the declared columns in that type.
+    extent is the (rows, columns) the sheet declares; empty rows and columns
+    left out are counted against it (and the rows streamed) in df.attrs['trimmed'].
+    """
+    keep = None if usecols is None else sorted(set(usecols))
+    dtypes = dtypes if header is not None else None
+    builders = {}  # {position: ColumnBuilder}
+    width = 0
+    header_values = []
+    rows_read = 0
+    raw_width = 0
+    data_rows = 0
+    pending_empty = 0  # Blank rows are only kept if data follows them
+
+    for row in rows:
+        rows_read += 1
+        if rows_read % PROGRESS_EVERY == 0:
+            if cancel is not None and cancel.is_set():
+                raise ImportCancelled()
+            if progress is not None:
+                progress(rows_read, total_rows)
+
+        if header is not None and rows_read <= header + 1:
+            if rows_read == header + 1:
+                header_values = [_normalize(value) for value in row]
+            continue
+
+        # Drop trailing blank cells so ragged rows do not create empty columns
+        raw_width = max(raw_width, len(row))
+        values = [_normalize(value) for value in row]
+        while values and values[-1] is None:
+            values.pop()
+        if not values:
+            pending_empty += 1
+            continue
+
+        if pending_empty:
+            for builder in builders.values():
+                builder.extend_missing(pending_empty)
+            data_rows += pending_empty
+            pending_empty = 0
+        if len(values) > width:
+            _add_builders(builders, keep, width, len(values), data_rows, dtypes, header_values)
+            width = len(values)
+        for position, builder in builders.items():
+            builder.append(values[position] if position < len(values) else None)
+        data_rows += 1
+
+    if progress is not None:
+        progress(rows_read, total_rows)
+    if header is not None and 0 < rows_read <= header:
+        raise ValueError(f"Passed header={header}, but only {rows_read} lines in the sheet")
+
+    while header_values and header_values[-1] is None:
+        header_values.pop()
+    if len(header_values) > width:
+        _add_builders(builders, keep, width, len(header_values), data_rows, dtypes, header_values)
+        width = len(header_values)
+    names = column_names(header_values, width) if header is not None else list(range(width))
+    positions = sorted(builders)
+    df = pd.DataFrame({position: builders[position].finish() for position in positions},
+                      index=pd.RangeIndex(data_rows))
+    # Labels are cut from the full row of labels so they keep its dtype
+    df.columns = pd.Index(names)[positions] if positions else pd.RangeIndex(0)
+    header_rows = min(rows_read, header + 1) if header is not None else 0
+    declared_rows, declared_columns = extent or (0, 0)
+    trimmed = {'rows': max(declared_rows or 0, rows_read) - header_rows - data_rows,
+               'columns': max(declared_columns or 0, raw_width) - width}
+    if trimmed['rows'] > 0 or trimmed['columns'] > 0:
+        df.attrs['trimmed'] = {kind: max(count, 0) for kind, count in trimmed.items()}
+    return df
+
+
+def _add_builders(builders, keep, start, stop, padding, dtypes=None, header_values=()):
+    """Start the builders of the kept columns in positions start..stop-1"""
+    positions = range(start, stop) if keep is None else [position for position in keep if start <= position < stop]
+    names = column_names(header_values, stop) if dtypes else None
+    kinds = schema_positions(dtypes, names) if dtypes else {}
+    for position in positions:
+        if position in kinds:
+            builders[position] = TypedColumnBuilder(kinds[position], names[position], padding=padding)
+        else:
+            builders[position] = ColumnBuilder(padding=padding)
+
+
+def stream_sheet(file_path, sheet_name=0, header=0, progress=None, cancel=None, usecols=None, nrows=None,
+                 dtypes=None):
+    """Read one sheet row by row into a DataFrame
+
+    progress(rows_read, total_rows) is called every PROGRESS_EVERY rows
+    (total_rows is the sheet's declared size, or None). cancel is an object
+    with is_set() (e.g. threading.Event); once set, ImportCancelled is raised.
+    usecols limits the columns built to those 0-based positions and nrows
+    the number of data rows read. dtypes declares column types, see build_frame().
+    """
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[sheet_name] if isinstance(sheet_name, int) else workbook[sheet_name]
+        total_rows, total_columns = sheet.max_row, sheet.max_column
+        # Only the rows and cells actually in the file (no padding up to the declared dimension)
+        sheet.reset_dimensions()
+        rows = sheet.iter_rows(values_only=True)
+        if nrows is not None:
+            rows = islice(rows, nrows + (header + 1 if header is not None else 0))
+        return build_frame(rows, header=header,
+                           progress=progress, cancel=cancel, total_rows=total_rows, usecols=usecols,
+                           dtypes=dtypes, extent=(total_rows, total_columns) if nrows is None else None)
+    finally:
+        workbook.close()
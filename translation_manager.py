@@ -19,6 +19,10 @@ class TranslationManager:
                 "Save As": "Save As",
                 "Exit": "Exit",
                 "Edit": "Edit",
+                "Undo": "Undo",
+                "Redo": "Redo",
+                "Nothing to undo": "Nothing to undo",
+                "Nothing to redo": "Nothing to redo",
                 "Add Row": "Add Row",
                 "Delete Row": "Delete Row",
                 "Add Column": "Add Column",
@@ -63,7 +67,76 @@ class TranslationManager:
                 "All files": "All files",
                 "File imported successfully": "File imported successfully",
                 "Failed to import file": "Failed to import file",
-                "Import failed": "Import failed"
+                "Import failed": "Import failed",
+                "Import cancelled": "Import cancelled",
+                "Importing": "Importing",
+                "Cancelling import...": "Cancelling import...",
+                "Another file is still being imported.": "Another file is still being imported.",
+                "Reading rows": "Reading rows",
+                "Esc to cancel": "Esc to cancel",
+                "SQLite query failed, filtering in memory": "SQLite query failed, filtering in memory",
+                "Editing is available once the import finishes": "Editing is available once the import finishes",
+                "Select Sheets": "Select Sheets",
+                "Available Sheets": "Available Sheets",
+                "Primary Sheet (for main view)": "Primary Sheet (for main view)",
+                "Select All": "Select All",
+                "Select None": "Select None",
+                "Load Sheets": "Load Sheets",
+                "Please select at least one sheet.": "Please select at least one sheet.",
+                "Primary sheet must be selected.": "Primary sheet must be selected.",
+                "Estimated load time": "Estimated load time",
+                "hidden": "hidden",
+                "Recover Unsaved Changes": "Recover Unsaved Changes",
+                "Unsaved changes from a previous session were found": "Unsaved changes from a previous session were found",
+                "Recover them?": "Recover them?",
+                "Failed to recover autosave": "Failed to recover autosave",
+                "Recovered unsaved changes": "Recovered unsaved changes",
+                "Untitled": "Untitled",
+                "Quick Save": "Quick Save",
+                "Edits saved to the journal (the workbook is written on Save or exit)": "Edits saved to the journal (the workbook is written on Save or exit)",
+                "Edit journal disabled": "Edit journal disabled",
+                "Journaled Edits": "Journaled Edits",
+                "edits were recorded after the last full save": "edits were recorded after the last full save",
+                "Apply them?": "Apply them?",
+                "Applied journaled edits": "Applied journaled edits",
+                "Failed to apply journaled edits": "Failed to apply journaled edits",
+                "CSV files": "CSV files",
+                "Tab separated files": "Tab separated files",
+                "Export CSV": "Export CSV",
+                "Exported": "Exported",
+                "CSV files hold a single sheet. Use Export CSV to write the current sheet.": "CSV files hold a single sheet. Use Export CSV to write the current sheet.",
+                "Schedule workspace": "Schedule workspace",
+                "Open Workspace": "Open Workspace",
+                "Save Workspace": "Save Workspace",
+                "Workspace opened": "Workspace opened",
+                "Workspace saved": "Workspace saved",
+                "Failed to open workspace": "Failed to open workspace",
+                "Failed to save workspace": "Failed to save workspace",
+                "Schedule view": "Schedule view",
+                "Save Schedule View": "Save Schedule View",
+                "Import with Schedule View": "Import with Schedule View",
+                "Load Remaining Columns": "Load Remaining Columns",
+                "Schedule view saved": "Schedule view saved",
+                "Failed to save schedule view": "Failed to save schedule view",
+                "Failed to open schedule view": "Failed to open schedule view",
+                "Every column of this sheet is loaded.": "Every column of this sheet is loaded.",
+                "The remaining columns cannot be loaded: the file or the rows changed since the import.": "The remaining columns cannot be loaded: the file or the rows changed since the import.",
+                "Loaded remaining columns": "Loaded remaining columns",
+                "Failed to load remaining columns": "Failed to load remaining columns",
+                "Columns Not Loaded": "Columns Not Loaded",
+                "Columns left out by the schedule view could not be loaded and will not be saved": "Columns left out by the schedule view could not be loaded and will not be saved",
+                "Save anyway?": "Save anyway?",
+                "loading...": "loading...",
+                "Loading... showing the first rows": "Loading... showing the first rows",
+                "Import schema": "Import schema",
+                "Use Import Schema": "Use Import Schema",
+                "Generate Import Schema": "Generate Import Schema",
+                "Clear Import Schema": "Clear Import Schema",
+                "Import schema in use": "Import schema in use",
+                "Import schema cleared": "Import schema cleared",
+                "Import schema saved": "Import schema saved",
+                "Failed to open import schema": "Failed to open import schema",
+                "Failed to save import schema": "Failed to save import schema"
             },
             "vi": {  # Vietnamese
                 "XLS File Editor with Filtering": "Trình Chỉnh Sửa File XLS với Bộ Lọc",
@@ -73,6 +146,10 @@ class TranslationManager:
                 "Save As": "Lưu Thành",
                 "Exit": "Thoát",
                 "Edit": "Chỉnh Sửa",
+                "Undo": "Hoàn Tác",
+                "Redo": "Làm Lại",
+                "Nothing to undo": "Không có gì để hoàn tác",
+                "Nothing to redo": "Không có gì để làm lại",
                 "Add Row": "Thêm Dòng",
                 "Delete Row": "Xóa Dòng",
                 "Add Column": "Thêm Cột",
@@ -119,6 +196,75 @@ class TranslationManager:
                 "File imported successfully": "File đã được nhập thành công",
                 "Failed to import file": "Lỗi khi nhập file",
                 "Import failed": "Nhập file thất bại",
+                "Import cancelled": "Đã hủy nhập file",
+                "Importing": "Đang nhập file",
+                "Cancelling import...": "Đang hủy nhập file...",
+                "Another file is still being imported.": "Một file khác vẫn đang được nhập.",
+                "Reading rows": "Đang đọc dòng",
+                "Esc to cancel": "Esc để hủy",
+                "SQLite query failed, filtering in memory": "Truy vấn SQLite thất bại, lọc trong bộ nhớ",
+                "Editing is available once the import finishes": "Có thể chỉnh sửa sau khi nhập xong",
+                "Select Sheets": "Chọn Sheet",
+                "Available Sheets": "Các Sheet Có Sẵn",
+                "Primary Sheet (for main view)": "Sheet Chính (hiển thị chính)",
+                "Select All": "Chọn Tất Cả",
+                "Select None": "Bỏ Chọn Tất Cả",
+                "Load Sheets": "Tải Sheet",
+                "Please select at least one sheet.": "Vui lòng chọn ít nhất một sheet.",
+                "Primary sheet must be selected.": "Sheet chính phải được chọn.",
+                "Estimated load time": "Thời gian tải ước tính",
+                "hidden": "ẩn",
+                "Recover Unsaved Changes": "Khôi Phục Thay Đổi Chưa Lưu",
+                "Unsaved changes from a previous session were found": "Đã tìm thấy thay đổi chưa lưu từ phiên làm việc trước",
+                "Recover them?": "Khôi phục lại?",
+                "Failed to recover autosave": "Lỗi khi khôi phục bản lưu tự động",
+                "Recovered unsaved changes": "Đã khôi phục thay đổi chưa lưu",
+                "Untitled": "Chưa đặt tên",
+                "Quick Save": "Lưu Nhanh",
+                "Edits saved to the journal (the workbook is written on Save or exit)": "Đã lưu thay đổi vào nhật ký (tệp sẽ được ghi khi Lưu hoặc thoát)",
+                "Edit journal disabled": "Đã tắt nhật ký chỉnh sửa",
+                "Journaled Edits": "Thay đổi trong nhật ký",
+                "edits were recorded after the last full save": "thay đổi được ghi lại sau lần lưu đầy đủ gần nhất",
+                "Apply them?": "Áp dụng các thay đổi này?",
+                "Applied journaled edits": "Đã áp dụng thay đổi từ nhật ký",
+                "Failed to apply journaled edits": "Không thể áp dụng thay đổi từ nhật ký",
+                "CSV files": "Tệp CSV",
+                "Tab separated files": "Tệp phân cách bằng tab",
+                "Export CSV": "Xuất CSV",
+                "Exported": "Đã xuất",
+                "CSV files hold a single sheet. Use Export CSV to write the current sheet.": "Tệp CSV chỉ chứa một sheet. Hãy dùng Xuất CSV để ghi sheet hiện tại.",
+                "Schedule workspace": "Không gian làm việc lịch",
+                "Open Workspace": "Mở Không Gian Làm Việc",
+                "Save Workspace": "Lưu Không Gian Làm Việc",
+                "Workspace opened": "Đã mở không gian làm việc",
+                "Workspace saved": "Đã lưu không gian làm việc",
+                "Failed to open workspace": "Không thể mở không gian làm việc",
+                "Failed to save workspace": "Không thể lưu không gian làm việc",
+                "Schedule view": "Khung nhìn lịch",
+                "Save Schedule View": "Lưu Khung Nhìn Lịch",
+                "Import with Schedule View": "Nhập Với Khung Nhìn Lịch",
+                "Load Remaining Columns": "Tải Các Cột Còn Lại",
+                "Schedule view saved": "Đã lưu khung nhìn lịch",
+                "Failed to save schedule view": "Không thể lưu khung nhìn lịch",
+                "Failed to open schedule view": "Không thể mở khung nhìn lịch",
+                "Every column of this sheet is loaded.": "Tất cả các cột của trang tính này đã được tải.",
+                "The remaining columns cannot be loaded: the file or the rows changed since the import.": "Không thể tải các cột còn lại: file hoặc các dòng đã thay đổi kể từ khi nhập.",
+                "Loaded remaining columns": "Đã tải các cột còn lại",
+                "Failed to load remaining columns": "Không thể tải các cột còn lại",
+                "Columns Not Loaded": "Cột Chưa Được Tải",
+                "Columns left out by the schedule view could not be loaded and will not be saved": "Các cột bị khung nhìn lịch bỏ qua không thể tải và sẽ không được lưu",
+                "Save anyway?": "Vẫn lưu?",
+                "loading...": "đang tải...",
+                "Loading... showing the first rows": "Đang tải... hiển thị các dòng đầu tiên",
+                "Import schema": "Lược đồ nhập",
+                "Use Import Schema": "Dùng Lược Đồ Nhập",
+                "Generate Import Schema": "Tạo Lược Đồ Nhập",
+                "Clear Import Schema": "Bỏ Lược Đồ Nhập",
+                "Import schema in use": "Đang dùng lược đồ nhập",
+                "Import schema cleared": "Đã bỏ lược đồ nhập",
+                "Import schema saved": "Đã lưu lược đồ nhập",
+                "Failed to open import schema": "Không thể mở lược đồ nhập",
+                "Failed to save import schema": "Không thể lưu lược đồ nhập",
                 "Warning": "Cảnh Báo",
                 "No file is currently loaded": "Chưa có file nào được tải",
                 "Please select a row to delete": "Vui lòng chọn một dòng để xóa",
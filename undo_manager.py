@@ -0,0 +1,307 @@
+"""
+Undo Manager Module
+Records compact edit deltas for undo/redo in the XLS Editor
+
+Only what changed is stored (cell coordinates with old/new values, inserted or
+deleted rows/columns, formula definitions) - DataFrames are never snapshotted.
+"""
+
+import sys
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from dtype_optimizer import set_cell, insert_row
+
+
+# Fixed per-entry overhead used when estimating history memory
+DELTA_OVERHEAD = 96
+
+
+class Delta:
+    """A single reversible change recorded in the undo history"""
+    __slots__ = ('kind', 'sheet', 'data', 'size')
+
+    def __init__(self, kind, sheet, data):
+        self.kind = kind      # 'cell', 'insert_row', 'delete_row', 'insert_column', 'delete_column', 'formula'
+        self.sheet = sheet    # Sheet the change was made on (None in single-sheet mode)
+        self.data = data      # Kind-specific tuple, see UndoManager.record_* methods
+        self.size = estimate_size(data) + DELTA_OVERHEAD
+
+
+def estimate_size(value):
+    """Roughly estimate the memory held by a delta payload in bytes"""
+    if isinstance(value, (np.ndarray, pd.api.extensions.ExtensionArray)):
+        if value.dtype == object:
+            return value.nbytes + sum(sys.getsizeof(v) for v in value)
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+def same_value(a, b):
+    """Compare two cell values, treating missing values as equal"""
+    a_missing = a is None or (not isinstance(a, str) and pd.isna(a))
+    b_missing = b is None or (not isinstance(b, str) and pd.isna(b))
+    if a_missing or b_missing:
+        return a_missing and b_missing
+    try:
+        return bool(a == b) and type(a) == type(b)
+    except (TypeError, ValueError):
+        return False
+
+
+class UndoManager:
+    def __init__(self, editor_instance, max_bytes=64 * 1024 * 1024):
+        self.editor = editor_instance
+        self.max_bytes = max_bytes
+        self.undo_stack = deque()  # Oldest entries on the left, evicted first
+        self.redo_stack = []
+        self.total_bytes = 0  # Estimated size of both stacks
+        self._applying = False
+
+    # History bookkeeping
+    def clear(self):
+        """Drop all undo/redo history (e.g. after a new file is imported)"""
+        self.undo_stack.clear()
+        self.redo_stack = []
+        self.total_bytes = 0
+
+    def copy_values(self):
+        """Give the values of removed columns their own memory (the file they were mapped from is being replaced)"""
+        for delta in list(self.undo_stack) + self.redo_stack:
+            if delta.kind == 'delete_column':
+                column, position, values = delta.data
+                delta.data = (column, position, values.copy())
+
+    def set_memory_limit(self, max_bytes):
+        """Change the history memory budget and evict entries that no longer fit"""
+        self.max_bytes = max_bytes
+        self._evict()
+
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def _current_sheet(self):
+        """Name of the sheet currently being edited"""
+        sheet_ops = getattr(self.editor, 'sheet_ops', None)
+        return sheet_ops.current_sheet if sheet_ops is not None else None
+
+    def _push(self, delta):
+        """Add a delta to the undo stack, invalidating redo history"""
+        if self._applying:
+            return
+        self.total_bytes -= sum(redo.size for redo in self.redo_stack)
+        self.redo_stack = []
+        self.undo_stack.append(delta)
+        self.total_bytes += delta.size
+        self._evict()
+
+    def _journal(self, kind, sheet, data):
+        """Append the forward form of a change to the edit journal"""
+        journal = getattr(self.editor, 'journal', None)
+        if journal is not None and not self._applying:
+            journal.record(kind, sheet, data)
+
+    def _evict(self):
+        """Evict the least recently used history until under the memory budget
+
+        Oldest undo entries go first, then the redo entries furthest from being redone.
+        """
+        while self.total_bytes > self.max_bytes and (self.undo_stack or self.redo_stack):
+            evicted = self.undo_stack.popleft() if self.undo_stack else self.redo_stack.pop(0)
+            self.total_bytes -= evicted.size
+
+    # Recording
+    def record_cell_edit(self, row_index, column, old_value, new_value):
+        """Record a cell edit, coalescing consecutive edits to the same cell"""
+        if self._applying:
+            return
+        sheet = self._current_sheet()
+        self._journal('cell', sheet, (row_index, column, new_value))
+        if same_value(old_value, new_value):
+            return
+        if self.undo_stack and not self.redo_stack:
+            last = self.undo_stack[-1]
+            if last.kind == 'cell' and last.sheet == sheet and last.data[:2] == (row_index, column):
+                # Keep the oldest value and replace the newest one
+                self.undo_stack.pop()
+                self.total_bytes -= last.size
+                if same_value(last.data[2], new_value):
+                    return  # Edited back to where it started - nothing left to undo
+                self._push(Delta('cell', sheet, (row_index, column, last.data[2], new_value)))
+                return
+        self._push(Delta('cell', sheet, (row_index, column, old_value, new_value)))
+
+    def record_row_insert(self, position, values=None):
+        """Record a row inserted at position (values=None means an empty row)"""
+        self._journal('insert_row', self._current_sheet(), (position, values))
+        self.editor.sheet_ops.note_rows_moved(self._current_sheet())
+        self._push(Delta('insert_row', self._current_sheet(), (position, values)))
+
+    def record_row_delete(self, position, values):
+        """Record a row removed from position along with its values"""
+        self._journal('delete_row', self._current_sheet(), (position,))
+        self.editor.sheet_ops.note_rows_moved(self._current_sheet())
+        self._push(Delta('delete_row', self._current_sheet(), (position, list(values))))
+
+    def record_column_insert(self, column, position):
+        """Record an empty column inserted at position"""
+        self._journal('insert_column', self._current_sheet(), (column, position, None))
+        self._push(Delta('insert_column', self._current_sheet(), (column, position)))
+
+    def record_column_delete(self, column, position, values):
+        """Record a column removed from position along with its values"""
+        if not hasattr(values, 'dtype'):
+            values = np.asarray(values)
+        self._journal('delete_column', self._current_sheet(), (column,))
+        self._push(Delta('delete_column', self._current_sheet(), (column, position, values)))
+
+    def record_formula_change(self, old_name, old_definition, new_name, new_definition):
+        """Record a formula field create (old=None), update or delete (new=None)"""
+        old_definition = dict(old_definition) if old_definition else None
+        new_definition = dict(new_definition) if new_definition else None
+        self._push(Delta('formula', self._current_sheet(), (old_name, old_definition, new_name, new_definition)))
+
+    # Undo / redo
+    def undo(self, event=None):
+        """Revert the most recent change"""
+        if not self.undo_stack:
+            self.editor.status_var.set(self.editor.tr("Nothing to undo"))
+            return
+        delta = self.undo_stack.pop()
+        self._apply(delta, reverse=True)
+        self.redo_stack.append(delta)  # Still counted in total_bytes
+        self.editor.status_var.set(f"{self.editor.tr('Undo')}: {self.describe(delta)}")
+
+    def redo(self, event=None):
+        """Re-apply the most recently undone change"""
+        if not self.redo_stack:
+            self.editor.status_var.set(self.editor.tr("Nothing to redo"))
+            return
+        delta = self.redo_stack.pop()
+        self._apply(delta, reverse=False)
+        self.undo_stack.append(delta)
+        self.editor.status_var.set(f"{self.editor.tr('Redo')}: {self.describe(delta)}")
+
+    def describe(self, delta):
+        """Short human readable description of a delta"""
+        if delta.kind == 'cell':
+            return f"edit cell [{delta.data[0]}, {delta.data[1]}]"
+        if delta.kind in ('insert_row', 'delete_row'):
+            return f"{delta.kind.replace('_', ' ')} {delta.data[0]}"
+        if delta.kind in ('insert_column', 'delete_column'):
+            return f"{delta.kind.replace('_', ' ')} '{delta.data[0]}'"
+        return f"formula field '{delta.data[2] or delta.data[0]}'"
+
+    def _activate_sheet(self, sheet):
+        """Switch to the sheet a delta belongs to before applying it"""
+        sheet_ops = getattr(self.editor, 'sheet_ops', None)
+        if sheet is None or sheet_ops is None or sheet == sheet_ops.current_sheet:
+            return
+        if sheet in sheet_ops.available_sheets and hasattr(self.editor, 'current_sheet_var'):
+            self.editor.current_sheet_var.set(sheet)
+            sheet_ops.switch_sheet()
+
+    def _apply(self, delta, reverse):
+        """Apply a delta forwards (redo) or backwards (undo) to the working data"""
+        self._applying = True
+        try:
+            self._activate_sheet(delta.sheet)
+            kind = delta.kind
+            if kind == 'cell':
+                row_index, column, old_value, new_value = delta.data
+                self._set_cell(row_index, column, old_value if reverse else new_value)
+            elif kind == 'insert_row':
+                position, values = delta.data
+                if reverse:
+                    self._drop_row(position)
+                else:
+                    self._insert_row(position, values)
+            elif kind == 'delete_row':
+                position, values = delta.data
+                if reverse:
+                    self._insert_row(position, values)
+                else:
+                    self._drop_row(position)
+            elif kind == 'insert_column':
+                column, position = delta.data
+                if reverse:
+                    self.editor.df = self.editor.df.drop(columns=[column])
+                else:
+                    self.editor.df.insert(min(position, len(self.editor.df.columns)), column, None)
+            elif kind == 'delete_column':
+                column, position, values = delta.data
+                if reverse:
+                    self.editor.df.insert(min(position, len(self.editor.df.columns)), column, values)
+                else:
+                    self.editor.df = self.editor.df.drop(columns=[column])
+            elif kind == 'formula':
+                old_name, old_definition, new_name, new_definition = delta.data
+                if reverse:
+                    self._replace_formula(new_name, old_name, old_definition)
+                else:
+                    self._replace_formula(old_name, new_name, new_definition)
+        finally:
+            self._applying = False
+
+        self._journal_applied(delta, reverse)
+        self.editor.modified = True
+        self.editor.sheet_ops.mark_dirty()
+        self.editor.file_ops.update_file_info()
+        if self.editor.active_filters:
+            self.editor.filter_ops.apply_filters()
+        else:
+            self.editor.data_ops.populate_treeview()
+
+    def _journal_applied(self, delta, reverse):
+        """Journal the change an undo/redo actually made (formula changes are journaled as whole sheets)"""
+        kind = delta.kind
+        if kind == 'cell':
+            row_index, column, old_value, new_value = delta.data
+            self._journal('cell', delta.sheet, (row_index, column, old_value if reverse else new_value))
+        elif kind in ('insert_row', 'delete_row'):
+            position, values = delta.data
+            if (kind == 'insert_row') != reverse:
+                self._journal('insert_row', delta.sheet, (position, values))
+            else:
+                self._journal('delete_row', delta.sheet, (position,))
+        elif kind in ('insert_column', 'delete_column'):
+            column, position = delta.data[:2]
+            if (kind == 'insert_column') != reverse:
+                values = delta.data[2] if kind == 'delete_column' else None
+                self._journal('insert_column', delta.sheet, (column, position, values))
+            else:
+                self._journal('delete_column', delta.sheet, (column,))
+
+    def _set_cell(self, row_index, column, value):
+        set_cell(self.editor.df, row_index, self.editor.df.columns.get_loc(column), value)
+
+    def _insert_row(self, position, values):
+        self.editor.df = insert_row(self.editor.df, position, values)
+
+    def _drop_row(self, position):
+        df = self.editor.df
+        self.editor.df = df.drop(index=df.index[position]).reset_index(drop=True)
+
+    def _replace_formula(self, remove_name, add_name, add_definition):
+        """Remove one formula field and (re)create another from its definition"""
+        if remove_name is not None:
+            for attr in ('df', 'original_df'):
+                frame = getattr(self.editor, attr)
+                if frame is not None and remove_name in frame.columns:
+                    setattr(self.editor, attr, frame.drop(columns=[remove_name]))
+            self.editor.formula_fields.pop(remove_name, None)
+            if remove_name in self.editor.visible_columns:
+                self.editor.visible_columns.remove(remove_name)
+        if add_name is not None and add_definition is not None:
+            self.editor.formula_fields[add_name] = dict(add_definition)
+            self.editor.formula_ops.calculate_formula_field(add_name)
+        self.editor.sync_current_sheet_data()
@@ -0,0 +1,356 @@
+"""
+Workbook Reader Module
+Handles parsing Excel workbooks into DataFrames for the XLS Editor
+
+A workbook is opened once (pd.ExcelFile) and that handle is shared by sheet
+listing and by every sheet parse, so multi-sheet imports only unpack and index
+the xlsx archive a single time.
+
+Large multi-sheet workbooks can also be parsed in parallel: each sheet is read
+in its own worker process and sent back as a compact columnar payload
+(column_store.pack_frame) rather than a pickled object DataFrame.
+
+Very large xlsx files can be read with streaming=True, which goes through
+streaming_reader.stream_sheet() (row by row, with progress and cancel)
+instead of pd.read_excel.
+
+With engine='native', xlsx sheets are parsed by xlsx_reader (zipfile +
+iterparse straight into column arrays); sheets it cannot handle fall back to
+openpyxl. Sheet names and sizes of xlsx files come from xlsx_metadata, which reads the
+workbook XML straight from the zip without opening the workbook in openpyxl.
+
+CSV/TSV files are handled by csv_io and look like a workbook with one sheet.
+
+Every reader takes dtypes, the {column: type} map of the import schema in use
+(schema_types), and builds the declared columns in those types.
+"""
+
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+import pandas as pd
+
+from column_store import pack_frame, unpack_frame
+from streaming_reader import stream_sheet, ImportCancelled
+from header_band import HEADER_BAND_ROWS, band_columns, fit_band
+import csv_io
+import schema_types
+import xlsx_metadata
+import xlsx_reader
+
+
+# Below this many sheets, starting worker processes costs more than it saves
+PARALLEL_MIN_SHEETS = 3
+
+
+def excel_engine(file_path):
+    """Pick the pandas engine for a workbook path"""
+    return 'openpyxl' if file_path.endswith('.xlsx') else 'xlrd'
+
+
+class SharedWorkbook:
+    """Workbook handle shared by one import; the file is only opened on first real use
+
+    Sheets served from the parse cache therefore never open the workbook.
+    """
+
+    def __init__(self, file_path):
+        self.io = file_path
+        self._excel = None
+
+    def _opened(self):
+        if self._excel is None:
+            self._excel = pd.ExcelFile(self.io, engine=excel_engine(self.io))
+        return self._excel
+
+    @property
+    def sheet_names(self):
+        return self._opened().sheet_names
+
+    def parse(self, sheet_name=0, header=0, **kwargs):
+        return self._opened().parse(sheet_name=sheet_name, header=header, **kwargs)
+
+    def close(self):
+        if self._excel is not None:
+            self._excel.close()
+            self._excel = None
+
+
+def open_workbook(file_path):
+    """Create the handle reused for listing and parsing sheets of one workbook"""
+    return SharedWorkbook(file_path)
+
+
+@contextmanager
+def opened(source):
+    """Yield an open workbook for a path or an already open handle
+
+    Handles passed in by the caller are left open; workbooks opened here are
+    closed again on exit.
+    """
+    if isinstance(source, (pd.ExcelFile, SharedWorkbook)):
+        yield source
+        return
+    workbook = open_workbook(source)
+    try:
+        yield workbook
+    finally:
+        workbook.close()
+
+
+def sheet_names(source, cache=None):
+    """List the sheet names of a workbook"""
+    path = workbook_path(source) if cache is not None else None
+    if path is not None:
+        names = cache.get_sheet_names(path)
+        if names is not None:
+            return names
+    names = None
+    xlsx_path = workbook_path(source)
+    if xlsx_path is not None and csv_io.is_csv(xlsx_path):
+        names = [csv_io.sheet_name(xlsx_path)]
+    elif xlsx_path is not None and xlsx_path.endswith('.xlsx'):
+        try:
+            names = xlsx_metadata.sheet_names(xlsx_path)
+        except Exception:
+            names = None  # Unusual package layout: let openpyxl read it
+    if not names:
+        with opened(source) as workbook:
+            names = list(workbook.sheet_names)
+    if path is not None:
+        cache.put_sheet_names(path, names)
+    return names
+
+
+def sheet_sizes(source):
+    """{sheet name: xlsx_metadata sheet info} for xlsx workbooks, {} when sizes cannot be read cheaply"""
+    path = workbook_path(source)
+    if path is None or not path.endswith('.xlsx'):
+        return {}
+    try:
+        return {sheet['name']: sheet for sheet in xlsx_metadata.read_sheet_info(path)}
+    except Exception:
+        return {}
+
+
+def _read_native(path, sheet_name, header, nrows=None, progress=None, cancel=None, usecols=None, dtypes=None):
+    """Parse with the native xlsx engine, or return None when openpyxl has to do it"""
+    try:
+        return xlsx_reader.read_sheet(path, sheet_name=sheet_name, header=header, nrows=nrows,
+                                      progress=progress, cancel=cancel, usecols=usecols, dtypes=dtypes)
+    except xlsx_reader.UnsupportedWorkbook:
+        return None
+
+
+def _parse_one(source, sheet_name, header, streaming=False, progress=None, cancel=None, engine='openpyxl',
+               csv_dtypes=None, usecols=None, nrows=None, dtypes=None):
+    """Parse a sheet with the native engine, pandas or, for streaming imports, row by row"""
+    path = workbook_path(source)
+    if path is not None and csv_io.is_csv(path):
+        if dtypes:
+            csv_dtypes = {**(csv_dtypes or {}), **schema_types.csv_dtypes(dtypes)}
+        df = csv_io.read_csv(path, header=header, dtypes=csv_dtypes, progress=progress, cancel=cancel, usecols=usecols,
+                             nrows=nrows)
+        # Dates are pinned as text, the C parser has no declared date type
+        return schema_types.apply_schema(df, {name: kind for name, kind in (dtypes or {}).items() if kind == 'date'})
+    if path is not None and path.endswith('.xlsx'):
+        if engine == 'native':
+            df = _read_native(path, sheet_name, header, nrows=nrows, progress=progress, cancel=cancel, usecols=usecols,
+                              dtypes=dtypes)
+            if df is not None:
+                return df
+        if streaming:
+            return stream_sheet(path, sheet_name=sheet_name, header=header, progress=progress, cancel=cancel,
+                                usecols=usecols, nrows=nrows, dtypes=dtypes)
+    return schema_types.apply_schema(_parse_openpyxl(source, sheet_name, header, usecols, nrows), dtypes)
+
+
+def _parse_openpyxl(source, sheet_name, header, usecols=None, nrows=None):
+    """pandas' own parse (openpyxl for xlsx, xlrd for xls)"""
+    with opened(source) as workbook:
+        if usecols is None:
+            return workbook.parse(sheet_name=sheet_name, header=header, nrows=nrows)
+        # Labels are taken from the full header row so duplicates are numbered as in a full read
+        usecols = sorted(set(usecols))
+        width = usecols[-1] + 1 if usecols else 0
+        if header is None:
+            names = list(range(width))
+        else:
+            top = workbook.parse(sheet_name=sheet_name, header=None, nrows=header + 1)
+            names = band_columns(fit_band(top, width), header) or []
+            usecols = [position for position in usecols if position < len(names)]
+        df = workbook.parse(sheet_name=sheet_name, header=header, usecols=usecols, nrows=nrows)
+        return df.set_axis(pd.Index(names)[usecols], axis=1)
+
+
+def read_sheet(source, sheet_name=0, header=0, cache=None, streaming=False, progress=None, cancel=None, engine='openpyxl',
+               csv_dtypes=None, usecols=None, nrows=None, dtypes=None):
+    """Parse a single sheet from a workbook path or open handle (or load it from cache)
+
+    streaming/progress/cancel select the row-by-row reader, see
+    streaming_reader.stream_sheet(). engine='native' reads xlsx files with
+    xlsx_reader. csv_dtypes pins {column: dtype} for CSV/TSV files (such reads
+    bypass the cache, whose key does not include the schema). usecols
+    (0-based positions) reads only those columns: a cached full sheet is cut
+    down to them, a projected parse is not cached. nrows reads only the first
+    data rows (import previews) and never touches the cache. dtypes
+    ({column: type}) is the import schema in use; such reads bypass the cache too.
+    """
+    path = workbook_path(source) if cache is not None and not csv_dtypes and not dtypes and nrows is None else None
+    if path is not None:
+        df = cache.get_sheet(path, sheet_name, header)
+        if df is not None:
+            if usecols is not None:
+                df = df.iloc[:, [position for position in sorted(set(usecols)) if position < df.shape[1]]]
+            return df
+    df = _parse_one(source, sheet_name, header, streaming, progress, cancel, engine, csv_dtypes, usecols, nrows, dtypes)
+    if path is not None and usecols is None:
+        cache.put_sheet(path, sheet_name, header, df)
+    return df
+
+
+def workbook_path(source):
+    """File path behind a path or an open workbook handle (None if unknown)"""
+    path = source.io if isinstance(source, (pd.ExcelFile, SharedWorkbook)) else source
+    return os.fspath(path) if isinstance(path, (str, os.PathLike)) else None
+
+
+def worker_count(setting):
+    """Resolve the parallel_workers setting (None = one per CPU, 0/1 = serial)"""
+    if setting is None:
+        return os.cpu_count() or 1
+    return max(int(setting), 1)
+
+
+def read_header_band(source, sheet_name=0, cache=None, rows=HEADER_BAND_ROWS, engine='openpyxl'):
+    """First rows of a sheet as raw cells (no header), kept for in-memory header changes"""
+    path = workbook_path(source) if cache is not None else None
+    key = ('band', rows)
+    if path is not None:
+        band = cache.get_sheet(path, sheet_name, key)
+        if band is not None:
+            return band
+    band = None
+    source_path = workbook_path(source)
+    if source_path is not None and csv_io.is_csv(source_path):
+        band = csv_io.read_header_band(source_path, rows=rows)
+    elif engine == 'native' and source_path is not None and source_path.endswith('.xlsx'):
+        band = _read_native(source_path, sheet_name, None, nrows=rows)
+    if band is None:
+        with opened(source) as workbook:
+            band = workbook.parse(sheet_name=sheet_name, header=None, nrows=rows)
+    if path is not None:
+        cache.put_sheet(path, sheet_name, key, band)
+    return band
+
+
+def read_header_bands(source, names, cache=None, engine='openpyxl'):
+    """Header bands for several sheets; a sheet whose band cannot be read maps to None"""
+    bands = {}
+    for name in names:
+        try:
+            bands[name] = read_header_band(source, name, cache=cache, engine=engine)
+        except Exception:
+            bands[name] = None
+    return bands
+
+
+def sheet_header(header, name):
+    """Header row for one sheet from a single row or a {name: row} mapping"""
+    return header.get(name, 0) if isinstance(header, dict) else header
+
+
+def read_sheets(source, names, header=0, workers=1, cache=None, streaming=False, progress=None, cancel=None,
+                engine='openpyxl', dtypes=None):
+    """Parse several sheets from one open workbook
+
+    Returns (sheets, errors): sheets maps name -> DataFrame in workbook order and
+    errors maps name -> exception for sheets that failed, so one broken sheet
+    does not prevent the others from loading. With workers > 1 and enough
+    sheets, the sheets are parsed in parallel worker processes. Sheets found in
+    cache are not parsed at all. Streaming imports are always parsed serially
+    to keep peak memory low; ImportCancelled is not isolated per sheet.
+    header is one row for every sheet or a {name: row} dict (e.g. detected
+    header rows). dtypes declares column types as in read_sheet() (no cache then).
+    """
+    path = workbook_path(source)
+    cached = {}
+    if dtypes:
+        cache = None
+    if cache is not None and path is not None:
+        for name in names:
+            df = cache.get_sheet(path, name, sheet_header(header, name))
+            if df is not None:
+                cached[name] = df
+    missing = [name for name in names if name not in cached]
+
+    if streaming:
+        workers = 1
+    parsed, errors = _parse_sheets(source, path, missing, header, workers, streaming, progress, cancel, engine,
+                                   dtypes) if missing else ({}, {})
+    if cache is not None and path is not None:
+        for name, df in parsed.items():
+            cache.put_sheet(path, name, sheet_header(header, name), df)
+
+    sheets = {name: cached[name] if name in cached else parsed[name] for name in names if name not in errors}
+    return sheets, errors
+
+
+def _parse_sheets(source, path, names, header, workers, streaming=False, progress=None, cancel=None, engine='openpyxl',
+                  dtypes=None):
+    """Parse sheets serially on the shared handle or in parallel worker processes"""
+    if workers > 1 and path is not None and len(names) >= PARALLEL_MIN_SHEETS:
+        try:
+            return read_sheets_parallel(path, names, header, workers, engine, dtypes)
+        except (BrokenProcessPool, OSError):
+            pass  # Could not start worker processes - parse serially instead
+    sheets, errors = {}, {}
+    with opened(source) as workbook:
+        for name in names:
+            if cancel is not None and cancel.is_set():
+                raise ImportCancelled()
+            try:
+                sheets[name] = _parse_one(workbook, name, sheet_header(header, name), streaming, progress, cancel, engine,
+                                          dtypes=dtypes)
+            except ImportCancelled:
+                raise
+            except Exception as sheet_error:
+                errors[name] = sheet_error
+    return sheets, errors
+
+
+def _parse_sheet_payload(file_path, sheet_name, header, engine='openpyxl', dtypes=None):
+    """Worker process entry point: parse one sheet and return a columnar payload"""
+    df = None
+    if engine == 'native' and file_path.endswith('.xlsx'):
+        df = _read_native(file_path, sheet_name, header, dtypes=dtypes)
+    if df is None:
+        df = pd.read_excel(file_path, sheet_name=sheet_name, engine=excel_engine(file_path), header=header)
+        df = schema_types.apply_schema(df, dtypes)
+    return pack_frame(df)
+
+
+def read_sheets_parallel(file_path, names, header=0, workers=None, engine='openpyxl', dtypes=None):
+    """Parse each sheet in a separate worker process
+
+    Same (sheets, errors) result as read_sheets(). Workers are spawned rather
+    than forked so they never inherit the Tk interpreter of the editor.
+    """
+    workers = min(worker_count(workers), len(names))
+    context = multiprocessing.get_context('spawn')
+    sheets, errors = {}, {}
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = {name: pool.submit(_parse_sheet_payload, file_path, name, sheet_header(header, name), engine, dtypes)
+                   for name in names}
+        # Collect in the order requested so sheets keep their workbook order
+        for name in names:
+            try:
+                sheets[name] = unpack_frame(futures[name].result())
+            except BrokenProcessPool:
+                raise
+            except Exception as sheet_error:
+                errors[name] = sheet_error
+    return sheets, errors
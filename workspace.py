@@ -0,0 +1,361 @@
+"""
+Workspace Module
+Handles .schedproj project workspaces for the XLS Editor
+
+A workspace keeps a whole editing session in one binary file: every sheet as
+typed column arrays plus the editor state around it - formula field
+definitions, active filters, visible columns, sort and grouping settings,
+header rows and the workbook the session came from.
+
+Column data is written as raw, 64-byte aligned blocks: numeric, boolean and
+datetime arrays as-is, nullable columns as values plus mask, categoricals and
+text as integer codes (the distinct strings are stored once). Everything that
+is not a raw array - distinct strings, the manifest describing the blocks, the
+editor state - is a data_codec record (JSON plus raw arrays), so opening a
+workspace never runs code from the file. The manifest is written last and
+located through a fixed trailer.
+Opening a workspace maps the file with a copy-on-write numpy.memmap, so column
+arrays are views of the file that are only paged in when touched and edits
+never write back. Only the sheet on screen is decoded at open; the others are
+decoded on first access through LazySheets.
+"""
+
+import copy
+import gc
+import os
+import struct
+import tempfile
+from tkinter import filedialog, messagebox
+
+import numpy as np
+import pandas as pd
+
+from column_store import view, encode_text, decode_text
+from data_codec import encode, decode
+from lazy_sheets import LazySheets
+
+
+WORKSPACE_EXTENSION = '.schedproj'
+WORKSPACE_MAGIC = b'XLSEWS02'
+WORKSPACE_FORMAT = 2
+ALIGNMENT = 64
+TRAILER = struct.Struct('<QQ8s')  # Manifest offset, manifest length, magic
+MASKED_ARRAYS = {'integer': pd.arrays.IntegerArray, 'floating': pd.arrays.FloatingArray,
+                 'boolean': pd.arrays.BooleanArray}
+
+
+def is_workspace(file_path):
+    return os.fspath(file_path).lower().endswith(WORKSPACE_EXTENSION)
+
+
+def _masked_kind(values):
+    for kind, array_type in MASKED_ARRAYS.items():
+        if isinstance(values, array_type):
+            return kind
+    return None
+
+
+class _BlockWriter:
+    """Appends aligned data blocks to the workspace file and returns their locations"""
+
+    def __init__(self, f):
+        self.f = f
+
+    def _write(self, data):
+        padding = -self.f.tell() % ALIGNMENT
+        if padding:
+            self.f.write(b'\0' * padding)
+        offset = self.f.tell()
+        self.f.write(data)
+        return offset
+
+    def array(self, values):
+        values = np.ascontiguousarray(values)
+        return ('array', self._write(values.view(np.uint8)), values.nbytes, values.dtype.str)
+
+    def obj(self, value):
+        data = b''.join(encode(value))
+        return ('data', self._write(data), len(data))
+
+
+def encode_column(series, blocks):
+    """Write one column's blocks and return its manifest entry"""
+    dtype = series.dtype
+    values = series.array
+    if isinstance(dtype, np.dtype) and dtype.kind in 'biufcmM':
+        return {'kind': 'array', 'values': blocks.array(series.to_numpy())}
+    masked = _masked_kind(values)
+    if masked is not None:
+        data, mask = values._data, values._mask  # The two buffers behind pandas nullable arrays
+        return {'kind': 'masked', 'type': masked, 'values': blocks.array(data), 'mask': blocks.array(mask)}
+    if isinstance(dtype, pd.CategoricalDtype):
+        return {'kind': 'category', 'codes': blocks.array(values.codes),
+                'categories': blocks.obj(dtype.categories), 'ordered': dtype.ordered}
+    text = encode_text(series)
+    if text is not None:
+        codes, uniques = text
+        return {'kind': 'text', 'dtype': str(dtype), 'codes': blocks.array(codes), 'uniques': blocks.obj(uniques)}
+    return {'kind': 'object', 'values': blocks.obj(series.to_numpy(dtype=object))}
+
+
+def encode_frame(df, blocks):
+    return {'columns': list(df.columns), 'length': len(df),
+            'entries': [encode_column(df.iloc[:, position], blocks) for position in range(df.shape[1])]}
+
+
+def write_workspace(file_path, sheets, state):
+    """Write (sheet name, DataFrame) pairs and the editor state to a workspace file
+
+    sheets may be a generator. extra frames (e.g. the current sheet's full
+    frame behind hidden columns) go in state['frames'] as {key: DataFrame}.
+    The file is written next to the target and moved into place when complete.
+    """
+    folder = os.path.dirname(os.path.abspath(file_path))
+    handle, temp_path = tempfile.mkstemp(prefix='.~', suffix=WORKSPACE_EXTENSION, dir=folder)
+    os.close(handle)
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(WORKSPACE_MAGIC)
+            blocks = _BlockWriter(f)
+            encoded = [(name, encode_frame(df, blocks)) for name, df in sheets]
+            frames = {key: encode_frame(df, blocks) for key, df in state.pop('frames', {}).items()}
+            manifest = b''.join(encode({'format': WORKSPACE_FORMAT, 'sheets': encoded, 'frames': frames, 'state': state}))
+            offset = f.tell()
+            f.write(manifest)
+            f.write(TRAILER.pack(offset, len(manifest), WORKSPACE_MAGIC))
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class WorkspaceFile:
+    """An open workspace: the manifest plus one copy-on-write memmap of the whole file"""
+
+    def __init__(self, file_path):
+        self.path = file_path
+        self.data = np.memmap(file_path, dtype=np.uint8, mode='c')
+        if len(self.data) < len(WORKSPACE_MAGIC) + TRAILER.size or bytes(self.data[:len(WORKSPACE_MAGIC)]) != WORKSPACE_MAGIC:
+            raise ValueError("Not a schedule workspace file")
+        offset, length, magic = TRAILER.unpack(bytes(self.data[-TRAILER.size:]))
+        if magic != WORKSPACE_MAGIC:
+            raise ValueError("The workspace file is incomplete")
+        manifest = decode(self.data[offset:offset + length])
+        if manifest.get('format') != WORKSPACE_FORMAT:
+            raise ValueError("Unsupported workspace format")
+        self.sheets = dict(manifest['sheets'])
+        self.sheet_names = [name for name, _ in manifest['sheets']]
+        self.frames = manifest['frames']
+        self.state = manifest['state']
+
+    def _block(self, location):
+        if location[0] == 'array':
+            _, offset, size, dtype = location
+            return self.data[offset:offset + size].view(dtype=np.dtype(dtype), type=np.ndarray)
+        _, offset, size = location
+        return decode(self.data[offset:offset + size])
+
+    def decode_column(self, entry):
+        kind = entry['kind']
+        if kind == 'array':
+            return self._block(entry['values'])
+        if kind == 'masked':
+            return MASKED_ARRAYS[entry['type']](self._block(entry['values']), self._block(entry['mask']))
+        if kind == 'category':
+            dtype = pd.CategoricalDtype(self._block(entry['categories']), ordered=entry['ordered'])
+            return pd.Categorical.from_codes(self._block(entry['codes']), dtype=dtype, validate=False)
+        if kind == 'text':
+            return decode_text(self._block(entry['codes']), self._block(entry['uniques']), entry['dtype'])
+        return self._block(entry['values'])
+
+    def decode_frame(self, encoded):
+        arrays = {position: self.decode_column(entry) for position, entry in enumerate(encoded['entries'])}
+        df = pd.DataFrame(arrays, index=pd.RangeIndex(encoded['length']), copy=False)
+        df.columns = pd.Index(encoded['columns'])
+        return df
+
+    def sheet(self, name):
+        return self.decode_frame(self.sheets[name])
+
+    def columns(self, name):
+        return list(self.sheets[name]['columns'])
+
+
+class Workspace:
+    def __init__(self, editor_instance):
+        self.editor = editor_instance
+        self.file_path = None  # Workspace the session was last opened from or saved to
+
+    def filetypes(self):
+        return [(self.editor.tr("Schedule workspace"), f"*{WORKSPACE_EXTENSION}"), (self.editor.tr("All files"), "*.*")]
+
+    # Saving
+    def save_workspace(self):
+        """Save the whole session (sheets and editor state) as a workspace file"""
+        editor = self.editor
+        if editor.df is None:
+            messagebox.showwarning(editor.tr("Warning"), editor.tr("No file is currently loaded."))
+            return
+        initial = os.path.splitext(os.path.basename(self.file_path or editor.current_file or ''))[0]
+        file_path = filedialog.asksaveasfilename(title=editor.tr("Save Workspace"), defaultextension=WORKSPACE_EXTENSION,
+                                                 initialfile=initial, filetypes=self.filetypes())
+        if not file_path:
+            return
+        try:
+            self.write(file_path)
+        except Exception as e:
+            messagebox.showerror(editor.tr("Error"), f"{editor.tr('Failed to save workspace')}:\n{str(e)}")
+            return
+        self.file_path = file_path
+        editor.status_var.set(f"{editor.tr('Workspace saved')}: {os.path.basename(file_path)}")
+
+    def write(self, file_path):
+        """Write the session to file_path"""
+        editor = self.editor
+        sheet_ops = editor.sheet_ops
+        if self.file_path and os.path.abspath(file_path) == os.path.abspath(self.file_path):
+            # The open workspace is mapped: move its sheets into memory before the file is replaced
+            self._detach()
+        store = sheet_ops.available_sheets
+        if store:
+            sheets = ((name, sheet_ops.frame_for_save(name)) for name in list(store))
+        else:
+            sheets = [(None, editor.df)]
+        frames = {}
+        if editor.original_df is not None and list(editor.original_df.columns) != list(editor.df.columns):
+            frames['original'] = editor.original_df  # Full frame behind the visible columns
+        source = editor.current_file
+        try:
+            stat = os.stat(source) if source else None
+        except OSError:
+            stat = None
+        state = {
+            'frames': frames,
+            'current_file': source,
+            'source_identity': (stat.st_size, stat.st_mtime_ns) if stat else None,
+            'sheet_names': list(store) or None,
+            'current_sheet': sheet_ops.current_sheet,
+            'header_row': editor.header_row,
+            'header_rows': dict(sheet_ops.header_rows),
+            'header_bands': dict(sheet_ops.header_bands),
+            'formula_fields': copy.deepcopy(editor.formula_fields),
+            'active_filters': copy.deepcopy(editor.active_filters),
+            'visible_columns': list(editor.visible_columns),
+            'sort_settings': copy.deepcopy(editor.sort_settings),
+            'group_settings': copy.deepcopy(editor.group_settings),
+            'modified': editor.modified,
+            'dirty_sheets': sorted(sheet_ops.dirty_sheets, key=str),
+            'projected': copy.deepcopy(sheet_ops.projected),
+        }
+        write_workspace(file_path, sheets, state)
+
+    def _detach(self):
+        """Copy every sheet of the mapped workspace into memory and drop the mapping
+
+        Nothing may keep a view of the file: Windows refuses to replace a file
+        that is still mapped.
+        """
+        editor = self.editor
+        sheet_ops = editor.sheet_ops
+        store = sheet_ops.available_sheets
+        if isinstance(store, LazySheets):
+            # A plain store of copies replaces the lazy one, whose loader decodes from the mapping
+            frames = {name: None if name == sheet_ops.current_sheet else store[name].copy(deep=True) for name in list(store)}
+            projected = sheet_ops.projected
+            sheet_ops.replace_sheets(frames)
+            sheet_ops.projected = projected
+        for attr in ('df', 'original_df'):
+            frame = getattr(editor, attr)
+            if frame is not None:
+                setattr(editor, attr, frame.copy(deep=True))
+        editor.sync_current_sheet_data()
+        editor.undo_manager.copy_values()
+        editor.filtered_df = None
+        if editor.active_filters:
+            editor.filter_ops.apply_filters()
+        else:
+            editor.data_ops.populate_treeview()
+        gc.collect()  # Views held only through reference cycles
+
+    # Opening
+    def open_workspace(self, file_path=None):
+        """Open a workspace file (asks for one when no path is given)"""
+        editor = self.editor
+        if file_path is None:
+            file_path = filedialog.askopenfilename(title=editor.tr("Open Workspace"), filetypes=self.filetypes())
+            if not file_path:
+                return
+
+        def parse(progress, cancel):
+            # Worker thread: map the file and decode the sheet on screen
+            workspace = WorkspaceFile(file_path)
+            state = workspace.state
+            names = workspace.sheet_names
+            current = state['current_sheet'] if state['current_sheet'] in workspace.sheets else names[0]
+            frames = {key: workspace.decode_frame(encoded) for key, encoded in workspace.frames.items()}
+            return workspace, current, workspace.sheet(current), frames
+
+        def apply(result):
+            self.install(file_path, *result)
+
+        editor.file_ops.run_import(file_path, parse, apply, editor.tr('Failed to open workspace'))
+
+    def install(self, file_path, workspace, current, current_frame, frames):
+        """Make an opened workspace the editor's session (Tk thread)"""
+        editor = self.editor
+        sheet_ops = editor.sheet_ops
+        state = workspace.state
+        editor.journal.detach()
+
+        if state['sheet_names'] is None:
+            sheet_ops.reset_single_sheet(state['header_row'], None)
+        else:
+            sheet_ops.replace_sheets(LazySheets(workspace.sheet_names, workspace.sheet, workspace.columns,
+                                                {current: current_frame}))
+            sheet_ops.current_sheet = current
+        sheet_ops.header_rows = dict(state['header_rows'])
+        # Bands are small: copied, so only sheets keep the mapping alive
+        sheet_ops.header_bands = {name: None if band is None else band.copy(deep=True)
+                                  for name, band in state['header_bands'].items()}
+        sheet_ops.projected = copy.deepcopy(state.get('projected', {}))
+
+        editor.header_row = sheet_ops.header_rows.get(sheet_ops.current_sheet, state['header_row'])
+        editor.df = current_frame
+        editor.original_df = frames.get('original', view(current_frame))
+        editor.visible_columns = [column for column in state['visible_columns'] if column in editor.df.columns] \
+            or list(editor.df.columns)
+        editor.formula_fields = state['formula_fields']
+        editor.sort_settings = state['sort_settings']
+        editor.group_settings = state['group_settings']
+        editor.undo_manager.clear()
+        editor.current_file = state['current_file']
+
+        # Clean sheets can still be copied from the source workbook if it did not change since
+        source = state['current_file']
+        try:
+            stat = os.stat(source) if source else None
+        except OSError:
+            stat = None
+        if stat is not None and state['source_identity'] == (stat.st_size, stat.st_mtime_ns):
+            sheet_ops.remember_source(source)
+        else:
+            sheet_ops.source_file = None
+        sheet_ops.dirty_sheets = set(state['dirty_sheets'])
+        editor.modified = state['modified']
+        self.file_path = file_path
+
+        editor.filtered_df = None
+        editor.active_filters = state['active_filters']
+        editor.file_ops.update_file_info()
+        editor.filter_ops.update_filter_display()
+        editor.update_header_display()
+        if state['sheet_names'] is not None:
+            sheet_ops.add_sheet_switcher()
+        if editor.active_filters:
+            editor.filter_ops.apply_filters()
+        else:
+            editor.data_ops.populate_treeview()
+        editor.status_var.set(f"{editor.tr('Workspace opened')}: {os.path.basename(file_path)}")
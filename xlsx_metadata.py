@@ -0,0 +1,177 @@
+"""
+XLSX Metadata Module
+Handles fast sheet listing and sheet dimensions for the XLS Editor
+
+Reads xl/workbook.xml, its relationships and the <dimension> element at the
+top of every worksheet part straight from the xlsx zip with streaming XML
+parsing - no openpyxl workbook is built and no cell data is read, so listing
+even very large workbooks is practically instant.
+"""
+
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+
+# Rough openpyxl parse throughput (uncompressed worksheet XML) used for load estimates
+PARSE_BYTES_PER_SECOND = 3 * 1024 * 1024
+
+# Largest row count an xlsx worksheet can hold
+MAX_ROWS = 1048576
+
+DIMENSION_PATTERN = re.compile(r'^\$?([A-Z]+)\$?(\d+)(?::\$?([A-Z]+)\$?(\d+))?$')
+
+
+def _local(tag):
+    """Tag or attribute name without its XML namespace (works for transitional and strict files)"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _relationship_id(element):
+    for key, value in element.attrib.items():
+        if _local(key) == 'id' and key != 'id':
+            return value
+    return None
+
+
+def rels_path(part):
+    """Relationships part of a part ('xl/workbook.xml' -> 'xl/_rels/workbook.xml.rels')"""
+    folder, name = posixpath.split(part)
+    return posixpath.join(folder, '_rels', name + '.rels')
+
+
+def relationships(archive, part):
+    """(id, type, target part path) of every relationship of a part"""
+    found = []
+    try:
+        with archive.open(rels_path(part)) as stream:
+            for _, element in ET.iterparse(stream):
+                if _local(element.tag) == 'Relationship':
+                    target = element.get('Target', '')
+                    if target.startswith('/'):
+                        target = target[1:]
+                    else:
+                        target = posixpath.normpath(posixpath.join(posixpath.dirname(part), target))
+                    found.append((element.get('Id'), element.get('Type', ''), target))
+    except KeyError:
+        pass
+    return found
+
+
+def related_part(archive, part, kind):
+    """Target of the first relationship of a type such as 'sharedStrings' or 'styles' (None if absent)"""
+    for _, relationship_type, target in relationships(archive, part):
+        if relationship_type.rsplit('/', 1)[-1] == kind:
+            return target
+    return None
+
+
+def workbook_part(archive):
+    """Path of the workbook part (normally xl/workbook.xml)"""
+    return related_part(archive, '', 'officeDocument') or 'xl/workbook.xml'
+
+
+def column_number(letters):
+    """'A' -> 1, 'R' -> 18, 'AA' -> 27"""
+    number = 0
+    for letter in letters:
+        number = number * 26 + ord(letter) - ord('A') + 1
+    return number
+
+
+def column_letter(number):
+    """1 -> 'A', 18 -> 'R', 27 -> 'AA'"""
+    letters = ''
+    while number:
+        number, remainder = divmod(number - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def parse_dimension(ref):
+    """(rows, columns) spanned by a dimension ref such as 'A1:R808' (None if unreadable)"""
+    match = DIMENSION_PATTERN.match((ref or '').strip().upper())
+    if not match:
+        return None
+    first_col, first_row, last_col, last_row = match.groups()
+    last_col, last_row = last_col or first_col, last_row or first_row
+    return int(last_row) - int(first_row) + 1, column_number(last_col) - column_number(first_col) + 1
+
+
+def sheet_dimension(archive, part):
+    """Read the <dimension> element, stopping as soon as sheet data starts"""
+    try:
+        with archive.open(part) as stream:
+            for _, element in ET.iterparse(stream, events=('start',)):
+                name = _local(element.tag)
+                if name == 'dimension':
+                    return parse_dimension(element.get('ref'))
+                if name == 'sheetData':
+                    return None
+    except (KeyError, ET.ParseError):
+        return None
+    return None
+
+
+def list_sheets(archive, dimensions=True):
+    """Sheet info dicts (see read_sheet_info) for an open xlsx zip archive"""
+    workbook = workbook_part(archive)
+    targets = {rid: target for rid, _, target in relationships(archive, workbook)}
+    sheets = []
+    with archive.open(workbook) as stream:
+        for _, element in ET.iterparse(stream):
+            if _local(element.tag) != 'sheet':
+                continue
+            part = targets.get(_relationship_id(element))
+            sheets.append({
+                'name': element.get('name'),
+                'part': part,
+                'state': element.get('state', 'visible'),
+                'rows': None,
+                'columns': None,
+                'xml_bytes': None,
+            })
+    names = set(archive.namelist())
+    for sheet in sheets:
+        if sheet['part'] in names:
+            sheet['xml_bytes'] = archive.getinfo(sheet['part']).file_size
+            if dimensions:
+                size = sheet_dimension(archive, sheet['part'])
+                if size is not None:
+                    sheet['rows'], sheet['columns'] = size
+    return sheets
+
+
+def read_sheet_info(file_path, dimensions=True):
+    """Sheets of an xlsx workbook in workbook order
+
+    Each entry is a dict with name, part, state ('visible', 'hidden', ...),
+    rows and columns (from <dimension>, None when the writer did not store
+    one) and xml_bytes (uncompressed size of the sheet part).
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        return list_sheets(archive, dimensions)
+
+
+def sheet_names(file_path):
+    """Sheet names of an xlsx workbook without building an openpyxl workbook"""
+    return [sheet['name'] for sheet in read_sheet_info(file_path, dimensions=False)]
+
+
+def estimate_load_seconds(sheet):
+    """Rough time to parse a sheet with pandas/openpyxl"""
+    if not sheet.get('xml_bytes'):
+        return None
+    return sheet['xml_bytes'] / PARSE_BYTES_PER_SECOND
+
+
+def describe_size(sheet):
+    """'807 rows × 18 columns, ~0.1 s' style summary for the sheet selection dialog"""
+    parts = []
+    if sheet.get('rows') is not None:
+        parts.append(f"{max(sheet['rows'] - 1, 0):,} rows × {sheet['columns']} columns")
+    seconds = estimate_load_seconds(sheet)
+    if seconds is not None:
+        parts.append(f"~{seconds:.1f} s" if seconds >= 0.1 else "<0.1 s")
+    return ", ".join(parts)
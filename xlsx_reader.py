@@ -0,0 +1,275 @@
+"""
+XLSX Reader Module
+Handles the native xlsx reader engine for the XLS Editor
+
+Even in read-only mode openpyxl creates Python cell objects for every cell,
+which dominates import time. This engine reads the xlsx zip directly: the
+shared string table is decoded once into a list, the cell styles are scanned
+once for date formats, and the worksheet XML is streamed with iterparse. Each
+row is converted into plain values that go straight into the typed column
+builders of streaming_reader.build_frame(), and parsed elements are cleared as
+the parser moves on so memory stays flat.
+
+Only the subset of SpreadsheetML that Revit schedule exports (and Excel saves
+of them) use is handled. Anything else raises UnsupportedWorkbook and
+workbook_reader falls back to openpyxl.
+"""
+
+import zipfile
+import xml.etree.ElementTree as ET
+from itertools import islice
+
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+from openpyxl.utils.datetime import from_excel, from_ISO8601, CALENDAR_WINDOWS_1900, CALENDAR_MAC_1904
+
+import xlsx_metadata
+from streaming_reader import build_frame
+
+
+MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+
+_SHEET_DATA = f'{{{MAIN_NS}}}sheetData'
+_ROW = f'{{{MAIN_NS}}}row'
+_VALUE = f'{{{MAIN_NS}}}v'
+_INLINE = f'{{{MAIN_NS}}}is'
+_TEXT = f'{{{MAIN_NS}}}t'
+_RUN = f'{{{MAIN_NS}}}r'
+_STRING_ITEM = f'{{{MAIN_NS}}}si'
+_NUM_FMT = f'{{{MAIN_NS}}}numFmt'
+_CELL_XFS = f'{{{MAIN_NS}}}cellXfs'
+_XF = f'{{{MAIN_NS}}}xf'
+_WORKBOOK_PR = f'{{{MAIN_NS}}}workbookPr'
+
+
+# Placeholder for a non-blank cell outside the requested columns
+SKIPPED = object()
+
+
+class UnsupportedWorkbook(Exception):
+    """The workbook uses xlsx features the native reader does not handle (openpyxl is used instead)"""
+
+
+def _text(element):
+    """Plain text of an <si>/<is> element: rich text runs are joined, phonetic runs skipped"""
+    parts = []
+    for child in element:
+        if child.tag == _TEXT:
+            parts.append(child.text or '')
+        elif child.tag == _RUN:
+            run_text = child.find(_TEXT)
+            if run_text is not None:
+                parts.append(run_text.text or '')
+    return ''.join(parts)
+
+
+def read_shared_strings(archive, part):
+    """The shared string table as a list (decoded once per workbook)"""
+    strings = []
+    if part is None or part not in archive.NameToInfo:
+        return strings
+    with archive.open(part) as stream:
+        for _, element in ET.iterparse(stream):
+            if element.tag == _STRING_ITEM:
+                strings.append(_text(element).replace('x005F_', ''))
+                element.clear()
+    return strings
+
+
+def read_date_styles(archive, part):
+    """(date style ids, timedelta style ids) of the cell formats, classified like openpyxl"""
+    if part is None or part not in archive.NameToInfo:
+        return set(), set()
+    custom, formats = {}, []
+    in_cell_xfs = False
+    with archive.open(part) as stream:
+        for event, element in ET.iterparse(stream, events=('start', 'end')):
+            tag = element.tag
+            if tag == _CELL_XFS:
+                in_cell_xfs = event == 'start'
+            elif event == 'start' and tag == _XF and in_cell_xfs:
+                formats.append(int(element.get('numFmtId', 0)))
+            elif event == 'start' and tag == _NUM_FMT:
+                custom[int(element.get('numFmtId'))] = element.get('formatCode')
+    date_styles, timedelta_styles = set(), set()
+    for style_id, format_id in enumerate(formats):
+        code = custom.get(format_id, BUILTIN_FORMATS.get(format_id))
+        if is_date_format(code):
+            date_styles.add(style_id)
+        if is_timedelta_format(code):
+            timedelta_styles.add(style_id)
+    return date_styles, timedelta_styles
+
+
+def read_epoch(archive, part):
+    """Date system of the workbook (1900 or 1904 based serial numbers)"""
+    with archive.open(part) as stream:
+        for _, element in ET.iterparse(stream, events=('start',)):
+            if element.tag == _WORKBOOK_PR:
+                if element.get('date1904', '').lower() in ('1', 'true'):
+                    return CALENDAR_MAC_1904
+                break
+    return CALENDAR_WINDOWS_1900
+
+
+def _column_index(reference, cache):
+    """0-based column of a cell reference such as 'AB12'"""
+    letters = reference.rstrip('0123456789')
+    index = cache.get(letters)
+    if index is None:
+        index = cache[letters] = xlsx_metadata.column_number(letters) - 1
+    return index
+
+
+def _row_values(row, shared_strings, date_styles, timedelta_styles, epoch, columns, wanted=None):
+    """Cell values of one parsed <row> element
+
+    Cells outside wanted (a set of positions) are not converted: they only
+    become SKIPPED or None, so row extent and blank rows still come out right.
+    Cells without a value (formatted but empty) are skipped, so they never
+    widen the row.
+    """
+    values = []
+    position = 0
+    for cell in row:
+        reference = cell.get('r')
+        if reference:
+            position = _column_index(reference, columns)
+        if not len(cell):
+            position += 1
+            continue
+        if position > len(values):
+            values.extend([None] * (position - len(values)))
+        position += 1
+        kind = cell.get('t', 'n')
+        if wanted is not None and len(values) not in wanted and kind != 'inlineStr':
+            value = cell.findtext(_VALUE)
+            if not value or kind == 'e' or (kind == 's' and not shared_strings[int(value)]):
+                value = None
+            else:
+                value = SKIPPED
+        elif kind == 'inlineStr':
+            inline = cell.find(_INLINE)
+            value = _text(inline) if inline is not None else None
+        else:
+            value = cell.findtext(_VALUE) or None
+            if value is None:
+                pass
+            elif kind == 'n':
+                value = float(value) if ('.' in value or 'E' in value or 'e' in value) else int(value)
+                style = cell.get('s')
+                if style and date_styles and int(style) in date_styles:
+                    try:
+                        value = from_excel(value, epoch, timedelta=int(style) in timedelta_styles)
+                    except (OverflowError, ValueError):
+                        value = None  # openpyxl turns these into errors, which pandas reads as NaN
+            elif kind == 's':
+                value = shared_strings[int(value)]
+            elif kind == 'str':
+                pass
+            elif kind == 'b':
+                value = bool(int(value))
+            elif kind == 'e':
+                value = None
+            elif kind == 'd':
+                value = from_ISO8601(value)
+            else:
+                raise UnsupportedWorkbook(f"Unsupported cell type: {kind}")
+        values.append(value)
+    return values
+
+
+def iter_rows(archive, part, shared_strings, date_styles=(), timedelta_styles=(), epoch=CALENDAR_WINDOWS_1900,
+              wanted=None, full_rows=0):
+    """Yield the rows of a worksheet as lists of cell values (gaps become empty rows)
+
+    Values are converted the way pandas' openpyxl reader sees them: numbers,
+    strings, booleans, datetimes for date-formatted cells and None for blanks
+    and error cells. Only start events are requested; a row is converted when
+    the next one opens (it is complete by then) and then dropped from the tree.
+    Below the first full_rows rows, only the cells of wanted (a set of
+    positions) are converted, see _row_values().
+    """
+    columns = {}
+    expected = 1
+
+    def flush(row):
+        nonlocal expected
+        number = row.get('r')
+        number = int(number) if number else expected
+        while expected < number:
+            yield ()
+            expected += 1
+        yield _row_values(row, shared_strings, date_styles, timedelta_styles, epoch, columns,
+                          wanted if number > full_rows else None)
+        expected = number + 1
+
+    with archive.open(part) as stream:
+        events = ET.iterparse(stream, events=('start',))
+        _, root = next(events)
+        if not root.tag.startswith(f'{{{MAIN_NS}}}'):
+            raise UnsupportedWorkbook(f"Unsupported worksheet format: {root.tag}")
+        sheet_data = None
+        pending = None
+        for _, element in events:
+            tag = element.tag
+            if tag == _ROW:
+                if pending is not None:
+                    yield from flush(pending)
+                    # Detach finished rows so the tree never grows with the sheet
+                    sheet_data.clear()
+                pending = element
+            elif tag == _SHEET_DATA:
+                sheet_data = element
+        if pending is not None:
+            yield from flush(pending)
+
+
+def read_sheet(file_path, sheet_name=0, header=0, nrows=None, progress=None, cancel=None, usecols=None, dtypes=None):
+    """Read one sheet into a DataFrame (same result as pd.read_excel)
+
+    sheet_name is a name or a 0-based position. nrows limits the number of
+    data rows read. progress and cancel work as in streaming_reader.stream_sheet().
+    usecols (0-based positions) reads only those columns; the header row is
+    always converted in full so column labels match a full read. dtypes
+    declares column types (schema_types), see streaming_reader.build_frame().
+    """
+    try:
+        archive = zipfile.ZipFile(file_path)
+    except zipfile.BadZipFile as error:
+        raise UnsupportedWorkbook(str(error))
+    with archive:
+        try:
+            sheets = xlsx_metadata.list_sheets(archive, dimensions=False)
+            workbook = xlsx_metadata.workbook_part(archive)
+            shared_strings = read_shared_strings(archive, xlsx_metadata.related_part(archive, workbook, 'sharedStrings'))
+            date_styles, timedelta_styles = read_date_styles(archive, xlsx_metadata.related_part(archive, workbook, 'styles'))
+            epoch = read_epoch(archive, workbook)
+        except (KeyError, ET.ParseError) as error:
+            raise UnsupportedWorkbook(str(error))
+
+        if isinstance(sheet_name, int):
+            if not 0 <= sheet_name < len(sheets):
+                raise ValueError(f"Worksheet index {sheet_name} is invalid, {len(sheets)} worksheets found")
+            sheet = sheets[sheet_name]
+        else:
+            sheet = next((sheet for sheet in sheets if sheet['name'] == sheet_name), None)
+            if sheet is None:
+                raise ValueError(f"Worksheet named '{sheet_name}' not found")
+        if sheet['part'] not in archive.NameToInfo:
+            raise UnsupportedWorkbook(f"Worksheet part missing for '{sheet['name']}'")
+
+        size = xlsx_metadata.sheet_dimension(archive, sheet['part'])
+        wanted = None if usecols is None else set(usecols)
+        rows = iter_rows(archive, sheet['part'], shared_strings, date_styles, timedelta_styles, epoch,
+                         wanted, full_rows=header + 1 if header is not None else 0)
+        try:
+            limited = rows
+            if nrows is not None:
+                limited = islice(rows, nrows + (header + 1 if header is not None else 0))
+            return build_frame(limited, header=header, progress=progress, cancel=cancel,
+                               total_rows=size[0] if size else None, usecols=usecols, dtypes=dtypes,
+                               extent=size if nrows is None else None)
+        except (IndexError, ET.ParseError) as error:
+            raise UnsupportedWorkbook(str(error))
+        finally:
+            rows.close()
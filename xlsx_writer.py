@@ -0,0 +1,508 @@
+"""
+XLSX Writer Module
+Handles streaming xlsx export for the XLS Editor
+
+df.to_excel builds an openpyxl cell object for every value before anything is
+written. Here each sheet is written straight into its zip entry in chunks of
+CHUNK_ROWS rows, with the cell XML built column by column from plain values,
+so peak memory does not grow with the workbook. Strings go into one shared
+string table that is deduplicated across all sheets and written last. The
+workbook is written to a temporary file next to the target and moved into
+place only once it is complete.
+
+update_workbook() saves incrementally: only changed sheets are regenerated,
+every other part of the source xlsx (untouched sheets, their drawings, the
+workbook part) is copied unchanged. The source's shared string table and cell
+styles are kept at their positions so the copied sheets stay valid; new
+strings and this writer's styles are appended after them.
+"""
+
+import os
+import posixpath
+import math
+import re
+import shutil
+import tempfile
+import zipfile
+import datetime
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape, unescape, quoteattr
+
+import numpy as np
+import pandas as pd
+from openpyxl.utils.datetime import to_excel
+
+import xlsx_metadata
+from xlsx_metadata import MAX_ROWS, column_letter
+
+
+# Rows converted to XML at a time
+CHUNK_ROWS = 5000
+
+# Style ids in styles.xml (cellXfs order)
+STYLE_HEADER = 1
+STYLE_DATETIME = 2
+STYLE_DATE = 3
+STYLE_TIME = 4
+STYLE_TIMEDELTA = 5
+STYLES = {'header': STYLE_HEADER, 'datetime': STYLE_DATETIME, 'date': STYLE_DATE,
+          'time': STYLE_TIME, 'timedelta': STYLE_TIMEDELTA}
+
+_ILLEGAL_CHARACTERS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_ESCAPE_LIKE = re.compile(r'_(x[0-9A-Fa-f]{4}_)')
+_STRING_ITEM = re.compile(r'<si>.*?</si>|<si/>', re.S)
+_PLAIN_ITEM = re.compile(r'<si><t(?: xml:space="preserve")?>([^<]*)</t></si>')
+
+_MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_PACKAGE_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+_XML_HEADER = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+# Number formats of the temporal styles (custom numFmt ids are assigned from 164)
+_NUMBER_FORMATS = {'datetime': 'yyyy\\-mm\\-dd\\ h:mm:ss', 'date': 'yyyy\\-mm\\-dd', 'timedelta': '[hh]:mm:ss'}
+_HEADER_FONT = '<font><b/><sz val="11"/><name val="Calibri"/><family val="2"/></font>'
+_HEADER_BORDER = '<border><left style="thin"/><right style="thin"/><top style="thin"/><bottom style="thin"/><diagonal/></border>'
+
+
+def _number_formats(first_id):
+    """{kind: numFmt id} and the <numFmt> entries of the temporal formats"""
+    ids = {kind: first_id + offset for offset, kind in enumerate(_NUMBER_FORMATS)}
+    return ids, [f'<numFmt numFmtId="{ids[kind]}" formatCode={quoteattr(code)}/>' for kind, code in _NUMBER_FORMATS.items()]
+
+
+def _style_entries(font, border, formats):
+    """cellXfs entries of this writer's styles, in STYLES order (header, datetime, date, time, timedelta)"""
+    return [
+        f'<xf numFmtId="0" fontId="{font}" fillId="0" borderId="{border}" xfId="0" '
+        'applyFont="1" applyBorder="1" applyAlignment="1"><alignment horizontal="center" vertical="top"/></xf>',
+        f'<xf numFmtId="{formats["datetime"]}" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>',
+        f'<xf numFmtId="{formats["date"]}" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>',
+        '<xf numFmtId="21" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>',
+        f'<xf numFmtId="{formats["timedelta"]}" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>',
+    ]
+
+
+_FORMAT_IDS, _FORMAT_ENTRIES = _number_formats(164)
+_STYLES_XML = (
+    _XML_HEADER +
+    f'<styleSheet xmlns="{_MAIN_NS}">'
+    f'<numFmts count="{len(_FORMAT_ENTRIES)}">{"".join(_FORMAT_ENTRIES)}</numFmts>'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/><family val="2"/></font>'
+    f'{_HEADER_FONT}</fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="2"><border><left/><right/><top/><bottom/><diagonal/></border>'
+    f'{_HEADER_BORDER}</borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="6">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    f'{"".join(_style_entries(1, 1, _FORMAT_IDS))}'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+
+class SharedStrings:
+    """Shared string table, deduplicated across every sheet of the workbook"""
+
+    def __init__(self, source_items=()):
+        """source_items: raw <si> elements of an existing table, kept at their positions"""
+        self.source_items = list(source_items)
+        self.index = {}
+        self.added = []
+        self.count = 0  # References, as Excel reports them
+        for position, item in enumerate(self.source_items):
+            match = _PLAIN_ITEM.fullmatch(item)
+            # Only plain text items are reused; entities, _xHHHH_ escapes and rich text are left alone
+            if match and '&#' not in match.group(1) and '_x' not in match.group(1):
+                self.index.setdefault(unescape(match.group(1)), position)
+
+    def add(self, text):
+        self.count += 1
+        position = self.index.get(text)
+        if position is None:
+            position = self.index[text] = len(self.source_items) + len(self.added)
+            self.added.append(text)
+        return position
+
+    def xml(self):
+        """The sharedStrings.xml part, yielded piece by piece"""
+        unique = len(self.source_items) + len(self.added)
+        # Copied sheets reference source strings too, so no reference count is claimed then
+        count = '' if self.source_items else f' count="{self.count}"'
+        yield _XML_HEADER + f'<sst xmlns="{_MAIN_NS}"{count} uniqueCount="{unique}">'
+        yield from self.source_items
+        for text in self.added:
+            yield f'<si>{_text_element(text)}</si>'
+        yield '</sst>'
+
+
+def _text_element(text, shared=True):
+    """<t> element for a string, escaping characters XML 1.0 cannot hold
+
+    Literal _xHHHH_ sequences in shared strings get their underscore escaped
+    (_x005F_) so Excel and openpyxl do not decode them.
+    """
+    if shared:
+        text = _ESCAPE_LIKE.sub(r'_x005F_\1', text)
+    text = escape(_ILLEGAL_CHARACTERS.sub(lambda match: f'_x{ord(match.group()):04X}_', text))
+    if text[:1].isspace() or text[-1:].isspace():
+        return f'<t xml:space="preserve">{text}</t>'
+    return f'<t>{text}</t>'
+
+
+def _cell(reference, value, strings, style=0, styles=STYLES):
+    """XML of one cell ('' for blanks); styles maps 'header', 'date'... to cellXfs ids"""
+    style_attr = f' s="{style}"' if style else ''
+    if value is None or value is pd.NaT or value is pd.NA:
+        return ''
+    if isinstance(value, (bool, np.bool_)):
+        return f'<c r="{reference}" t="b"{style_attr}><v>{int(value)}</v></c>'
+    if isinstance(value, (int, np.integer)):
+        return f'<c r="{reference}"{style_attr}><v>{int(value)}</v></c>'
+    if isinstance(value, (float, np.floating)):
+        value = float(value)
+        if math.isnan(value):
+            return ''
+        if math.isinf(value):
+            # pandas writes infinities as text (inf_rep)
+            return _cell(reference, 'inf' if value > 0 else '-inf', strings, style, styles)
+        return f'<c r="{reference}"{style_attr}><v>{value!r}</v></c>'
+    if isinstance(value, str):
+        if 'x005F_' in value:
+            # Readers strip x005F_ from shared strings; inline strings keep it
+            return f'<c r="{reference}" t="inlineStr"{style_attr}><is>{_text_element(value, shared=False)}</is></c>'
+        return f'<c r="{reference}" t="s"{style_attr}><v>{strings.add(value)}</v></c>'
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            raise ValueError("Excel does not support datetimes with timezones. "
+                             "Please ensure that datetimes are timezone unaware before writing to Excel.")
+        return f'<c r="{reference}" s="{style or styles["datetime"]}"><v>{to_excel(value)!r}</v></c>'
+    if isinstance(value, datetime.date):
+        return f'<c r="{reference}" s="{style or styles["date"]}"><v>{to_excel(value)!r}</v></c>'
+    if isinstance(value, datetime.time):
+        return f'<c r="{reference}" s="{style or styles["time"]}"><v>{to_excel(value)!r}</v></c>'
+    if isinstance(value, datetime.timedelta):
+        return f'<c r="{reference}" s="{style or styles["timedelta"]}"><v>{to_excel(value)!r}</v></c>'
+    if isinstance(value, np.datetime64):
+        return _cell(reference, pd.Timestamp(value).to_pydatetime() if not pd.isna(value) else None, strings, style, styles)
+    raise ValueError(f"Cannot convert {value!r} to Excel")
+
+
+def _column_cells(letter, values, first_row, strings, styles=STYLES):
+    """Cell XML for one column of a chunk, with fast paths for plain numeric columns"""
+    rows = range(first_row, first_row + len(values))
+    if isinstance(values, np.ndarray) and values.dtype.kind in 'iu':
+        return [f'<c r="{letter}{row}"><v>{value}</v></c>' for row, value in zip(rows, values.tolist())]
+    if isinstance(values, np.ndarray) and values.dtype.kind == 'f' and np.isfinite(values[~np.isnan(values)]).all():
+        return ['' if value != value else f'<c r="{letter}{row}"><v>{value!r}</v></c>'
+                for row, value in zip(rows, values.tolist())]
+    if isinstance(values, np.ndarray):
+        values = values.tolist()
+    return [_cell(f'{letter}{row}', value, strings, styles=styles) for row, value in zip(rows, values)]
+
+
+def _chunk_values(column):
+    """Plain values of a column slice: numpy for numeric data, Python objects otherwise"""
+    if isinstance(column.dtype, np.dtype) and column.dtype.kind in 'iuf':
+        return column.to_numpy()
+    return column.tolist()
+
+
+def write_sheet(stream, df, strings, header=True, styles=STYLES):
+    """Write one sheet's XML to an open zip entry, CHUNK_ROWS rows at a time"""
+    if len(df) + int(header) > MAX_ROWS:
+        raise ValueError(f"This sheet is too large! Your sheet size is: {len(df) + int(header)}, {len(df.columns)} "
+                         f"Max sheet size is: {MAX_ROWS}, 16384")
+    letters = [column_letter(position + 1) for position in range(len(df.columns))]
+    last_row = len(df) + int(header)
+    dimension = f"A1:{letters[-1]}{last_row}" if letters and last_row else "A1"
+    stream.write((_XML_HEADER + f'<worksheet xmlns="{_MAIN_NS}" xmlns:r="{_REL_NS}">'
+                  f'<dimension ref="{dimension}"/><sheetData>').encode('utf-8'))
+    if header and letters:
+        cells = ''.join(_cell(f'{letter}1', name, strings, styles['header'], styles) for letter, name in zip(letters, df.columns))
+        stream.write(f'<row r="1">{cells}</row>'.encode('utf-8'))
+
+    first_row = 1 + int(header)
+    for start in range(0, len(df), CHUNK_ROWS):
+        chunk = df.iloc[start:start + CHUNK_ROWS]
+        columns = [_column_cells(letter, _chunk_values(chunk.iloc[:, position]), first_row + start, strings, styles)
+                   for position, letter in enumerate(letters)]
+        rows = [f'<row r="{first_row + start + offset}">{"".join(cells)}</row>'
+                for offset, cells in enumerate(zip(*columns))]
+        stream.write(''.join(rows).encode('utf-8'))
+    stream.write(b'</sheetData></worksheet>')
+
+
+def _package_parts(sheet_names):
+    """Content types, relationships and workbook XML for the written sheets"""
+    overrides = ''.join(
+        f'<Override PartName="/xl/worksheets/sheet{number}.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for number in range(1, len(sheet_names) + 1))
+    content_types = (
+        _XML_HEADER +
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        f'{overrides}'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '<Override PartName="/xl/sharedStrings.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+        '</Types>')
+    root_rels = (
+        _XML_HEADER +
+        f'<Relationships xmlns="{_PACKAGE_REL_NS}">'
+        f'<Relationship Id="rId1" Type="{_REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>')
+    sheets = ''.join(f'<sheet name={quoteattr(name)} sheetId="{number}" r:id="rId{number}"/>'
+                     for number, name in enumerate(sheet_names, start=1))
+    workbook = (
+        _XML_HEADER +
+        f'<workbook xmlns="{_MAIN_NS}" xmlns:r="{_REL_NS}">'
+        f'<bookViews><workbookView/></bookViews><sheets>{sheets}</sheets></workbook>')
+    count = len(sheet_names)
+    workbook_rels = (
+        _XML_HEADER +
+        f'<Relationships xmlns="{_PACKAGE_REL_NS}">' +
+        ''.join(f'<Relationship Id="rId{number}" Type="{_REL_NS}/worksheet" Target="worksheets/sheet{number}.xml"/>'
+                for number in range(1, count + 1)) +
+        f'<Relationship Id="rId{count + 1}" Type="{_REL_NS}/styles" Target="styles.xml"/>'
+        f'<Relationship Id="rId{count + 2}" Type="{_REL_NS}/sharedStrings" Target="sharedStrings.xml"/>'
+        '</Relationships>')
+    return {
+        '[Content_Types].xml': content_types,
+        '_rels/.rels': root_rels,
+        'xl/workbook.xml': workbook,
+        'xl/_rels/workbook.xml.rels': workbook_rels,
+        'xl/styles.xml': _STYLES_XML,
+    }
+
+
+def _temporary_file(file_path):
+    """Empty temporary file next to file_path (same filesystem, so os.replace is atomic)"""
+    folder = os.path.dirname(os.path.abspath(file_path))
+    handle, temp_path = tempfile.mkstemp(prefix='.~', suffix='.xlsx', dir=folder)
+    os.close(handle)
+    return temp_path
+
+
+def _discard(temp_path):
+    try:
+        os.remove(temp_path)
+    except OSError:
+        pass
+
+
+def write_workbook(file_path, sheets, header=True):
+    """Write (sheet name, DataFrame) pairs to an xlsx file
+
+    sheets may be a generator, so each frame is only needed while it is being
+    written. The file at file_path is replaced only after the new workbook has
+    been written completely.
+    """
+    temp_path = _temporary_file(file_path)
+    try:
+        strings = SharedStrings()
+        names = []
+        with zipfile.ZipFile(temp_path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+            for name, df in sheets:
+                names.append(name)
+                with archive.open(f'xl/worksheets/sheet{len(names)}.xml', 'w', force_zip64=True) as stream:
+                    write_sheet(stream, df, strings, header)
+            if not names:
+                raise ValueError("Workbook must contain at least one sheet")
+            with archive.open('xl/sharedStrings.xml', 'w', force_zip64=True) as stream:
+                for piece in strings.xml():
+                    stream.write(piece.encode('utf-8'))
+            for part, xml in _package_parts(names).items():
+                archive.writestr(part, xml)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        _discard(temp_path)
+        raise
+
+
+# Incremental saves
+class IncrementalSaveUnavailable(Exception):
+    """The source workbook cannot be reused for an incremental save (a full write is needed)"""
+
+
+def _source_strings(xml):
+    """Raw <si> elements of a source sharedStrings.xml, in index order"""
+    if not re.search(rf'<sst\b[^>]*\sxmlns="{re.escape(_MAIN_NS)}"', xml):
+        raise IncrementalSaveUnavailable("Unsupported shared string table")
+    items = _STRING_ITEM.findall(xml)
+    if len(items) != len(re.findall(r'<si[\s/>]', xml)):
+        raise IncrementalSaveUnavailable("Unsupported shared string table")
+    return items
+
+
+def _add_entries(xml, collection, entry, items):
+    """Add items to a styles.xml list such as <fonts>, reusing identical entries
+
+    Returns (xml, id of each item), so repeated incremental saves do not keep
+    appending the same styles.
+    """
+    # An empty list may be written self-closing: <numFmts count="0"/>
+    match = re.search(rf'<{collection}(\s[^>/]*)?(?:/>|>(.*?)</{collection}>)', xml, re.S)
+    if match is None:
+        raise IncrementalSaveUnavailable(f"styles.xml has no <{collection}> list")
+    content = match.group(2) or ''
+    existing = re.findall(rf'<{entry}(?:\s[^>]*)?/>|<{entry}(?:\s[^>]*)?(?<!/)>.*?</{entry}>', content, re.S)
+    if len(existing) != len(re.findall(rf'<{entry}[\s/>]', content)):
+        raise IncrementalSaveUnavailable(f"Unsupported <{collection}> list")
+    added, ids = [], []
+    for item in items:
+        if item in existing:
+            ids.append(existing.index(item))
+        else:
+            ids.append(len(existing) + len(added))
+            added.append(item)
+    if not added:
+        return xml, ids
+    attributes = re.sub(r'\s+count="\d*"', '', match.group(1) or '')
+    merged = (f'<{collection} count="{len(existing) + len(added)}"{attributes}>'
+              f'{content}{"".join(added)}</{collection}>')
+    return xml[:match.start()] + merged + xml[match.end():], ids
+
+
+def _merge_styles(xml):
+    """Source styles.xml with this writer's styles added; returns (xml, STYLES-like id map)"""
+    opening = re.search(rf'<styleSheet\b[^>]*\sxmlns="{re.escape(_MAIN_NS)}"[^>]*>', xml)
+    if opening is None:
+        raise IncrementalSaveUnavailable("Unsupported styles part")
+    # Formats of the <numFmts> list can be reused; ids are unique across dxfs too
+    listing = re.search(r'<numFmts\b.*?</numFmts>', xml, re.S)
+    codes = {}
+    for attributes in re.findall(r'<numFmt\b([^>]*)>', listing.group() if listing else ''):
+        number = re.search(r'\snumFmtId="(\d+)"', attributes)
+        code = re.search(r'\sformatCode="([^"]*)"', attributes)
+        if number and code:
+            codes.setdefault(unescape(code.group(1), {'&quot;': '"'}), int(number.group(1)))
+    formats = {kind: codes[code] for kind, code in _NUMBER_FORMATS.items() if code in codes}
+    missing = {kind: code for kind, code in _NUMBER_FORMATS.items() if kind not in formats}
+    if missing:
+        used = [int(number) for number in re.findall(r'<numFmt\b[^>]*\snumFmtId="(\d+)"', xml)]
+        next_id = max(used + [163]) + 1
+        entries = []
+        for offset, (kind, code) in enumerate(missing.items()):
+            formats[kind] = next_id + offset
+            entries.append(f'<numFmt numFmtId="{formats[kind]}" formatCode={quoteattr(code)}/>')
+        if re.search(r'<numFmts[\s>]', xml):
+            xml = _add_entries(xml, 'numFmts', 'numFmt', entries)[0]
+        else:
+            # <numFmts> has to be the first child of <styleSheet>
+            listing = f'<numFmts count="{len(entries)}">{"".join(entries)}</numFmts>'
+            xml = xml[:opening.end()] + listing + xml[opening.end():]
+    xml, (font,) = _add_entries(xml, 'fonts', 'font', [_HEADER_FONT])
+    xml, (border,) = _add_entries(xml, 'borders', 'border', [_HEADER_BORDER])
+    xml, ids = _add_entries(xml, 'cellXfs', 'xf', _style_entries(font, border, formats))
+    return xml, dict(zip(STYLES, ids))
+
+
+def _plan_update(source, sheet_names, changed):
+    """Work out which parts of the source are copied, dropped, regenerated or edited"""
+    try:
+        sheets = xlsx_metadata.list_sheets(source, dimensions=False)
+        workbook = xlsx_metadata.workbook_part(source)
+        related = xlsx_metadata.relationships(source, workbook)
+    except (KeyError, ET.ParseError) as error:
+        raise IncrementalSaveUnavailable(str(error))
+    if [sheet['name'] for sheet in sheets] != list(sheet_names):
+        raise IncrementalSaveUnavailable("The sheets differ from the source workbook")
+    kinds = {target: relationship_type.rsplit('/', 1)[-1] for _, relationship_type, target in related}
+    if any(kinds.get(sheet['part']) != 'worksheet' or sheet['part'] not in source.NameToInfo for sheet in sheets):
+        raise IncrementalSaveUnavailable("Only worksheets can be kept")
+    parts = {kind: target for target, kind in reversed(list(kinds.items()))}
+    rels = xlsx_metadata.rels_path(workbook)
+    if 'styles' not in parts or parts['styles'] not in source.NameToInfo:
+        raise IncrementalSaveUnavailable("The source workbook has no styles part")
+
+    try:
+        styles_xml, styles = _merge_styles(source.read(parts['styles']).decode('utf-8'))
+        strings_part = parts.get('sharedStrings')
+        strings = _source_strings(source.read(strings_part).decode('utf-8')) if strings_part in source.NameToInfo else []
+        rels_xml = source.read(rels).decode('utf-8')
+        types_xml = source.read('[Content_Types].xml').decode('utf-8')
+    except (KeyError, UnicodeDecodeError) as error:
+        raise IncrementalSaveUnavailable(str(error))
+    if '</Relationships>' not in rels_xml or '</Types>' not in types_xml:
+        raise IncrementalSaveUnavailable("Unsupported package parts")
+
+    regenerated = {sheet['part']: sheet['name'] for sheet in sheets if sheet['name'] in changed}
+    dropped = {xlsx_metadata.rels_path(part) for part in regenerated}
+    calc_chain = parts.get('calcChain')
+    if regenerated and calc_chain:
+        # The chain lists formula cells; regenerated sheets only hold values
+        dropped.add(calc_chain)
+        rels_xml = re.sub(r'<Relationship\b[^>]*\bType="[^"]*/calcChain"[^>]*/>', '', rels_xml)
+        types_xml = re.sub(rf'<Override\b[^>]*\bPartName="/{re.escape(calc_chain)}"[^>]*/>', '', types_xml)
+    if strings_part not in source.NameToInfo:
+        strings_part = posixpath.join(posixpath.dirname(workbook), 'sharedStrings.xml')
+        if strings_part in source.NameToInfo:
+            raise IncrementalSaveUnavailable("Unexpected sharedStrings.xml part")
+        ids = set(re.findall(r'\bId="([^"]*)"', rels_xml))
+        new_id = next(f'rId{number}' for number in range(1, len(ids) + 2) if f'rId{number}' not in ids)
+        rels_xml = rels_xml.replace('</Relationships>', f'<Relationship Id="{new_id}" Type="{_REL_NS}/sharedStrings" '
+                                                         'Target="sharedStrings.xml"/></Relationships>')
+        types_xml = types_xml.replace('</Types>', f'<Override PartName="/{strings_part}" ContentType="application/'
+                                                  'vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/></Types>')
+    dropped.add(strings_part)  # Written last, once the regenerated sheets have added their strings
+    return {
+        'regenerated': regenerated,
+        'dropped': dropped,
+        'edited': {parts['styles']: styles_xml, rels: rels_xml, '[Content_Types].xml': types_xml},
+        'styles': styles,
+        'strings': strings,
+        'strings_part': strings_part,
+    }
+
+
+def update_workbook(file_path, source_path, sheet_names, changed, header=True):
+    """Save an xlsx file by regenerating only the changed sheets of source_path
+
+    sheet_names lists every sheet in order and must match the source workbook;
+    changed maps the names of the sheets to regenerate to their DataFrames.
+    All other parts are copied unchanged, except the calculation chain, which
+    is dropped when a sheet is regenerated. file_path may be source_path
+    itself. IncrementalSaveUnavailable is raised before anything is written if
+    the source cannot be reused.
+    """
+    try:
+        source = zipfile.ZipFile(source_path)
+    except (OSError, zipfile.BadZipFile) as error:
+        raise IncrementalSaveUnavailable(str(error))
+    with source:
+        plan = _plan_update(source, sheet_names, changed)
+        temp_path = _temporary_file(file_path)
+        try:
+            strings = SharedStrings(plan['strings'])
+            with zipfile.ZipFile(temp_path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+                for info in source.infolist():
+                    part = info.filename
+                    if part in plan['dropped']:
+                        continue
+                    if part in plan['edited']:
+                        archive.writestr(part, plan['edited'][part])
+                    elif part in plan['regenerated']:
+                        with archive.open(part, 'w', force_zip64=True) as stream:
+                            write_sheet(stream, changed[plan['regenerated'][part]], strings, header, plan['styles'])
+                    else:
+                        with source.open(info) as original, archive.open(part, 'w', force_zip64=True) as stream:
+                            shutil.copyfileobj(original, stream, 1024 * 1024)
+                with archive.open(plan['strings_part'], 'w', force_zip64=True) as stream:
+                    for piece in strings.xml():
+                        stream.write(piece.encode('utf-8'))
+        except BaseException:
+            _discard(temp_path)
+            raise
+    # The source is closed now, so it can be replaced when saving in place
+    try:
+        os.replace(temp_path, file_path)
+    except BaseException:
+        _discard(temp_path)
+        raise